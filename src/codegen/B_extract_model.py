@@ -110,7 +110,8 @@ def extractModel(model, file_type):
             try:
                 layer_input_shape = layer.input_shape
             except AttributeError:
-                layer_input_shape = current_shape
+                # keras 3 layers have no input_shape, keep the batch axis like keras 2
+                layer_input_shape = (None,) + tuple(current_shape)
             conv_layer_params.append(None)
             config = layer.get_config()
             layer_weights = layer.get_weights()
@@ -1196,8 +1197,8 @@ def extractModel(model, file_type):
                         out_W = math.floor((W - kW) / sW) + 1
                     else:
                         out_H, out_W = H, W
-                    # for depthwise=True, channels stay the same
-                    out_C = C
+                    # every input channel gets depth_multiplier output channels
+                    out_C = C * conv_params["filters"]
                     new_shape = (out_H, out_W, out_C)
 
                     conv_params["in_shape"] = current_shape
@@ -1309,28 +1310,32 @@ def extractModel(model, file_type):
                     else:
                         kernel, bias = None, None
 
+                    # keras 3 stores these as 1-tuples
+                    kernel_size = config.get("kernel_size", None)
+                    strides = config.get("strides", 1)
+                    kernel_width = kernel_size[0] if isinstance(kernel_size, (tuple, list)) else kernel_size
+                    stride = strides[0] if isinstance(strides, (tuple, list)) else strides
                     conv_params = {
                         "layer_type": layer.__class__.__name__,
                         "weights": kernel,
                         "biases": bias,
                         "filters": config.get("filters", None),
-                        "kernel_size": config.get("kernel_size", None),
-                        "strides": config.get("strides", None),
+                        "kernel_size": (kernel_width,),
+                        "strides": (stride,),
                         "padding": config.get("padding", None),
                         "dilation_rate": config.get("dilation_rate", None),
+                        "groups": config.get("groups", 1),
                         "use_bias": use_bias,
                     }
 
                     in_length = current_shape[0]
-                    kernel_size = conv_params["kernel_size"]
-                    strides = conv_params["strides"]
                     padding = conv_params["padding"]
                     filters = conv_params["filters"]
 
                     if padding == "same":
-                        out_length = math.ceil(in_length / strides)
+                        out_length = math.ceil(in_length / stride)
                     elif padding == "valid":
-                        out_length = math.floor((in_length - kernel_size) / strides) + 1
+                        out_length = math.floor((in_length - kernel_width) / stride) + 1
                     else:
                         out_length = in_length
 
@@ -1386,6 +1391,7 @@ def extractModel(model, file_type):
                         "strides": config.get("strides", None),
                         "padding": config.get("padding", None),
                         "dilation_rate": config.get("dilation_rate", None),
+                        "groups": config.get("groups", 1),
                         "use_bias": use_bias,
                     }
 
@@ -1485,6 +1491,7 @@ def extractModel(model, file_type):
                         "strides": config.get("strides", None),
                         "padding": config.get("padding", None),
                         "dilation_rate": config.get("dilation_rate", None),
+                        "groups": config.get("groups", 1),
                         "use_bias": use_bias,
                     }
 
@@ -1621,11 +1628,14 @@ def extractModel(model, file_type):
                     kernel_size = config.get("kernel_size", 3)
                     padding = config.get("padding", "valid").lower()
                     filters = config.get("filters", None)
+                    # keras 3 stores these as 1-tuples
+                    stride = strides[0] if isinstance(strides, (tuple, list)) else strides
+                    kernel_width = kernel_size[0] if isinstance(kernel_size, (tuple, list)) else kernel_size
 
                     if padding == "same":
-                        out_length = in_length * strides
+                        out_length = in_length * stride
                     else:  # valid
-                        out_length = (in_length - 1) * strides + kernel_size
+                        out_length = in_length * stride + max(kernel_width - stride, 0)
 
                     new_shape = (out_length, filters)
                     conv_params = {
@@ -1633,8 +1643,8 @@ def extractModel(model, file_type):
                         "weights": kernel,
                         "biases": bias,
                         "filters": filters,
-                        "kernel_size": kernel_size,
-                        "strides": strides,
+                        "kernel_size": (kernel_width,),
+                        "strides": (stride,),
                         "padding": padding,
                         "dilation_rate": config.get("dilation_rate", 1),
                         "use_bias": use_bias,
@@ -1714,8 +1724,8 @@ def extractModel(model, file_type):
                         out_H = H * sH
                         out_W = W * sW
                     elif pad.lower() == "valid":
-                        out_H = (H - 1) * sH + kH
-                        out_W = (W - 1) * sW + kW
+                        out_H = H * sH + max(kH - sH, 0)
+                        out_W = W * sW + max(kW - sW, 0)
                     else:
                         out_H, out_W = H, W
 
@@ -1763,7 +1773,7 @@ def extractModel(model, file_type):
                     else:
                         kernel, bias = None, None
 
-                    in_d, in_h, in_w = current_shape
+                    in_d, in_h, in_w = current_shape[:3]
                     strides = config.get("strides", (1, 1, 1))
                     kernel_size = config.get("kernel_size", (3, 3, 3))
                     padding = config.get("padding", "valid").lower()
@@ -1774,9 +1784,9 @@ def extractModel(model, file_type):
                         out_h = in_h * strides[1]
                         out_w = in_w * strides[2]
                     else:
-                        out_d = (in_d - 1) * strides[0] + kernel_size[0]
-                        out_h = (in_h - 1) * strides[1] + kernel_size[1]
-                        out_w = (in_w - 1) * strides[2] + kernel_size[2]
+                        out_d = in_d * strides[0] + max(kernel_size[0] - strides[0], 0)
+                        out_h = in_h * strides[1] + max(kernel_size[1] - strides[1], 0)
+                        out_w = in_w * strides[2] + max(kernel_size[2] - strides[2], 0)
 
                     new_shape = (out_d, out_h, out_w, filters)
                     conv_params = {
@@ -2,23 +2,28 @@ import os
 import re
 import absl.logging
 import warnings
+from Z_fixed_point import tanhKnots
+from Z_activation_approx import activationTable, approx_tables
 
 absl.logging.set_verbosity("error")
 warnings.filterwarnings("ignore", category=UserWarning, module="keras")
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 
 
-def layer_propagation(cpp_code, activation_functions, layer_type):
+def layer_propagation(cpp_code, activation_functions, layer_type, activation_approx=None):
     """
     Generate C++ lambda-based activation functions (with no indentation for the lambdas)
     and normalization functions. ForwardPass also remains as Code 2 style.
+    activation_approx maps activation lambdas to the "rational" or "table" approximation
+    that replaces them (see Z_activation_approx.py).
     """
 
     # regular forward pass
     dense_function = {
         "Dense": """
-template<typename Scalar, int output_size, typename ActFun>
-inline void Dense(Scalar* __restrict outputs, const Scalar* __restrict inputs, const Scalar * __restrict weights, const Scalar * __restrict biases, int input_size, ActFun activation_function, Scalar alpha) noexcept {
+template<typename Scalar, int output_size, typename ActFun, typename Weight>
+inline void Dense(Scalar* __restrict outputs, const Scalar* __restrict inputs, const Weight * __restrict weights, const Weight * __restrict biases, int input_size, ActFun activation_function, Scalar alpha) noexcept {
+    // the weights may be stored in a narrower type than the sums (float weights, double accumulation)
     for(int i = 0; i < output_size; ++i){
         Scalar sum = 0;
         
@@ -29,8 +34,386 @@ inline void Dense(Scalar* __restrict outputs, const Scalar* __restrict inputs, c
         activation_function(outputs[i], sum, alpha);
     }
 }
+""",
+        "DenseUnrolled": """
+template<typename Scalar, int output_size, int i, int... j>
+inline Scalar DenseUnrolledSum(const Scalar* __restrict inputs, const Scalar * __restrict weights, Scalar bias, std::integer_sequence<int, j...>) noexcept {
+    return (bias + ... + (inputs[j] * weights[j * output_size + i]));
+}
+
+template<typename Scalar, int output_size, int input_size, typename ActFun, int... i>
+inline void DenseUnrolledRows(Scalar* __restrict outputs, const Scalar* __restrict inputs, const Scalar * __restrict weights, const Scalar * __restrict biases, ActFun activation_function, Scalar alpha, std::integer_sequence<int, i...>) noexcept {
+    (activation_function(outputs[i], DenseUnrolledSum<Scalar, output_size, i>(inputs, weights, biases[i], std::make_integer_sequence<int, input_size>{}), alpha), ...);
+}
+
+template<typename Scalar, int output_size, int input_size, typename ActFun>
+inline void DenseUnrolled(Scalar* __restrict outputs, const Scalar* __restrict inputs, const Scalar * __restrict weights, const Scalar * __restrict biases, ActFun activation_function, Scalar alpha) noexcept {
+    // every dimension is a template constant, the folds expand to straight-line code
+    DenseUnrolledRows<Scalar, output_size, input_size>(outputs, inputs, weights, biases, activation_function, alpha, std::make_integer_sequence<int, output_size>{});
+}
+""",
+        "DenseInt8": """
+template<typename Scalar, int output_size, int input_size, typename Input, typename Output, typename ActFun>
+inline void DenseInt8(Output* __restrict outputs, const Input* __restrict inputs, const int8_t * __restrict weights, const Scalar * __restrict weight_scales, const Scalar * __restrict biases, Scalar input_scale, Scalar output_scale, ActFun activation_function, Scalar alpha) noexcept {
+    // int8 inputs times the int8 weights [output_size][input_size] accumulated in int32,
+    // rescaled by input_scale * weight_scales[i] (exact while input_size < 2^31 / 127^2).
+    // int8 Input / Output are passed between consecutive int8 layers (see StoreInt8Outputs)
+    const auto *quantized = QuantizedInputs<input_size>(inputs, input_scale);
+    std::array<Scalar, output_size> values;
+    for(int i = 0; i < output_size; ++i){
+        const int8_t *w = weights + i * input_size;
+        int32_t sum = 0;
+        for(int j = 0; j < input_size; ++j){
+            sum += int32_t(quantized[j]) * int32_t(int16_t(w[j]));
+        }
+        activation_function(values[i], Scalar(sum) * (input_scale * weight_scales[i]) + biases[i], alpha);
+    }
+    StoreInt8Outputs(outputs, values.data(), output_size, output_scale);
+}
+""",
+        "DenseHalf": """
+template<typename Scalar, int output_size, int input_size, bool bfloat, typename ActFun>
+inline void DenseHalf(Scalar* __restrict outputs, const Scalar* __restrict inputs, const uint16_t * __restrict weights, const Scalar * __restrict biases, ActFun activation_function, Scalar alpha) noexcept {
+    // fp16 / bfloat16 weights [input_size][output_size] widened as they stream in, the sums of
+    // all outputs are updated per input so the rows are read contiguously
+    std::array<Scalar, output_size> sums;
+    for(int i = 0; i < output_size; ++i){
+        sums[i] = biases[i];
+    }
+    for(int j = 0; j < input_size; ++j){
+        const Scalar x = inputs[j];
+        const uint16_t *w = weights + j * output_size;
+        for(int i = 0; i < output_size; ++i){
+            sums[i] += x * Scalar(HalfWeight<bfloat>(w[i]));
+        }
+    }
+    for(int i = 0; i < output_size; ++i){
+        activation_function(outputs[i], sums[i], alpha);
+    }
+}
+""",
+        "DenseLowRank": """
+template<typename Scalar, int output_size, int input_size, int rank, typename ActFun>
+inline void DenseLowRank(Scalar* __restrict outputs, const Scalar* __restrict inputs, const Scalar * __restrict left, const Scalar * __restrict right, const Scalar * __restrict biases, ActFun activation_function, Scalar alpha) noexcept {
+    // svd factored weights, left [input_size][rank] and right [rank][output_size], the two thin
+    // products are summed per input row so both factors are read contiguously
+    std::array<Scalar, rank> hidden{};
+    for(int j = 0; j < input_size; ++j){
+        const Scalar x = inputs[j];
+        const Scalar *l = left + j * rank;
+        for(int k = 0; k < rank; ++k){
+            hidden[k] += x * l[k];
+        }
+    }
+    std::array<Scalar, output_size> sums;
+    for(int i = 0; i < output_size; ++i){
+        sums[i] = biases[i];
+    }
+    for(int k = 0; k < rank; ++k){
+        const Scalar h = hidden[k];
+        const Scalar *r = right + k * output_size;
+        for(int i = 0; i < output_size; ++i){
+            sums[i] += h * r[i];
+        }
+    }
+    for(int i = 0; i < output_size; ++i){
+        activation_function(outputs[i], sums[i], alpha);
+    }
+}
+""",
+        "DenseSparse": """
+template<typename Scalar, int output_size, int input_size, int block, typename ActFun>
+inline void DenseSparse(Scalar* __restrict outputs, const Scalar* __restrict inputs, const int32_t * __restrict starts, const uint16_t * __restrict columns, const Scalar * __restrict values, const Scalar * __restrict biases, ActFun activation_function, Scalar alpha) noexcept {
+    // pruned weights [input_size][output_size] kept as the blocks of block consecutive outputs with a
+    // nonzero weight, per input: blocks starts[j] to starts[j + 1] - 1 start at output columns[b] * block
+    // and hold values[b * block] on. the sums are padded to whole blocks
+    constexpr int padded_size = (output_size + block - 1) / block * block;
+    std::array<Scalar, padded_size> sums{};
+    for(int i = 0; i < output_size; ++i){
+        sums[i] = biases[i];
+    }
+    for(int j = 0; j < input_size; ++j){
+        const Scalar x = inputs[j];
+        for(int b = starts[j]; b < starts[j + 1]; ++b){
+            Scalar *sum = sums.data() + int(columns[b]) * block;
+            const Scalar *v = values + b * block;
+            for(int t = 0; t < block; ++t){
+                sum[t] += x * v[t];
+            }
+        }
+    }
+    for(int i = 0; i < output_size; ++i){
+        activation_function(outputs[i], sums[i], alpha);
+    }
+}
+""",
+        "DenseActSparse": """
+template<typename Scalar, int output_size, int input_size, typename ActFun>
+inline void DenseActSparse(Scalar* __restrict outputs, const Scalar* __restrict inputs, const Scalar * __restrict weights, const Scalar * __restrict biases, ActFun activation_function, Scalar alpha) noexcept {
+    // dense weights [input_size][output_size] behind a relu, the nonzero inputs are compacted first
+    // and only their weight rows are accumulated when at least half of the inputs are zero, otherwise
+    // all rows are accumulated without the branch
+    std::array<int, input_size> active;
+    std::array<Scalar, input_size> values;
+    int count = 0;
+    for(int j = 0; j < input_size; ++j){
+        active[count] = j;
+        values[count] = inputs[j];
+        count += inputs[j] != Scalar(0);
+    }
+    std::array<Scalar, output_size> sums;
+    for(int i = 0; i < output_size; ++i){
+        sums[i] = biases[i];
+    }
+    if(2 * count <= input_size){
+        for(int k = 0; k < count; ++k){
+            const Scalar x = values[k];
+            const Scalar *w = weights + active[k] * output_size;
+            for(int i = 0; i < output_size; ++i){
+                sums[i] += x * w[i];
+            }
+        }
+    } else {
+        for(int j = 0; j < input_size; ++j){
+            const Scalar x = inputs[j];
+            const Scalar *w = weights + j * output_size;
+            for(int i = 0; i < output_size; ++i){
+                sums[i] += x * w[i];
+            }
+        }
+    }
+    for(int i = 0; i < output_size; ++i){
+        activation_function(outputs[i], sums[i], alpha);
+    }
+}
+""",
+        "DensePalette": """
+template<typename Scalar, int output_size, int input_size, int clusters, typename ActFun>
+inline void DensePalette(Scalar* __restrict outputs, const Scalar* __restrict inputs, const uint8_t * __restrict indices, const Scalar * __restrict codebook, const Scalar * __restrict biases, ActFun activation_function, Scalar alpha) noexcept {
+    // palettized weights [input_size][output_size], every weight is the codebook entry of its 4 or
+    // 8 bit index, the sums of all outputs are updated per input so the indices are read contiguously.
+    // with 16 centroids the products of the input with the codebook are taken once per input and
+    // looked up, two per byte when the rows start on whole bytes
+    std::array<Scalar, output_size> sums;
+    for(int i = 0; i < output_size; ++i){
+        sums[i] = biases[i];
+    }
+    for(int j = 0; j < input_size; ++j){
+        const Scalar x = inputs[j];
+        if constexpr (clusters == 16) {
+            Scalar products[16];
+            for(int c = 0; c < 16; ++c){
+                products[c] = x * codebook[c];
+            }
+            if constexpr (output_size % 2 == 0) {
+                const uint8_t *row = indices + j * (output_size / 2);
+                for(int k = 0; k < output_size / 2; ++k){
+                    sums[2 * k] += products[row[k] & 0xF];
+                    sums[2 * k + 1] += products[row[k] >> 4];
+                }
+            } else {
+                for(int i = 0; i < output_size; ++i){
+                    sums[i] += products[PaletteIndex<clusters>(indices, j * output_size + i)];
+                }
+            }
+        } else {
+            for(int i = 0; i < output_size; ++i){
+                sums[i] += x * codebook[PaletteIndex<clusters>(indices, j * output_size + i)];
+            }
+        }
+    }
+    for(int i = 0; i < output_size; ++i){
+        activation_function(outputs[i], sums[i], alpha);
+    }
+}
+"""
+    }
+
+    # shared helpers of the int8 quantized functions, emitted once before them
+    quantization_helpers = """
+template <typename Scalar, typename Quantized>
+inline void QuantizeInt8(Quantized * __restrict outputs, const Scalar * __restrict inputs, int size, Scalar scale) noexcept
+{
+    // symmetric quantization q = round(x / scale) clamped to [-127, 127], stored as int16 so the
+    // int8 products below compile to widening multiply-adds (pmaddwd / vpdpwssd), which gcc does
+    // not generate for int8 x int8, or as int8 for the next int8 layer
+    const Scalar inverse = Scalar(1) / scale;
+    for (int i = 0; i < size; ++i) {
+        const Scalar q = std::nearbyint(inputs[i] * inverse);
+        outputs[i] = static_cast<Quantized>(std::min(Scalar(127), std::max(Scalar(-127), q)));
+    }
+}
+
+template <int size, typename Scalar, typename Input>
+inline auto QuantizedInputs(const Input * __restrict inputs, Scalar scale) noexcept
+{
+    // int8 inputs of a layer: already quantized to its input scale by the int8 layer before,
+    // or quantized here into a static int16 buffer
+    if constexpr (std::is_same_v<Input, int8_t>) {
+        return inputs;
+    } else {
+        static std::array<int16_t, size> quantized;
+        QuantizeInt8(quantized.data(), inputs, size, scale);
+        return static_cast<const int16_t *>(quantized.data());
+    }
+}
+
+template <typename Scalar, typename Output>
+inline void StoreInt8Outputs(Output * __restrict outputs, const Scalar * __restrict values, int size, Scalar output_scale) noexcept
+{
+    // outputs of an int8 layer: requantized to output_scale, the input scale of the next int8 layer,
+    // when they are passed on in int8 (the same rounding as QuantizedInputs() on entry), else copied
+    if constexpr (std::is_same_v<Output, int8_t>) {
+        QuantizeInt8(outputs, values, size, output_scale);
+    } else {
+        std::copy(values, values + size, outputs);
+    }
+}
+
+template <typename Scalar, int out_channels, typename ActFun>
+inline void ConvGemmInt8Tile(Scalar * __restrict outputs, int pixels, const int16_t * __restrict patches, const int8_t * __restrict weights,
+                             const Scalar * __restrict weight_scales, const Scalar * __restrict biases, Scalar input_scale, int patch_size,
+                             ActFun activation_function, Scalar alpha) noexcept
+{
+    // outputs[pixels][out_channels] from the dot products of the quantized patches [pixels][patch_size]
+    // with the int8 weight rows [out_channels][patch_size] in int32, rescaled by input_scale * weight_scales[oc]
+    for (int oc = 0; oc < out_channels; ++oc)
+    {
+        const int8_t *w = weights + oc * patch_size;
+        const Scalar scale = input_scale * weight_scales[oc];
+        for (int p = 0; p < pixels; ++p)
+        {
+            const int16_t *a = patches + p * patch_size;
+            int32_t sum = 0;
+            for (int k = 0; k < patch_size; ++k) {
+                sum += int32_t(a[k]) * int32_t(int16_t(w[k]));
+            }
+            activation_function(outputs[p * out_channels + oc], Scalar(sum) * scale + biases[oc], alpha);
+        }
+    }
+}
+"""
+
+    # shared helper of the fp16 / bfloat16 weight functions, emitted once before them
+    half_precision_helpers = """
+template <bool bfloat>
+inline float HalfWeight(uint16_t bits) noexcept
+{
+    // bfloat16 is the top half of a float. binary16 is widened without branches or f16c: the
+    // exponent is rebiased by 112, subnormals (exponent 0) are rebiased by 113 and the implicit
+    // one subtracted again. the weights are finite, so infinities and nans are not handled
+    if constexpr (bfloat) {
+        return std::bit_cast<float>(uint32_t(bits) << 16);
+    } else {
+        const uint32_t shifted = uint32_t(bits & 0x7FFF) << 13;
+        const float normal = std::bit_cast<float>(shifted + (112u << 23));
+        const float subnormal = std::bit_cast<float>(shifted + (113u << 23)) - std::bit_cast<float>(113u << 23);
+        const float magnitude = (shifted & 0x0F800000u) == 0 ? subnormal : normal;
+        return std::bit_cast<float>(std::bit_cast<uint32_t>(magnitude) | (uint32_t(bits & 0x8000) << 16));
+    }
+}
+"""
+
+    # shared helper of the palettized weight functions, emitted once before them
+    palette_helpers = """
+template <int clusters>
+inline int PaletteIndex(const uint8_t * __restrict indices, int i) noexcept
+{
+    // codebook index of the i-th weight, one per byte for 256 centroids, two per byte for 16
+    // (the even weights in the low nibbles)
+    if constexpr (clusters == 256) {
+        return indices[i];
+    } else {
+        return (indices[i >> 1] >> ((i & 1) << 2)) & 0xF;
+    }
+}
 """
+
+    # integer-only functions of the fixed-point models, every value is an integer standing
+    # for value / 2^frac_bits with the Q format of its tensor given as template constants
+    fixed_point_functions = {
+        "DenseFixed": """
+template<typename Word, int output_size, int input_size, int shift, int bits>
+inline void DenseFixed(Word * __restrict outputs, const Word * __restrict inputs, const Word * __restrict weights, const int64_t * __restrict biases) noexcept {
+    // weights [output_size][input_size], the products are summed in int64 at the input + weight
+    // fractional bits the biases are stored in, then rounded and saturated to the output format
+    using Product = std::conditional_t<(sizeof(Word) < 4), int32_t, int64_t>;
+    for(int i = 0; i < output_size; ++i){
+        const Word *w = weights + i * input_size;
+        int64_t sum = biases[i];
+        for(int j = 0; j < input_size; ++j){
+            sum += Product(inputs[j]) * w[j];
+        }
+        outputs[i] = FixedSaturate<Word, bits>(FixedShift<shift>(sum));
+    }
+}
+""",
+        "AffineFixed": """
+template<typename Word, int size, int shift, int bits>
+inline void AffineFixed(Word * __restrict outputs, const Word * __restrict inputs, const Word * __restrict scales, const int64_t * __restrict offsets) noexcept {
+    // per feature x * scale + offset (normalizations, rescaling), offsets in the input + scale format
+    for(int i = 0; i < size; ++i){
+        outputs[i] = FixedSaturate<Word, bits>(FixedShift<shift>(int64_t(inputs[i]) * scales[i] + offsets[i]));
+    }
+}
+""",
+    }
+
+    # shared helpers of the fixed-point functions, emitted once before them
+    fixed_point_helpers = """
+template <int shift>
+constexpr int64_t FixedShift(int64_t value) noexcept
+{
+    // arithmetic right shift rounding half up, a left shift for negative shifts
+    if constexpr (shift > 0) {
+        return (value + (int64_t(1) << (shift - 1))) >> shift;
+    } else {
+        return value * (int64_t(1) << -shift);
+    }
+}
+
+template <typename Word, int bits>
+constexpr Word FixedSaturate(int64_t value) noexcept
+{
+    constexpr int64_t limit = (int64_t(1) << bits) - 1;
+    return static_cast<Word>(value < -limit ? -limit : (value > limit ? limit : value));
+}
+
+template <typename Word, int frac_in>
+inline int64_t FixedTanhQ30(Word x) noexcept
+{
+    // tanh in Q30, linear between the knots tanh(k / 32) of [0, 4] and +-1 beyond, odd symmetry
+    static constexpr int32_t knots[129] = {""" + ", ".join(str(k) for k in tanhKnots()) + """};
+    const int64_t position = FixedShift<frac_in - 21>(x < 0 ? -int64_t(x) : int64_t(x));
+    const int64_t segment = position >> 16;
+    int64_t y = int64_t(1) << 30;
+    if (segment < 128) {
+        y = knots[segment] + ((int64_t(knots[segment + 1] - knots[segment]) * (position & 0xFFFF)) >> 16);
     }
+    return x < 0 ? -y : y;
+}
+
+template <typename Word, int bits, int frac_in, int frac_out>
+inline Word FixedTanh(Word x) noexcept
+{
+    return FixedSaturate<Word, bits>(FixedShift<30 - frac_out>(FixedTanhQ30<Word, frac_in>(x)));
+}
+
+template <typename Word, int bits, int frac_in, int frac_out>
+inline Word FixedSigmoid(Word x) noexcept
+{
+    // sigmoid(x) = (1 + tanh(x / 2)) / 2, x / 2 is x with one more fractional bit
+    const int64_t y = ((int64_t(1) << 30) + FixedTanhQ30<Word, frac_in + 1>(x)) >> 1;
+    return FixedSaturate<Word, bits>(FixedShift<30 - frac_out>(y));
+}
+
+template <typename Word, int bits>
+inline Word FixedLeakyRelu(Word x, int32_t alpha) noexcept
+{
+    // alpha in Q15
+    return x < 0 ? FixedSaturate<Word, bits>(FixedShift<15>(int64_t(x) * alpha)) : x;
+}
+"""
 
     # reshape functions
     reshape_functions = {
@@ -120,23 +503,198 @@ inline void Rescale(Scalar * __restrict outputs, const Scalar * __restrict input
     };
 """,
         "softmax": """
-    auto softmax = +[](Scalar * __restrict outputs, Scalar * __restrict inputs, int size) noexcept {
-        Scalar max_val = *std::max_element(input, input + size);
+    auto softmax = +[](const Scalar * inputs, Scalar * outputs, int size) noexcept {
+        Scalar max_val = *std::max_element(inputs, inputs + size);
         Scalar sum = 0;
         
         for (int i = 0; i < size; ++i)
         {
-            const Scalar exp_val = std::exp(input[i] - max_val);
-            output[i] = exp_val;
+            const Scalar exp_val = std::exp(inputs[i] - max_val);
+            outputs[i] = exp_val;
             sum += exp_val;
         }
         
         for (int i = 0; i < size; ++i)
         {
-            output[i] /= sum;
+            outputs[i] /= sum;
+        }
+    };
+""",
+    }
+
+    # helpers of the approximated activation lambdas, static so the captureless lambdas can call them
+    tanh_step, tanh_segments = approx_tables["tanh"]
+    expm1_step, expm1_segments = approx_tables["expm1"]
+    approx_helpers = {
+        "approxExp": """
+    // exp(x) = 2^k exp(r) with k = round(x / ln 2) and |r| <= ln 2 / 2, exp(r) from its taylor
+    // polynomial (degree 7 for float, 12 for double) and 2^k written into the exponent bits. k is
+    // rounded by adding and subtracting 1.5 * 2^mantissa bits (std::floor keeps gcc from vectorizing)
+    // and read from the low bits of the sum
+    static constexpr auto approxExp = [](Scalar x) noexcept -> Scalar {
+        if constexpr (std::is_same_v<Scalar, float> || std::is_same_v<Scalar, double>) {
+            constexpr bool single = std::is_same_v<Scalar, float>;
+            using Bits = std::conditional_t<single, int32_t, int64_t>;
+            constexpr Scalar limit = single ? 87 : 708;
+            constexpr Scalar shifter = single ? Scalar(12582912.0) : Scalar(6755399441055744.0);
+            x = std::min(std::max(-limit, x), limit);
+            const Scalar shifted = x * Scalar(1.4426950408889634) + shifter;
+            const Scalar k = shifted - shifter;
+            const Scalar r = (x - k * Scalar(0.693145751953125)) - k * Scalar(1.4286068203094173e-06);
+            Scalar p = 1;
+            for (int n = single ? 7 : 12; n > 0; --n) {
+                p = Scalar(1) + p * r * Scalar(1.0 / n);
+            }
+            const Bits exponent = std::bit_cast<Bits>(shifted) - std::bit_cast<Bits>(shifter) + (single ? 127 : 1023);
+            return p * std::bit_cast<Scalar>(Bits(exponent << (single ? 23 : 52)));
+        } else {
+            return std::exp(x);
+        }
+    };
+""",
+        "approxTanh": """
+    // rational minimax approximation of degree 13 / 6 in float (x itself for |x| < 0.0004),
+    // 1 - 2 / (exp(2 |x|) + 1) with the sign of x in double
+    static constexpr auto approxTanh = [](Scalar x) noexcept -> Scalar {
+        if constexpr (std::is_same_v<Scalar, float>) {
+            const Scalar c = std::min(std::max(Scalar(-7.90531110763549805), x), Scalar(7.90531110763549805));
+            const Scalar c2 = c * c;
+            Scalar p = Scalar(-2.76076847742355e-16);
+            p = p * c2 + Scalar(2.00018790482477e-13);
+            p = p * c2 + Scalar(-8.60467152213735e-11);
+            p = p * c2 + Scalar(5.12229709037114e-08);
+            p = p * c2 + Scalar(1.48572235717979e-05);
+            p = p * c2 + Scalar(6.37261928875436e-04);
+            p = p * c2 + Scalar(4.89352455891786e-03);
+            Scalar q = Scalar(1.19825839466702e-06);
+            q = q * c2 + Scalar(1.18534705686654e-04);
+            q = q * c2 + Scalar(2.26843463243900e-03);
+            q = q * c2 + Scalar(4.89352518554385e-03);
+            return std::abs(x) < Scalar(0.0004) ? x : c * p / q;
+        } else {
+            return std::copysign(Scalar(1) - Scalar(2) / (approxExp(Scalar(2) * std::abs(x)) + Scalar(1)), x);
         }
     };
 """,
+        "tableTanh": f"""
+    // cubic hermite pieces of tanh on [0, {tanh_step * tanh_segments:g}) in steps of 1 / {1 / tanh_step:g}, the middle of the last
+    // piece beyond. the piece is found by rounding u - 0.5 with the 1.5 * 2^mantissa bits shifter, which
+    // gcc vectorizes (unlike the float -> int -> float round trip of a clamped u)
+    static constexpr std::array<Scalar, {4 * tanh_segments}> tanhTable = {{"""
+        + ", ".join(repr(c) for c in activationTable("tanh"))
+        + f"""}};
+    static constexpr auto tableTanh = [](Scalar x) noexcept -> Scalar {{
+        if constexpr (std::is_same_v<Scalar, float> || std::is_same_v<Scalar, double>) {{
+            constexpr Scalar shifter = std::is_same_v<Scalar, float> ? Scalar(12582912.0) : Scalar(6755399441055744.0);
+            const Scalar u = std::min(Scalar({tanh_segments - 0.5}), std::abs(x) * Scalar({1 / tanh_step:g}));
+            const Scalar segment = (u - Scalar(0.5) + shifter) - shifter;
+            const Scalar t = u - segment;
+            const int s = 4 * int(segment);
+            return std::copysign(((tanhTable[s + 3] * t + tanhTable[s + 2]) * t + tanhTable[s + 1]) * t + tanhTable[s], x);
+        }} else {{
+            return std::tanh(x);
+        }}
+    }};
+""",
+        "tableExpm1": f"""
+    // cubic hermite pieces of exp(x) - 1 on (-{expm1_step * expm1_segments:g}, 0] in steps of 1 / {1 / expm1_step:g}, the middle of the
+    // last piece below (0 for the positive inputs, which elu and selu do not use)
+    static constexpr std::array<Scalar, {4 * expm1_segments}> expm1Table = {{"""
+        + ", ".join(repr(c) for c in activationTable("expm1"))
+        + f"""}};
+    static constexpr auto tableExpm1 = [](Scalar x) noexcept -> Scalar {{
+        if constexpr (std::is_same_v<Scalar, float> || std::is_same_v<Scalar, double>) {{
+            constexpr Scalar shifter = std::is_same_v<Scalar, float> ? Scalar(12582912.0) : Scalar(6755399441055744.0);
+            const Scalar u = std::min(Scalar({expm1_segments - 0.5}), std::max(Scalar(0), -x) * Scalar({1 / expm1_step:g}));
+            const Scalar segment = (u - Scalar(0.5) + shifter) - shifter;
+            const Scalar t = u - segment;
+            const int s = 4 * int(segment);
+            return ((expm1Table[s + 3] * t + expm1Table[s + 2]) * t + expm1Table[s + 1]) * t + expm1Table[s];
+        }} else {{
+            return std::expm1(std::min(x, Scalar(0)));
+        }}
+    }};
+""",
+    }
+
+    # approximated activation lambdas of --activation-approx by method: (helpers they call, lambda)
+    approx_lambda_functions = {
+        "rational": {
+            "sigmoid": (["approxExp"], """
+    auto sigmoid = +[](Scalar& output, Scalar input, Scalar alpha) noexcept {
+        output = 1 / (1 + approxExp(-input));
+    };
+"""),
+            "tanhCustom": (["approxExp", "approxTanh"], """
+    auto tanhCustom = +[](Scalar& output, Scalar input, Scalar alpha) noexcept {
+        output = approxTanh(input);
+    };
+"""),
+            "elu": (["approxExp"], """
+    auto elu = +[](Scalar& output, Scalar input, Scalar alpha) noexcept {
+        output = input > 0 ? input : alpha * (approxExp(input) - 1);
+    };
+"""),
+            "selu": (["approxExp"], """
+    auto selu = +[](Scalar& output, Scalar input, Scalar alpha) noexcept {
+        output = Scalar(1.0507009873554804934193349852946) * (input > 0 ? input : Scalar(1.6732632423543772848170429916717) * (approxExp(input) - 1));
+    };
+"""),
+            "swish": (["approxExp"], """
+    auto swish = +[](Scalar& output, Scalar input, Scalar alpha) noexcept {
+        output = input / (1 + approxExp(-alpha * input));
+    };
+"""),
+            "silu": (["approxExp"], """
+    auto silu = +[](Scalar& output, Scalar input, Scalar alpha) noexcept {
+        output = input / (1 + approxExp(-input));
+    };
+"""),
+            "gelu": (["approxExp", "approxTanh"], """
+    auto gelu = +[](Scalar& output, Scalar input, Scalar alpha) noexcept {
+        const Scalar y = Scalar(0.7978845608028654) * (input + Scalar(0.044715) * input * input * input);
+        output = Scalar(0.5) * input * (Scalar(1) + approxTanh(y));
+    };
+"""),
+        },
+        "table": {
+            "sigmoid": (["tableTanh"], """
+    auto sigmoid = +[](Scalar& output, Scalar input, Scalar alpha) noexcept {
+        output = Scalar(0.5) + Scalar(0.5) * tableTanh(Scalar(0.5) * input);
+    };
+"""),
+            "tanhCustom": (["tableTanh"], """
+    auto tanhCustom = +[](Scalar& output, Scalar input, Scalar alpha) noexcept {
+        output = tableTanh(input);
+    };
+"""),
+            "elu": (["tableExpm1"], """
+    auto elu = +[](Scalar& output, Scalar input, Scalar alpha) noexcept {
+        output = input > 0 ? input : alpha * tableExpm1(input);
+    };
+"""),
+            "selu": (["tableExpm1"], """
+    auto selu = +[](Scalar& output, Scalar input, Scalar alpha) noexcept {
+        output = Scalar(1.0507009873554804934193349852946) * (input > 0 ? input : Scalar(1.6732632423543772848170429916717) * tableExpm1(input));
+    };
+"""),
+            "swish": (["tableTanh"], """
+    auto swish = +[](Scalar& output, Scalar input, Scalar alpha) noexcept {
+        output = input * (Scalar(0.5) + Scalar(0.5) * tableTanh(Scalar(0.5) * alpha * input));
+    };
+"""),
+            "silu": (["tableTanh"], """
+    auto silu = +[](Scalar& output, Scalar input, Scalar alpha) noexcept {
+        output = input * (Scalar(0.5) + Scalar(0.5) * tableTanh(Scalar(0.5) * input));
+    };
+"""),
+            "gelu": (["tableTanh"], """
+    auto gelu = +[](Scalar& output, Scalar input, Scalar alpha) noexcept {
+        const Scalar y = Scalar(0.7978845608028654) * (input + Scalar(0.044715) * input * input * input);
+        output = Scalar(0.5) * input * (Scalar(1) + tableTanh(y));
+    };
+"""),
+        },
     }
 
     # normalization functions
@@ -249,148 +807,1428 @@ inline void UnitNormalization(Scalar * __restrict outputs,
 """,
     }
 
-    # convolution functions
-    convolution_functions = {
-        "Conv1D": """
-template <typename Scalar, int out_size, typename ActFun>
-inline void Conv1D(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar * __restrict weights, const Scalar * __restrict biases,
-                   int in_size, int kernel_size, int stride, int padding,
-                   ActFun activation_function, Scalar alpha) noexcept
+    # shared helpers of the convolution functions, emitted once before them
+    convolution_helpers = """
+constexpr std::pair<int, int> ConvInteriorRange(int out_size, int in_size, int kernel_size, int stride, int padding) noexcept
+{
+    // outputs in [first, second) only read taps inside the input, the others are the padded border
+    const int first = std::min(out_size, (padding + stride - 1) / stride);
+    const int last_origin = in_size + padding - kernel_size;
+    if (last_origin < 0)
+        return {first, first};
+    return {first, std::max(first, std::min(out_size, last_origin / stride + 1))};
+}
+
+constexpr std::pair<int, int> ConvTransposeTaps(int base, int kernel_size, int stride, int in_size) noexcept
+{
+    // taps k in [first, second) of a flipped transposed kernel with (base + k) landing on an input
+    // sample, i.e. a multiple of stride inside the input, step through them with k += stride
+    int first = std::max(0, -base);
+    first += ((-(base + first)) % stride + stride) % stride;
+    const int last = std::min(kernel_size, in_size * stride - base);
+    return {first, std::max(first, last)};
+}
+
+constexpr std::pair<int, int> ConvTransposePhase(int phase, int kernel_size, int stride, int padding) noexcept
+{
+    // outputs q * stride + phase of a transposed convolution read the flipped taps first, first + stride, ...
+    // from the inputs q + offset, q + offset + 1, ..., returns {number of taps, offset}
+    const int first = ((kernel_size - 1 - padding - phase) % stride + stride) % stride;
+    const int taps = first < kernel_size ? (kernel_size - first + stride - 1) / stride : 0;
+    return {taps, (phase + padding - (kernel_size - 1) + first) / stride};
+}
+
+template <typename Scalar, int out_channels>
+inline void ConvAccumulateTap(Scalar * __restrict sum_buf, const Scalar * __restrict in_ptr, const Scalar * __restrict w_ptr, int in_channels) noexcept
 {
-    for (int o = 0; o < out_size; ++o)
+    // sum_buf[oc] += in_ptr[ic] * w_ptr[ic * out_channels + oc] for one kernel tap
+    for (int ic = 0; ic < in_channels; ++ic)
     {
-        Scalar sum = 0;
-        
-        for (int k = 0; k < kernel_size; ++k)
+        const Scalar input_val = in_ptr[ic];
+        if constexpr (out_channels >= 4 && out_channels <= 16 && (out_channels & (out_channels - 1)) == 0)
         {
-            int in_index = o * stride - padding + k;
-            if (in_index >= 0 && in_index < in_size)
-            {
-                int weight_index = k * out_size + o;
-                sum += inputs[in_index] * weights[weight_index];
+            // gcc fully unrolls these channel counts and then vectorizes across the input channels
+            // with lane shuffles, keeping the loop rolled vectorizes it over the output channels
+            #pragma GCC unroll 1
+            for (int oc = 0; oc < out_channels; ++oc) {
+                sum_buf[oc] += input_val * w_ptr[ic * out_channels + oc];
+            }
+        }
+        else
+        {
+            for (int oc = 0; oc < out_channels; ++oc) {
+                sum_buf[oc] += input_val * w_ptr[ic * out_channels + oc];
             }
         }
-        sum += biases[o];
-        activation_function(outputs[o], sum, alpha);
     }
 }
-""",
-        "Conv1DTranspose": """
-template <typename Scalar, int out_channels, int out_length, typename ActFun>
-inline void Conv1DTranspose(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar * __restrict kernels, const Scalar * __restrict biases, int in_channels,int in_length, int kernel_width, int stride, int padding, ActFun activation_function, Scalar alpha)
+template <typename Scalar, int out_channels, int tile_pixels, int block_channels, typename ActFun>
+inline void ConvGemmBlock(Scalar * __restrict outputs, int pixels, int oc_begin, const Scalar * __restrict patches, const Scalar * __restrict weights, const Scalar * __restrict biases,
+                          int patch_size, ActFun activation_function, Scalar alpha) noexcept
 {
-    for (int ow = 0; ow < out_length; ++ow)
+    // register tile of tile_pixels x block_channels outputs, every weight row loaded once per tile
+    Scalar acc[tile_pixels][block_channels];
+    for (int p = 0; p < tile_pixels; ++p) {
+        for (int j = 0; j < block_channels; ++j) {
+            acc[p][j] = biases != nullptr ? biases[oc_begin + j] : Scalar(0);
+        }
+    }
+    for (int k = 0; k < patch_size; ++k)
     {
-        
-        for (int oc = 0; oc < out_channels; ++oc)
+        const Scalar *a = patches + k;
+        const Scalar *w = weights + k * out_channels + oc_begin;
+        #pragma GCC unroll 16
+        for (int p = 0; p < tile_pixels; ++p)
         {
-            int idx = ow * out_channels + oc;
-            outputs[idx] = biases ? biases[oc] : Scalar(0);
+            if constexpr (block_channels >= 4 && block_channels <= 16 && (block_channels & (block_channels - 1)) == 0)
+            {
+                // see ConvAccumulateTap, rolled so gcc vectorizes over the output channels
+                #pragma GCC unroll 1
+                for (int j = 0; j < block_channels; ++j) {
+                    acc[p][j] += a[p * patch_size] * w[j];
+                }
+            }
+            else
+            {
+                for (int j = 0; j < block_channels; ++j) {
+                    acc[p][j] += a[p * patch_size] * w[j];
+                }
+            }
+        }
+    }
+    for (int p = 0; p < pixels; ++p) {
+        for (int j = 0; j < block_channels; ++j) {
+            activation_function(outputs[p * out_channels + oc_begin + j], acc[p][j], alpha);
         }
     }
+}
 
-    for (int ic = 0; ic < in_channels; ++ic)
+template <typename Scalar, int out_channels, int tile_pixels, int columns, typename ActFun>
+inline void ConvGemmColumns(Scalar * __restrict outputs, int pixels, int oc_begin, const Scalar * __restrict patches, const Scalar * __restrict weights, const Scalar * __restrict biases,
+                            int patch_size, ActFun activation_function, Scalar alpha) noexcept
+{
+    // output channels oc_begin .. oc_begin + columns of outputs[pixels][out_channels] = patches[tile_pixels][patch_size] * weights[patch_size][out_channels] + biases,
+    // split into blocks of output channels that fit in registers, null biases add nothing
+    constexpr int block_channels = std::min(columns, int(64 / sizeof(Scalar)));
+    constexpr int full_channels = columns / block_channels * block_channels;
+    for (int oc = oc_begin; oc < oc_begin + full_channels; oc += block_channels) {
+        ConvGemmBlock<Scalar, out_channels, tile_pixels, block_channels>(outputs, pixels, oc, patches, weights, biases, patch_size, activation_function, alpha);
+    }
+    if constexpr (full_channels < columns) {
+        ConvGemmBlock<Scalar, out_channels, tile_pixels, columns - full_channels>(outputs, pixels, oc_begin + full_channels, patches, weights, biases, patch_size, activation_function, alpha);
+    }
+}
+
+template <typename Scalar, int out_channels, int tile_pixels, typename ActFun>
+inline void ConvGemmTile(Scalar * __restrict outputs, int pixels, const Scalar * __restrict patches, const Scalar * __restrict weights, const Scalar * __restrict biases,
+                         int patch_size, ActFun activation_function, Scalar alpha) noexcept
+{
+    // all output channels of the tile
+    ConvGemmColumns<Scalar, out_channels, tile_pixels, out_channels>(outputs, pixels, 0, patches, weights, biases, patch_size, activation_function, alpha);
+}
+
+template <typename Scalar, typename Input>
+inline void ConvPackPatch2D(Scalar * __restrict column, const Input * __restrict inputs, int h_origin, int w_origin,
+                            int in_channels, int in_height, int in_width, int kernel_height, int kernel_width) noexcept
+{
+    // im2col column [kernel_height][kernel_width][in_channels] of the window at (h_origin, w_origin), zero padded
+    for (int kh = 0; kh < kernel_height; ++kh)
     {
-        for (int iw = 0; iw < in_length; ++iw)
+        const int ih = h_origin + kh;
+        for (int kw = 0; kw < kernel_width; ++kw)
         {
-            Scalar val = inputs[iw * in_channels + ic];
-            int base = iw * stride - padding;
-
-            for (int k = 0; k < kernel_width; ++k)
+            const int iw = w_origin + kw;
+            Scalar *tap = column + (kh * kernel_width + kw) * in_channels;
+            if (ih < 0 || ih >= in_height || iw < 0 || iw >= in_width)
             {
-                int ow = base + k;
-                if (ow < 0 || ow >= out_length)
-                    continue;
-
-                int fk = kernel_width - 1 - k;
-                int ker_base = fk * (out_channels * in_channels) + ic;
-                int out_base = ow * out_channels;
-                
-                for (int oc = 0; oc < out_channels; ++oc)
-                {
-                    int k_idx = ker_base + oc * in_channels;
-                    outputs[out_base + oc] += val * kernels[k_idx];
+                for (int ic = 0; ic < in_channels; ++ic) {
+                    tap[ic] = 0;
                 }
+                continue;
+            }
+            const Input *in_ptr = inputs + (ih * in_width + iw) * in_channels;
+            for (int ic = 0; ic < in_channels; ++ic) {
+                tap[ic] = in_ptr[ic];
             }
         }
     }
+}
 
-    int total = out_length * out_channels;
-    for (int i = 0; i < total; ++i)
-    {
-        activation_function(outputs[i], outputs[i], alpha);
+template <typename Scalar, int out_channels, int pixels, typename ActFun>
+inline void ConvPointwise(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar * __restrict weights, const Scalar * __restrict biases,
+                          int in_channels, ActFun activation_function, Scalar alpha) noexcept
+{
+    // 1x1 stride 1 convolution: the [pixels][in_channels] inputs already are the im2col patches,
+    // so every tile is multiplied in place, the last partial one as a tile of its own size
+    constexpr int tile_pixels = 8;
+    constexpr int full_pixels = pixels / tile_pixels * tile_pixels;
+    for (int pixel = 0; pixel < full_pixels; pixel += tile_pixels) {
+        ConvGemmTile<Scalar, out_channels, tile_pixels>(outputs + pixel * out_channels, tile_pixels, inputs + pixel * in_channels, weights, biases, in_channels, activation_function, alpha);
     }
+    if constexpr (full_pixels < pixels) {
+        ConvGemmTile<Scalar, out_channels, pixels - full_pixels>(outputs + full_pixels * out_channels, pixels - full_pixels, inputs + full_pixels * in_channels, weights, biases, in_channels, activation_function, alpha);
+    }
+}
 
-    /*
-    NEEDED TO REORDER OUTPUTS (WILL UPDATE)
-    */
-    std::array<Scalar, out_length * out_channels> tmp;
-    std::copy(outputs, outputs + total, tmp.begin());
-    for (int ow = 0; ow < out_length; ++ow)
+template <typename Scalar, int out_channels, bool max_pool>
+inline void ConvReduceTile(Scalar * __restrict outputs, const Scalar * __restrict tile, int pixels) noexcept
+{
+    // global max or sum pooling of a [pixels][out_channels] tile of conv outputs into outputs[out_channels]
+    for (int p = 0; p < pixels; ++p)
     {
-        int dst = ow * out_channels;
-        int src = (out_length - 1 - ow) * out_channels;
-        
         for (int oc = 0; oc < out_channels; ++oc)
         {
-            outputs[dst + oc] = tmp[src + oc];
+            if constexpr (max_pool)
+                outputs[oc] = std::max(outputs[oc], tile[p * out_channels + oc]);
+            else
+                outputs[oc] += tile[p * out_channels + oc];
         }
     }
-    /*
-    NEEDED TO REORDER OUTPUTS (WILL UPDATE)
-    */
-   
 }
-""",
-        "Conv2D": """
-template <typename Scalar, int out_channels, int out_height, int out_width, typename ActivationFunc>
-inline void Conv2D(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar *__restrict weights, const Scalar *__restrict biases, int in_channels, int in_height, int in_width, int kernel_height, int kernel_width, int stride_height, int stride_width, int padding_height, int padding_width, ActivationFunc activation_function, Scalar alpha) noexcept
-{
- 
-    Scalar sum_buf[out_channels];
-    const int input_row_stride = in_width * in_channels;
-    const int weights_per_khkw = in_channels * out_channels;  
-    const int weights_per_kh = kernel_width * weights_per_khkw;
 
-    for (int oh = 0; oh < out_height; ++oh)
+template <typename Scalar, int out_channels, int pixels, bool max_pool, typename ActFun>
+inline void ConvPointwiseGlobalPool(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar * __restrict weights, const Scalar * __restrict biases,
+                                    int in_channels, Scalar pool_scale, ActFun activation_function, Scalar alpha) noexcept
+{
+    // ConvPointwise followed by global max or average pooling (times pool_scale): every tile of
+    // conv outputs is reduced into outputs[out_channels] right away instead of being stored
+    constexpr int tile_pixels = 8;
+    constexpr int full_pixels = pixels / tile_pixels * tile_pixels;
+    Scalar window[tile_pixels * out_channels];
+    for (int oc = 0; oc < out_channels; ++oc) {
+        outputs[oc] = max_pool ? -std::numeric_limits<Scalar>::infinity() : Scalar(0);
+    }
+    for (int pixel = 0; pixel < full_pixels; pixel += tile_pixels)
     {
-        const int h_origin = oh * stride_height - padding_height;
+        ConvGemmTile<Scalar, out_channels, tile_pixels>(window, tile_pixels, inputs + pixel * in_channels, weights, biases, in_channels, activation_function, alpha);
+        ConvReduceTile<Scalar, out_channels, max_pool>(outputs, window, tile_pixels);
+    }
+    if constexpr (full_pixels < pixels)
+    {
+        // the last partial tile is a tile of its own size, see ConvPointwise
+        ConvGemmTile<Scalar, out_channels, pixels - full_pixels>(window, pixels - full_pixels, inputs + full_pixels * in_channels, weights, biases, in_channels, activation_function, alpha);
+        ConvReduceTile<Scalar, out_channels, max_pool>(outputs, window, pixels - full_pixels);
+    }
+    if constexpr (!max_pool)
+    {
+        for (int oc = 0; oc < out_channels; ++oc) {
+            outputs[oc] *= pool_scale;
+        }
+    }
+}
 
-        for (int ow = 0; ow < out_width; ++ow)
-        {
+template <typename Scalar>
+inline void DepthwiseForsSeparableConv2D(Scalar *__restrict outputs, const Scalar *__restrict inputs, const Scalar *__restrict weights, const Scalar *__restrict biases,
+                                  int out_height, int out_width,
+                                  int in_channels, int in_height, int in_width,
+                                  int kernel_height, int kernel_width, int stride_height, int stride_width,
+                                  int padding_height, int padding_width) noexcept
+{
+    // output pixels whose whole kernel window lies inside the input, everything else is border
+    const auto [oh_begin, oh_end] = ConvInteriorRange(out_height, in_height, kernel_height, stride_height, padding_height);
+    const auto [ow_begin, ow_end] = ConvInteriorRange(out_width, in_width, kernel_width, stride_width, padding_width);
+
+    for (int c = 0; c < in_channels; ++c)
+    {
+        for (int oh = 0; oh < out_height; ++oh)
+        {
+            const bool interior_row = oh >= oh_begin && oh < oh_end;
+            const int h_origin = oh * stride_height - padding_height;
+            for (int ow = 0; ow < out_width; ++ow)
+            {
+                const int w_origin = ow * stride_width - padding_width;
+
+                Scalar sum = 0;
+                if (interior_row && ow >= ow_begin && ow < ow_end)
+                {
+                    // interior pixels read the whole kernel window without any bounds
+                    for (int kh = 0; kh < kernel_height; ++kh)
+                    {
+                        const Scalar *in_ptr = inputs + ((h_origin + kh) * in_width + w_origin) * in_channels + c;
+                        const Scalar *w_ptr = weights + (kh * kernel_width) * in_channels + c;
+
+                        for (int kw = 0; kw < kernel_width; ++kw)
+                        {
+                            sum += in_ptr[kw * in_channels] * w_ptr[kw * in_channels];
+                        }
+                    }
+                }
+                else
+                {
+                    // border pixels skip the taps that fall into the padding
+                    for (int kh = 0; kh < kernel_height; ++kh)
+                    {
+                        const int in_h = h_origin + kh;
+                        if (in_h < 0 || in_h >= in_height)
+                            continue;
+                        for (int kw = 0; kw < kernel_width; ++kw)
+                        {
+                            const int in_w = w_origin + kw;
+                            if (in_w >= 0 && in_w < in_width)
+                                sum += inputs[(in_h * in_width + in_w) * in_channels + c] * weights[(kh * kernel_width + kw) * in_channels + c];
+                        }
+                    }
+                }
+                sum += biases[c];
+                int output_index = ((oh * out_width + ow) * in_channels) + c;
+                outputs[output_index] = sum;
+            }
+        }
+    }
+}
+
+template <typename Scalar, int out_channels, int out_depth, int out_height, int out_width, int groups, int patch_size, typename ActFun>
+inline void ConvGroupedGemm(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar * __restrict weights, const Scalar * __restrict biases,
+                            int in_channels, int in_depth, int in_height, int in_width,
+                            int kernel_depth, int kernel_height, int kernel_width,
+                            int stride_depth, int stride_height, int stride_width,
+                            int padding_depth, int padding_height, int padding_width,
+                            ActFun activation_function, Scalar alpha) noexcept
+{
+    // grouped convolution as one im2col + gemm per group: group g only packs its in_channels / groups
+    // input channels and only computes its out_channels / groups columns of the keras
+    // [kernel taps * in_channels / groups][out_channels] weights (patch_size rows). 1d and 2d layers have unit depth (and height)
+    constexpr int tile_pixels = 8;
+    constexpr int group_out = out_channels / groups;
+    constexpr int out_pixels = out_depth * out_height * out_width;
+    const int group_in = in_channels / groups;
+    static std::array<Scalar, patch_size * tile_pixels> patches;
+
+    for (int pixel = 0; pixel < out_pixels; pixel += tile_pixels)
+    {
+        const int pixels = std::min(tile_pixels, out_pixels - pixel);
+        for (int g = 0; g < groups; ++g)
+        {
+            for (int p = 0; p < tile_pixels; ++p)
+            {
+                Scalar *column = patches.data() + p * patch_size;
+                if (p >= pixels)
+                {
+                    for (int k = 0; k < patch_size; ++k) {
+                        column[k] = 0;
+                    }
+                    continue;
+                }
+                const int index = pixel + p;
+                const int d_origin = index / (out_height * out_width) * stride_depth - padding_depth;
+                const int h_origin = index / out_width % out_height * stride_height - padding_height;
+                const int w_origin = index % out_width * stride_width - padding_width;
+                for (int kd = 0; kd < kernel_depth; ++kd)
+                {
+                    const int id = d_origin + kd;
+                    for (int kh = 0; kh < kernel_height; ++kh)
+                    {
+                        const int ih = h_origin + kh;
+                        for (int kw = 0; kw < kernel_width; ++kw)
+                        {
+                            const int iw = w_origin + kw;
+                            Scalar *tap = column + ((kd * kernel_height + kh) * kernel_width + kw) * group_in;
+                            if (id < 0 || id >= in_depth || ih < 0 || ih >= in_height || iw < 0 || iw >= in_width)
+                            {
+                                for (int ic = 0; ic < group_in; ++ic) {
+                                    tap[ic] = 0;
+                                }
+                                continue;
+                            }
+                            const Scalar *in_ptr = inputs + ((id * in_height + ih) * in_width + iw) * in_channels + g * group_in;
+                            for (int ic = 0; ic < group_in; ++ic) {
+                                tap[ic] = in_ptr[ic];
+                            }
+                        }
+                    }
+                }
+            }
+            ConvGemmColumns<Scalar, out_channels, tile_pixels, group_out>(outputs + pixel * out_channels, pixels, g * group_out, patches.data(), weights, biases, patch_size, activation_function, alpha);
+        }
+    }
+}
+template <typename Scalar, int tile_size>
+struct WinogradTransform;
+
+template <typename Scalar>
+struct WinogradTransform<Scalar, 2>
+{
+    // F(2x2, 3x3): input transform B^T and output transform A^T, weights are transformed with G at generation time
+    static constexpr Scalar BT[4][4] = {{1, 0, -1, 0}, {0, 1, 1, 0}, {0, -1, 1, 0}, {0, 1, 0, -1}};
+    static constexpr Scalar AT[2][4] = {{1, 1, 1, 0}, {0, 1, -1, -1}};
+};
+
+template <typename Scalar>
+struct WinogradTransform<Scalar, 4>
+{
+    // F(4x4, 3x3) with the interpolation points 0, 1, -1, 2, -2
+    static constexpr Scalar BT[6][6] = {{4, 0, -5, 0, 1, 0}, {0, -4, -4, 1, 1, 0}, {0, 4, -4, -1, 1, 0},
+                                        {0, -2, -1, 2, 1, 0}, {0, 2, -1, -2, 1, 0}, {0, 4, 0, -5, 0, 1}};
+    static constexpr Scalar AT[4][6] = {{1, 1, 1, 1, 1, 0}, {0, 1, -1, 2, -2, 0}, {0, 1, 1, 4, 4, 0}, {0, 1, -1, 8, -8, 1}};
+};
+
+template <typename Scalar, int tile_size>
+inline void WinogradInputTile(Scalar * __restrict v, int point_stride, const Scalar * __restrict d, int channels) noexcept
+{
+    // v[point * point_stride + c] = (B^T d B)[point] of the input tile d[y][x][c], the transform loops are unrolled
+    // so the zeros and ones of B^T fold away and the channel loop vectorizes
+    using T = WinogradTransform<Scalar, tile_size>;
+    constexpr int n = tile_size + 2;
+    for (int c = 0; c < channels; ++c)
+    {
+        Scalar tmp[n][n];
+        #pragma GCC unroll 8
+        for (int a = 0; a < n; ++a) {
+            #pragma GCC unroll 8
+            for (int x = 0; x < n; ++x) {
+                Scalar sum = 0;
+                #pragma GCC unroll 8
+                for (int y = 0; y < n; ++y) {
+                    if (T::BT[a][y] != 0)
+                        sum += T::BT[a][y] * d[(y * n + x) * channels + c];
+                }
+                tmp[a][x] = sum;
+            }
+        }
+        #pragma GCC unroll 8
+        for (int a = 0; a < n; ++a) {
+            #pragma GCC unroll 8
+            for (int b = 0; b < n; ++b) {
+                Scalar sum = 0;
+                #pragma GCC unroll 8
+                for (int x = 0; x < n; ++x) {
+                    if (T::BT[b][x] != 0)
+                        sum += T::BT[b][x] * tmp[a][x];
+                }
+                v[(a * n + b) * point_stride + c] = sum;
+            }
+        }
+    }
+}
+
+template <typename Scalar, int tile_size, int channels, typename ActFun>
+inline void WinogradOutputTile(Scalar * __restrict outputs, const Scalar * __restrict m, int point_stride, const Scalar * __restrict biases,
+                               int rows, int cols, int out_width, ActFun activation_function, Scalar alpha) noexcept
+{
+    // outputs[i][j][c] = (A^T m A)[i][j] + biases[c] for the first rows x cols outputs of the tile,
+    // m[point * point_stride + c] are the products of the tile
+    using T = WinogradTransform<Scalar, tile_size>;
+    constexpr int n = tile_size + 2;
+    for (int c = 0; c < channels; ++c)
+    {
+        Scalar tmp[tile_size][n];
+        #pragma GCC unroll 8
+        for (int i = 0; i < tile_size; ++i) {
+            #pragma GCC unroll 8
+            for (int b = 0; b < n; ++b) {
+                Scalar sum = 0;
+                #pragma GCC unroll 8
+                for (int a = 0; a < n; ++a) {
+                    if (T::AT[i][a] != 0)
+                        sum += T::AT[i][a] * m[(a * n + b) * point_stride + c];
+                }
+                tmp[i][b] = sum;
+            }
+        }
+        #pragma GCC unroll 8
+        for (int i = 0; i < tile_size; ++i) {
+            #pragma GCC unroll 8
+            for (int j = 0; j < tile_size; ++j) {
+                Scalar sum = biases[c];
+                #pragma GCC unroll 8
+                for (int b = 0; b < n; ++b) {
+                    if (T::AT[j][b] != 0)
+                        sum += T::AT[j][b] * tmp[i][b];
+                }
+                if (i < rows && j < cols)
+                    activation_function(outputs[(i * out_width + j) * channels + c], sum, alpha);
+            }
+        }
+    }
+}
+"""
+
+    # convolution functions
+    convolution_functions = {
+        "Conv1D": """
+template <typename Scalar, int out_channels, int out_length, typename ActFun>
+inline void Conv1D(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar * __restrict weights, const Scalar * __restrict biases,
+                   int in_channels, int in_length, int kernel_size, int stride, int padding,
+                   ActFun activation_function, Scalar alpha) noexcept
+{
+    const int weights_per_tap = in_channels * out_channels;
+
+    // outputs whose whole kernel window lies inside the input, everything else is border
+    const auto [ow_begin, ow_end] = ConvInteriorRange(out_length, in_length, kernel_size, stride, padding);
+
+    // interior outputs read every tap at a fixed offset from the window start, the bounds of
+    // the window are only computed for the border outputs
+    auto output = [&](int ow, auto interior) noexcept
+    {
+        const int origin = ow * stride - padding;
+        Scalar sum_buf[out_channels];
+        for (int oc = 0; oc < out_channels; ++oc) {
+            sum_buf[oc] = biases[oc];
+        }
+
+        if constexpr (decltype(interior)::value)
+        {
+            const Scalar *window = inputs + origin * in_channels;
+            for (int k = 0; k < kernel_size; ++k) {
+                ConvAccumulateTap<Scalar, out_channels>(sum_buf, window + k * in_channels, weights + k * weights_per_tap, in_channels);
+            }
+        }
+        else
+        {
+            const int k_min = std::max(0, -origin);
+            const int k_max = std::min(kernel_size, in_length - origin);
+            for (int k = k_min; k < k_max; ++k) {
+                ConvAccumulateTap<Scalar, out_channels>(sum_buf, inputs + (origin + k) * in_channels, weights + k * weights_per_tap, in_channels);
+            }
+        }
+
+        Scalar *out_ptr = outputs + ow * out_channels;
+        for (int oc = 0; oc < out_channels; ++oc) {
+            activation_function(out_ptr[oc], sum_buf[oc], alpha);
+        }
+    };
+
+    for (int ow = 0; ow < ow_begin; ++ow) {
+        output(ow, std::false_type{});
+    }
+    for (int ow = ow_begin; ow < ow_end; ++ow) {
+        output(ow, std::true_type{});
+    }
+    for (int ow = ow_end; ow < out_length; ++ow) {
+        output(ow, std::false_type{});
+    }
+}
+""",
+        "Conv1DGrouped": """
+template <typename Scalar, int out_channels, int out_length, int groups, int patch_size, typename ActFun>
+inline void Conv1DGrouped(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar * __restrict weights, const Scalar * __restrict biases,
+                          int in_channels, int in_length, int kernel_size, int stride, int padding,
+                          ActFun activation_function, Scalar alpha) noexcept
+{
+    ConvGroupedGemm<Scalar, out_channels, 1, 1, out_length, groups, patch_size>(outputs, inputs, weights, biases, in_channels, 1, 1, in_length,
+                                                                    1, 1, kernel_size, 1, 1, stride, 0, 0, padding, activation_function, alpha);
+}
+""",
+        "Conv1DFFT": """
+template <typename Scalar, int fft_size>
+inline void FFTRadix2(Scalar * __restrict re, Scalar * __restrict im, const Scalar * __restrict twiddles) noexcept
+{
+    // in place forward fft, twiddles holds cos(pi k / half) for the stages half = 1, 2, 4, ... in a row
+    // followed by -sin(pi k / half) in the same order
+    for (int i = 1, j = 0; i < fft_size; ++i)
+    {
+        int bit = fft_size >> 1;
+        for (; j & bit; bit >>= 1) {
+            j ^= bit;
+        }
+        j ^= bit;
+        if (i < j)
+        {
+            std::swap(re[i], re[j]);
+            std::swap(im[i], im[j]);
+        }
+    }
+    for (int half = 1; half < fft_size; half <<= 1)
+    {
+        const Scalar *tw_re = twiddles + half - 1;
+        const Scalar *tw_im = twiddles + fft_size - 1 + half - 1;
+        for (int start = 0; start < fft_size; start += 2 * half)
+        {
+            Scalar *a_re = re + start;
+            Scalar *a_im = im + start;
+            Scalar *b_re = a_re + half;
+            Scalar *b_im = a_im + half;
+            for (int k = 0; k < half; ++k)
+            {
+                const Scalar t_re = b_re[k] * tw_re[k] - b_im[k] * tw_im[k];
+                const Scalar t_im = b_re[k] * tw_im[k] + b_im[k] * tw_re[k];
+                b_re[k] = a_re[k] - t_re;
+                b_im[k] = a_im[k] - t_im;
+                a_re[k] += t_re;
+                a_im[k] += t_im;
+            }
+        }
+    }
+}
+
+template <typename Scalar, int out_channels, int out_length, int fft_size, int in_channels, typename ActFun>
+inline void Conv1DFFT(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar * __restrict spectra, const Scalar * __restrict twiddles,
+                      const Scalar * __restrict biases, int in_length, int kernel_size, int padding,
+                      ActFun activation_function, Scalar alpha) noexcept
+{
+    // stride 1 convolution by overlap-save: every block of fft_size padded inputs gives
+    // fft_size - kernel_size + 1 outputs. spectra holds the fft of the reversed kernels,
+    // scaled by 1 / (2 fft_size), for the bins 0..fft_size / 2 as [re | im][bin][in_channels][out_channels].
+    // the signals are real, so every complex fft transforms two channels at once
+    constexpr int bins = fft_size / 2 + 1;
+    const int block = fft_size - kernel_size + 1;
+    constexpr int spectrum_size = bins * in_channels * out_channels;
+    static std::array<Scalar, 2 * fft_size + 2 * bins * in_channels + 2 * bins * out_channels> buffer;
+    Scalar *re = buffer.data();
+    Scalar *im = re + fft_size;
+    Scalar *x_re = im + fft_size;
+    Scalar *x_im = x_re + bins * in_channels;
+    Scalar *y_re = x_im + bins * in_channels;
+    Scalar *y_im = y_re + bins * out_channels;
+
+    for (int o_begin = 0; o_begin < out_length; o_begin += block)
+    {
+        // spectra (times 2) of the input channels ic and ic + 1 over the padded inputs o_begin - padding ...
+        // from z = fft(x_ic + i x_ic+1): x_ic = z[k] + conj(z[n - k]), x_ic+1 = -i (z[k] - conj(z[n - k]))
+        for (int ic = 0; ic < in_channels; ic += 2)
+        {
+            const bool pair = ic + 1 < in_channels;
+            for (int n = 0; n < fft_size; ++n)
+            {
+                const int i = o_begin - padding + n;
+                const bool inside = i >= 0 && i < in_length;
+                re[n] = inside ? inputs[i * in_channels + ic] : Scalar(0);
+                im[n] = inside && pair ? inputs[i * in_channels + ic + 1] : Scalar(0);
+            }
+            FFTRadix2<Scalar, fft_size>(re, im, twiddles);
+            for (int bin = 0; bin < bins; ++bin)
+            {
+                const int mirror = (fft_size - bin) % fft_size;
+                x_re[bin * in_channels + ic] = re[bin] + re[mirror];
+                x_im[bin * in_channels + ic] = im[bin] - im[mirror];
+                if (pair)
+                {
+                    x_re[bin * in_channels + ic + 1] = im[bin] + im[mirror];
+                    x_im[bin * in_channels + ic + 1] = re[mirror] - re[bin];
+                }
+            }
+        }
+
+        // products with the kernel spectra, summed over the input channels
+        for (int bin = 0; bin < bins; ++bin)
+        {
+            Scalar *yr = y_re + bin * out_channels;
+            Scalar *yi = y_im + bin * out_channels;
+            for (int oc = 0; oc < out_channels; ++oc)
+            {
+                yr[oc] = 0;
+                yi[oc] = 0;
+            }
+            for (int ic = 0; ic < in_channels; ++ic)
+            {
+                const Scalar xr = x_re[bin * in_channels + ic];
+                const Scalar xi = x_im[bin * in_channels + ic];
+                const Scalar *hr = spectra + (bin * in_channels + ic) * out_channels;
+                const Scalar *hi = hr + spectrum_size;
+                for (int oc = 0; oc < out_channels; ++oc)
+                {
+                    yr[oc] += xr * hr[oc] - xi * hi[oc];
+                    yi[oc] += xr * hi[oc] + xi * hr[oc];
+                }
+            }
+        }
+
+        // inverse ffts of the output channels oc and oc + 1 as one forward fft of conj(y_oc + i y_oc+1),
+        // the upper bins follow from the hermitian symmetry of real signals
+        const int count = std::min(block, out_length - o_begin);
+        for (int oc = 0; oc < out_channels; oc += 2)
+        {
+            const bool pair = oc + 1 < out_channels;
+            for (int bin = 0; bin < fft_size; ++bin)
+            {
+                const int k = bin < bins ? bin : fft_size - bin;
+                const Scalar sign = bin < bins ? Scalar(1) : Scalar(-1);
+                const Scalar a1 = y_re[k * out_channels + oc];
+                const Scalar b1 = sign * y_im[k * out_channels + oc];
+                const Scalar a2 = pair ? y_re[k * out_channels + oc + 1] : Scalar(0);
+                const Scalar b2 = pair ? sign * y_im[k * out_channels + oc + 1] : Scalar(0);
+                re[bin] = a1 - b2;
+                im[bin] = -(b1 + a2);
+            }
+            FFTRadix2<Scalar, fft_size>(re, im, twiddles);
+            for (int t = 0; t < count; ++t)
+            {
+                Scalar *out_ptr = outputs + (o_begin + t) * out_channels + oc;
+                activation_function(out_ptr[0], re[kernel_size - 1 + t] + biases[oc], alpha);
+                if (pair)
+                    activation_function(out_ptr[1], -im[kernel_size - 1 + t] + biases[oc + 1], alpha);
+            }
+        }
+    }
+}
+""",
+        "Conv1DTranspose": """
+template <typename Scalar, int out_channels, int out_length, typename ActFun>
+inline void Conv1DTranspose(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar * __restrict kernels, const Scalar * __restrict biases, int in_channels,int in_length, int kernel_width, int stride, int padding, ActFun activation_function, Scalar alpha) noexcept
+{
+    // the kernel is flipped and laid out (kw, in_channels, out_channels) at generation time, so every
+    // output gathers its inputs in increasing order and accumulates all of its channels at once
+    const int weights_per_tap = in_channels * out_channels;
+
+    for (int ow = 0; ow < out_length; ++ow)
+    {
+        Scalar sum_buf[out_channels];
+        for (int oc = 0; oc < out_channels; ++oc) {
+            sum_buf[oc] = biases[oc];
+        }
+
+        const int w_base = ow + padding - (kernel_width - 1);
+        const auto [kw_first, kw_last] = ConvTransposeTaps(w_base, kernel_width, stride, in_length);
+        for (int kw = kw_first; kw < kw_last; kw += stride)
+        {
+            const Scalar *in_ptr = inputs + ((w_base + kw) / stride) * in_channels;
+            const Scalar *w_ptr = kernels + kw * weights_per_tap;
+
+            ConvAccumulateTap<Scalar, out_channels>(sum_buf, in_ptr, w_ptr, in_channels);
+        }
+
+        Scalar *out_ptr = outputs + ow * out_channels;
+        for (int oc = 0; oc < out_channels; ++oc) {
+            activation_function(out_ptr[oc], sum_buf[oc], alpha);
+        }
+    }
+}
+""",
+        "Conv1DTransposeSubPixel": """
+template <typename Scalar, int out_channels, int out_length, typename ActFun>
+inline void Conv1DTransposeSubPixel(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar * __restrict kernels, const Scalar * __restrict biases, int in_channels,int in_length, int kernel_width, int stride, int padding, ActFun activation_function, Scalar alpha) noexcept
+{
+    // codeGen splits the flipped kernel into one small kernel per output phase, phase r holds the taps
+    // that reach the outputs q * stride + r. every phase is a dense stride 1 convolution over the inputs
+    // whose results are written interleaved, so no tap ever lands between two input samples
+    const int weights_per_tap = in_channels * out_channels;
+    const Scalar *phase_kernel = kernels;
+
+    for (int rw = 0; rw < stride; ++rw)
+    {
+        const auto [kw_count, w_offset] = ConvTransposePhase(rw, kernel_width, stride, padding);
+
+        for (int ow = rw, qw = 0; ow < out_length; ow += stride, ++qw)
+        {
+            Scalar sum_buf[out_channels];
             for (int oc = 0; oc < out_channels; ++oc) {
                 sum_buf[oc] = biases[oc];
             }
-            const int w_origin = ow * stride_width - padding_width;
 
-            const int kh_min = std::max(0,       -h_origin);
+            const int w_origin = qw + w_offset;
+            const int jw_min = std::max(0, -w_origin);
+            const int jw_max = std::min(kw_count, in_length - w_origin);
+            for (int jw = jw_min; jw < jw_max; ++jw)
+            {
+                const Scalar *in_ptr = inputs + (w_origin + jw) * in_channels;
+                const Scalar *w_ptr = phase_kernel + jw * weights_per_tap;
+
+                ConvAccumulateTap<Scalar, out_channels>(sum_buf, in_ptr, w_ptr, in_channels);
+            }
+
+            Scalar *out_ptr = outputs + ow * out_channels;
+            for (int oc = 0; oc < out_channels; ++oc) {
+                activation_function(out_ptr[oc], sum_buf[oc], alpha);
+            }
+        }
+        phase_kernel += kw_count * weights_per_tap;
+    }
+}
+""",
+        "Conv2D": """
+template <typename Scalar, int out_channels, int out_height, int out_width, typename ActivationFunc>
+inline void Conv2D(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar *__restrict weights, const Scalar *__restrict biases, int in_channels, int in_height, int in_width, int kernel_height, int kernel_width, int stride_height, int stride_width, int padding_height, int padding_width, ActivationFunc activation_function, Scalar alpha) noexcept
+{
+    const int input_row_stride = in_width * in_channels;
+    const int weights_per_khkw = in_channels * out_channels;  
+    const int weights_per_kh = kernel_width * weights_per_khkw;
+
+    // output pixels whose whole kernel window lies inside the input, everything else is border
+    const auto [oh_begin, oh_end] = ConvInteriorRange(out_height, in_height, kernel_height, stride_height, padding_height);
+    const auto [ow_begin, ow_end] = ConvInteriorRange(out_width, in_width, kernel_width, stride_width, padding_width);
+
+    // interior pixels read every tap at a fixed offset from the window corner, the bounds of
+    // the window are only computed for the border pixels
+    auto pixel = [&](int oh, int ow, auto interior) noexcept
+    {
+        const int h_origin = oh * stride_height - padding_height;
+        const int w_origin = ow * stride_width - padding_width;
+        Scalar sum_buf[out_channels];
+        for (int oc = 0; oc < out_channels; ++oc) {
+            sum_buf[oc] = biases[oc];
+        }
+
+        if constexpr (decltype(interior)::value)
+        {
+            const Scalar *window = inputs + h_origin * input_row_stride + w_origin * in_channels;
+            for (int kh = 0; kh < kernel_height; ++kh)
+            {
+                const Scalar *in_row = window + kh * input_row_stride;
+                const Scalar *w_row = weights + kh * weights_per_kh;
+
+                for (int kw = 0; kw < kernel_width; ++kw)
+                {
+                    ConvAccumulateTap<Scalar, out_channels>(sum_buf, in_row + kw * in_channels, w_row + kw * weights_per_khkw, in_channels);
+                }
+            }
+        }
+        else
+        {
+            const int kh_min = std::max(0, -h_origin);
             const int kh_max = std::min(kernel_height, in_height - h_origin);
-            const int kw_min = std::max(0,       -w_origin);
+            const int kw_min = std::max(0, -w_origin);
             const int kw_max = std::min(kernel_width, in_width - w_origin);
-
             for (int kh = kh_min; kh < kh_max; ++kh)
             {
-                const int in_h = h_origin + kh;
-                const int input_row_offset = in_h * input_row_stride;
-                const int weight_kh_offset = kh * weights_per_kh;
+                const Scalar *in_row = inputs + (h_origin + kh) * input_row_stride;
+                const Scalar *w_row = weights + kh * weights_per_kh;
 
                 for (int kw = kw_min; kw < kw_max; ++kw)
                 {
-                    const int in_w = w_origin + kw;
-                    const int input_base = input_row_offset + in_w * in_channels;
+                    ConvAccumulateTap<Scalar, out_channels>(sum_buf, in_row + (w_origin + kw) * in_channels, w_row + kw * weights_per_khkw, in_channels);
+                }
+            }
+        }
+
+        Scalar *out_pixel_ptr = outputs + ((oh * out_width + ow) * out_channels);
+        for (int oc = 0; oc < out_channels; ++oc) {
+            activation_function(out_pixel_ptr[oc], sum_buf[oc], alpha);
+        }
+    };
+
+    // the top and bottom border strips are whole rows, the interior rows have a left and a
+    // right border strip around their interior pixels
+    for (int oh = 0; oh < out_height; ++oh)
+    {
+        if (oh < oh_begin || oh >= oh_end)
+        {
+            for (int ow = 0; ow < out_width; ++ow) {
+                pixel(oh, ow, std::false_type{});
+            }
+            continue;
+        }
+        for (int ow = 0; ow < ow_begin; ++ow) {
+            pixel(oh, ow, std::false_type{});
+        }
+        for (int ow = ow_begin; ow < ow_end; ++ow) {
+            pixel(oh, ow, std::true_type{});
+        }
+        for (int ow = ow_end; ow < out_width; ++ow) {
+            pixel(oh, ow, std::false_type{});
+        }
+    }
+}
+""",
+        "Conv2DGemm": """
+template <typename Scalar, int out_channels, int out_height, int out_width, int patch_size, typename ActivationFunc>
+inline void Conv2DGemm(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar *__restrict weights, const Scalar *__restrict biases, int in_channels, int in_height, int in_width, int kernel_height, int kernel_width, int stride_height, int stride_width, int padding_height, int padding_width, ActivationFunc activation_function, Scalar alpha) noexcept
+{
+    // im2col + gemm: the patches of tile_pixels output pixels are packed (zero padded) into
+    // a [tile_pixels][patch_size] buffer that is multiplied with the [patch_size][out_channels] weights,
+    // patch_size = kernel_height * kernel_width * in_channels
+    constexpr int tile_pixels = 8;
+    constexpr int out_pixels = out_height * out_width;
+    static std::array<Scalar, patch_size * tile_pixels> patches;
+
+    for (int pixel = 0; pixel < out_pixels; pixel += tile_pixels)
+    {
+        const int pixels = std::min(tile_pixels, out_pixels - pixel);
+        for (int p = 0; p < tile_pixels; ++p)
+        {
+            Scalar *column = patches.data() + p * patch_size;
+            if (p >= pixels)
+            {
+                for (int k = 0; k < patch_size; ++k) {
+                    column[k] = 0;
+                }
+                continue;
+            }
+            const int h_origin = (pixel + p) / out_width * stride_height - padding_height;
+            const int w_origin = (pixel + p) % out_width * stride_width - padding_width;
+            ConvPackPatch2D(column, inputs, h_origin, w_origin, in_channels, in_height, in_width, kernel_height, kernel_width);
+        }
+        ConvGemmTile<Scalar, out_channels, tile_pixels>(outputs + pixel * out_channels, pixels, patches.data(), weights, biases, patch_size, activation_function, alpha);
+    }
+}
+""",
+        "Conv2DInt8": """
+template <typename Scalar, int out_channels, int out_height, int out_width, int patch_size, int in_size, typename Input, typename Output, typename ActivationFunc>
+inline void Conv2DInt8(Output * __restrict outputs, const Input * __restrict inputs, const int8_t *__restrict weights, const Scalar *__restrict weight_scales, const Scalar *__restrict biases, int in_channels, int in_height, int in_width, int kernel_height, int kernel_width, int stride_height, int stride_width, int padding_height, int padding_width, Scalar input_scale, Scalar output_scale, ActivationFunc activation_function, Scalar alpha) noexcept
+{
+    // Conv2DGemm on the int8 quantized input (zero stays exactly zero for the padding)
+    // with int8 weights [out_channels][patch_size] and int32 accumulators, in_size = in_height * in_width * in_channels.
+    // int8 Input / Output are passed between consecutive int8 layers (see StoreInt8Outputs)
+    constexpr int tile_pixels = 8;
+    constexpr int out_pixels = out_height * out_width;
+    const auto *quantized = QuantizedInputs<in_size>(inputs, input_scale);
+    static std::array<int16_t, patch_size * tile_pixels> patches;
+    Scalar values[tile_pixels * out_channels];
+
+    for (int pixel = 0; pixel < out_pixels; pixel += tile_pixels)
+    {
+        // ConvGemmInt8Tile only reads the patches of the pixels of the tile
+        const int pixels = std::min(tile_pixels, out_pixels - pixel);
+        for (int p = 0; p < pixels; ++p)
+        {
+            const int h_origin = (pixel + p) / out_width * stride_height - padding_height;
+            const int w_origin = (pixel + p) % out_width * stride_width - padding_width;
+            ConvPackPatch2D(patches.data() + p * patch_size, quantized, h_origin, w_origin, in_channels, in_height, in_width, kernel_height, kernel_width);
+        }
+        ConvGemmInt8Tile<Scalar, out_channels>(values, pixels, patches.data(), weights, weight_scales, biases, input_scale, patch_size, activation_function, alpha);
+        StoreInt8Outputs(outputs + pixel * out_channels, values, pixels * out_channels, output_scale);
+    }
+}
+""",
+        "Conv2DFusedInt8": """
+template <typename Scalar, int out_channels, int out_height, int out_width, int pool_height, int pool_width, bool max_pool, int patch_size, int in_size, typename Input, typename Output, typename ActivationFunc>
+inline void Conv2DFusedInt8(Output * __restrict outputs, const Input * __restrict inputs, const int8_t *__restrict weights, const Scalar *__restrict weight_scales, const Scalar *__restrict biases, int in_channels, int in_height, int in_width, int kernel_height, int kernel_width, int stride_height, int stride_width, int padding_height, int padding_width, int pool_stride_height, int pool_stride_width, Scalar input_scale, Scalar output_scale, ActivationFunc activation_function, Scalar alpha) noexcept
+{
+    // Conv2DFused with the int8 gemm of Conv2DInt8: the conv outputs of every pooling window position
+    // are reduced into a tile of pooled outputs in floating point, which is stored by StoreInt8Outputs
+    constexpr int tile_pixels = 8;
+    constexpr int out_pixels = out_height * out_width;
+    const auto *quantized = QuantizedInputs<in_size>(inputs, input_scale);
+    static std::array<int16_t, patch_size * tile_pixels> patches;
+    Scalar pooled[tile_pixels * out_channels];
+    Scalar window[tile_pixels * out_channels];
+
+    for (int pixel = 0; pixel < out_pixels; pixel += tile_pixels)
+    {
+        const int pixels = std::min(tile_pixels, out_pixels - pixel);
+        for (int ph = 0; ph < pool_height; ++ph)
+        {
+            for (int pw = 0; pw < pool_width; ++pw)
+            {
+                for (int p = 0; p < pixels; ++p)
+                {
+                    // conv output pixel of this window position
+                    const int oh = (pixel + p) / out_width * pool_stride_height + ph;
+                    const int ow = (pixel + p) % out_width * pool_stride_width + pw;
+                    ConvPackPatch2D(patches.data() + p * patch_size, quantized, oh * stride_height - padding_height, ow * stride_width - padding_width,
+                                    in_channels, in_height, in_width, kernel_height, kernel_width);
+                }
+                // the first window position initializes the pooled outputs
+                const bool first = ph == 0 && pw == 0;
+                ConvGemmInt8Tile<Scalar, out_channels>(first ? pooled : window, pixels, patches.data(), weights, weight_scales, biases, input_scale, patch_size, activation_function, alpha);
+                if (first)
+                    continue;
+                for (int i = 0; i < pixels * out_channels; ++i)
+                {
+                    if constexpr (max_pool)
+                        pooled[i] = std::max(pooled[i], window[i]);
+                    else
+                        pooled[i] += window[i];
+                }
+            }
+        }
+        if constexpr (!max_pool)
+        {
+            for (int i = 0; i < pixels * out_channels; ++i) {
+                pooled[i] *= Scalar(1) / Scalar(pool_height * pool_width);
+            }
+        }
+        StoreInt8Outputs(outputs + pixel * out_channels, pooled, pixels * out_channels, output_scale);
+    }
+}
+""",
+        "Conv2DGlobalPoolInt8": """
+template <typename Scalar, int out_channels, int conv_height, int conv_width, bool max_pool, int patch_size, int in_size, typename Input, typename Output, typename ActivationFunc>
+inline void Conv2DGlobalPoolInt8(Output * __restrict outputs, const Input * __restrict inputs, const int8_t *__restrict weights, const Scalar *__restrict weight_scales, const Scalar *__restrict biases, int in_channels, int in_height, int in_width, int kernel_height, int kernel_width, int stride_height, int stride_width, int padding_height, int padding_width, Scalar pool_scale, Scalar input_scale, Scalar output_scale, ActivationFunc activation_function, Scalar alpha) noexcept
+{
+    // Conv2DGlobalPool with the int8 gemm of Conv2DInt8, the pooled channels are stored by StoreInt8Outputs
+    constexpr int tile_pixels = 8;
+    constexpr int conv_pixels = conv_height * conv_width;
+    const auto *quantized = QuantizedInputs<in_size>(inputs, input_scale);
+    static std::array<int16_t, patch_size * tile_pixels> patches;
+    Scalar window[tile_pixels * out_channels];
+    Scalar pooled[out_channels];
+    for (int oc = 0; oc < out_channels; ++oc) {
+        pooled[oc] = max_pool ? -std::numeric_limits<Scalar>::infinity() : Scalar(0);
+    }
+
+    for (int pixel = 0; pixel < conv_pixels; pixel += tile_pixels)
+    {
+        const int pixels = std::min(tile_pixels, conv_pixels - pixel);
+        for (int p = 0; p < pixels; ++p)
+        {
+            const int h_origin = (pixel + p) / conv_width * stride_height - padding_height;
+            const int w_origin = (pixel + p) % conv_width * stride_width - padding_width;
+            ConvPackPatch2D(patches.data() + p * patch_size, quantized, h_origin, w_origin, in_channels, in_height, in_width, kernel_height, kernel_width);
+        }
+        ConvGemmInt8Tile<Scalar, out_channels>(window, pixels, patches.data(), weights, weight_scales, biases, input_scale, patch_size, activation_function, alpha);
+        ConvReduceTile<Scalar, out_channels, max_pool>(pooled, window, pixels);
+    }
+    if constexpr (!max_pool)
+    {
+        for (int oc = 0; oc < out_channels; ++oc) {
+            pooled[oc] *= pool_scale;
+        }
+    }
+    StoreInt8Outputs(outputs, pooled, out_channels, output_scale);
+}
+""",
+        "Conv2DHalf": """
+template <typename Scalar, int out_channels, int out_height, int out_width, bool bfloat, int patch_size, typename ActivationFunc>
+inline void Conv2DHalf(Scalar * __restrict outputs, const Scalar * __restrict inputs, const uint16_t *__restrict weights, const Scalar *__restrict biases, int in_channels, int in_height, int in_width, int kernel_height, int kernel_width, int stride_height, int stride_width, int padding_height, int padding_width, ActivationFunc activation_function, Scalar alpha) noexcept
+{
+    // Conv2DGemm with fp16 / bfloat16 weights [patch_size][out_channels]: every weight row is
+    // widened once per tile of pixels and multiplied into the sums of all of them
+    constexpr int tile_pixels = 8;
+    constexpr int out_pixels = out_height * out_width;
+    static std::array<Scalar, patch_size * tile_pixels> patches;
+    Scalar sums[tile_pixels * out_channels];
+    Scalar row[out_channels];
+
+    for (int pixel = 0; pixel < out_pixels; pixel += tile_pixels)
+    {
+        const int pixels = std::min(tile_pixels, out_pixels - pixel);
+        for (int p = 0; p < tile_pixels; ++p)
+        {
+            Scalar *column = patches.data() + p * patch_size;
+            for (int oc = 0; oc < out_channels; ++oc) {
+                sums[p * out_channels + oc] = biases[oc];
+            }
+            if (p >= pixels)
+            {
+                for (int k = 0; k < patch_size; ++k) {
+                    column[k] = 0;
+                }
+                continue;
+            }
+            const int h_origin = (pixel + p) / out_width * stride_height - padding_height;
+            const int w_origin = (pixel + p) % out_width * stride_width - padding_width;
+            ConvPackPatch2D(column, inputs, h_origin, w_origin, in_channels, in_height, in_width, kernel_height, kernel_width);
+        }
+        for (int k = 0; k < patch_size; ++k)
+        {
+            const uint16_t *w = weights + k * out_channels;
+            for (int oc = 0; oc < out_channels; ++oc) {
+                row[oc] = Scalar(HalfWeight<bfloat>(w[oc]));
+            }
+            for (int p = 0; p < tile_pixels; ++p)
+            {
+                const Scalar a = patches[p * patch_size + k];
+                Scalar *sum = sums + p * out_channels;
+                for (int oc = 0; oc < out_channels; ++oc) {
+                    sum[oc] += a * row[oc];
+                }
+            }
+        }
+        for (int p = 0; p < pixels; ++p)
+        {
+            for (int oc = 0; oc < out_channels; ++oc) {
+                activation_function(outputs[(pixel + p) * out_channels + oc], sums[p * out_channels + oc], alpha);
+            }
+        }
+    }
+}
+""",
+        "Conv2DSparse": """
+template <typename Scalar, int out_channels, int out_height, int out_width, int block, int patch_size, typename ActivationFunc>
+inline void Conv2DSparse(Scalar * __restrict outputs, const Scalar * __restrict inputs, const int32_t *__restrict starts, const uint16_t *__restrict columns, const Scalar *__restrict values, const Scalar *__restrict biases, int in_channels, int in_height, int in_width, int kernel_height, int kernel_width, int stride_height, int stride_width, int padding_height, int padding_width, ActivationFunc activation_function, Scalar alpha) noexcept
+{
+    // Conv2DGemm with pruned weights [patch_size][out_channels] kept as the nonzero blocks of every
+    // patch row (see DenseSparse), every block is multiplied into the sums of a tile of pixels
+    constexpr int tile_pixels = 8;
+    constexpr int out_pixels = out_height * out_width;
+    constexpr int padded_channels = (out_channels + block - 1) / block * block;
+    static std::array<Scalar, patch_size * tile_pixels> patches;
+    Scalar sums[tile_pixels * padded_channels];
+
+    for (int pixel = 0; pixel < out_pixels; pixel += tile_pixels)
+    {
+        const int pixels = std::min(tile_pixels, out_pixels - pixel);
+        for (int p = 0; p < tile_pixels; ++p)
+        {
+            Scalar *column = patches.data() + p * patch_size;
+            for (int oc = 0; oc < padded_channels; ++oc) {
+                sums[p * padded_channels + oc] = oc < out_channels ? biases[oc] : Scalar(0);
+            }
+            if (p >= pixels)
+            {
+                for (int k = 0; k < patch_size; ++k) {
+                    column[k] = 0;
+                }
+                continue;
+            }
+            const int h_origin = (pixel + p) / out_width * stride_height - padding_height;
+            const int w_origin = (pixel + p) % out_width * stride_width - padding_width;
+            ConvPackPatch2D(column, inputs, h_origin, w_origin, in_channels, in_height, in_width, kernel_height, kernel_width);
+        }
+        for (int k = 0; k < patch_size; ++k)
+        {
+            for (int b = starts[k]; b < starts[k + 1]; ++b)
+            {
+                const Scalar *v = values + b * block;
+                const int first = int(columns[b]) * block;
+                for (int p = 0; p < tile_pixels; ++p)
+                {
+                    const Scalar a = patches[p * patch_size + k];
+                    Scalar *sum = sums + p * padded_channels + first;
+                    for (int t = 0; t < block; ++t) {
+                        sum[t] += a * v[t];
+                    }
+                }
+            }
+        }
+        for (int p = 0; p < pixels; ++p)
+        {
+            for (int oc = 0; oc < out_channels; ++oc) {
+                activation_function(outputs[(pixel + p) * out_channels + oc], sums[p * padded_channels + oc], alpha);
+            }
+        }
+    }
+}
+""",
+        "Conv2DPalette": """
+template <typename Scalar, int out_channels, int out_height, int out_width, int clusters, int patch_size, typename ActivationFunc>
+inline void Conv2DPalette(Scalar * __restrict outputs, const Scalar * __restrict inputs, const uint8_t *__restrict indices, const Scalar *__restrict codebook, const Scalar *__restrict biases, int in_channels, int in_height, int in_width, int kernel_height, int kernel_width, int stride_height, int stride_width, int padding_height, int padding_width, ActivationFunc activation_function, Scalar alpha) noexcept
+{
+    // Conv2DGemm with palettized weights [patch_size][out_channels]: every weight row is looked up
+    // in the codebook once per tile of pixels and multiplied into the sums of all of them
+    constexpr int tile_pixels = 8;
+    constexpr int out_pixels = out_height * out_width;
+    static std::array<Scalar, patch_size * tile_pixels> patches;
+    Scalar sums[tile_pixels * out_channels];
+    Scalar row[out_channels];
+
+    for (int pixel = 0; pixel < out_pixels; pixel += tile_pixels)
+    {
+        const int pixels = std::min(tile_pixels, out_pixels - pixel);
+        for (int p = 0; p < tile_pixels; ++p)
+        {
+            Scalar *column = patches.data() + p * patch_size;
+            for (int oc = 0; oc < out_channels; ++oc) {
+                sums[p * out_channels + oc] = biases[oc];
+            }
+            if (p >= pixels)
+            {
+                for (int k = 0; k < patch_size; ++k) {
+                    column[k] = 0;
+                }
+                continue;
+            }
+            const int h_origin = (pixel + p) / out_width * stride_height - padding_height;
+            const int w_origin = (pixel + p) % out_width * stride_width - padding_width;
+            ConvPackPatch2D(column, inputs, h_origin, w_origin, in_channels, in_height, in_width, kernel_height, kernel_width);
+        }
+        for (int k = 0; k < patch_size; ++k)
+        {
+            for (int oc = 0; oc < out_channels; ++oc) {
+                row[oc] = codebook[PaletteIndex<clusters>(indices, k * out_channels + oc)];
+            }
+            for (int p = 0; p < tile_pixels; ++p)
+            {
+                const Scalar a = patches[p * patch_size + k];
+                Scalar *sum = sums + p * out_channels;
+                for (int oc = 0; oc < out_channels; ++oc) {
+                    sum[oc] += a * row[oc];
+                }
+            }
+        }
+        for (int p = 0; p < pixels; ++p)
+        {
+            for (int oc = 0; oc < out_channels; ++oc) {
+                activation_function(outputs[(pixel + p) * out_channels + oc], sums[p * out_channels + oc], alpha);
+            }
+        }
+    }
+}
+""",
+        "Conv2DPointwise": """
+template <typename Scalar, int out_channels, int out_height, int out_width, typename ActivationFunc>
+inline void Conv2DPointwise(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar *__restrict weights, const Scalar *__restrict biases, int in_channels, ActivationFunc activation_function, Scalar alpha) noexcept
+{
+    // 1x1 stride 1 Conv2D as a [out_height * out_width][in_channels] x [in_channels][out_channels] gemm
+    ConvPointwise<Scalar, out_channels, out_height * out_width>(outputs, inputs, weights, biases, in_channels, activation_function, alpha);
+}
+""",
+        "Conv2DGrouped": """
+template <typename Scalar, int out_channels, int out_height, int out_width, int groups, int patch_size, typename ActivationFunc>
+inline void Conv2DGrouped(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar *__restrict weights, const Scalar *__restrict biases, int in_channels, int in_height, int in_width, int kernel_height, int kernel_width, int stride_height, int stride_width, int padding_height, int padding_width, ActivationFunc activation_function, Scalar alpha) noexcept
+{
+    ConvGroupedGemm<Scalar, out_channels, 1, out_height, out_width, groups, patch_size>(outputs, inputs, weights, biases, in_channels, 1, in_height, in_width,
+                                                                           1, kernel_height, kernel_width, 1, stride_height, stride_width,
+                                                                           0, padding_height, padding_width, activation_function, alpha);
+}
+""",
+        "Conv2DFused": """
+template <typename Scalar, int out_channels, int out_height, int out_width, int pool_height, int pool_width, bool max_pool, int patch_size, typename ActivationFunc>
+inline void Conv2DFused(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar *__restrict weights, const Scalar *__restrict biases, int in_channels, int in_height, int in_width, int kernel_height, int kernel_width, int stride_height, int stride_width, int padding_height, int padding_width, int pool_stride_height, int pool_stride_width, ActivationFunc activation_function, Scalar alpha) noexcept
+{
+    // Conv2D + (batch normalization folded into the weights and biases) + activation + valid max or average pooling.
+    // for every tile of pooled pixels the conv outputs of each pooling window position are computed with
+    // im2col + gemm and reduced into the pooled outputs, the full resolution tensor is never written
+    constexpr int tile_pixels = 8;
+    constexpr int out_pixels = out_height * out_width;
+    static std::array<Scalar, patch_size * tile_pixels> patches;
+    Scalar window[tile_pixels * out_channels];
+
+    for (int pixel = 0; pixel < out_pixels; pixel += tile_pixels)
+    {
+        const int pixels = std::min(tile_pixels, out_pixels - pixel);
+        Scalar *out_tile = outputs + pixel * out_channels;
+        for (int ph = 0; ph < pool_height; ++ph)
+        {
+            for (int pw = 0; pw < pool_width; ++pw)
+            {
+                for (int p = 0; p < tile_pixels; ++p)
+                {
+                    Scalar *column = patches.data() + p * patch_size;
+                    if (p >= pixels)
+                    {
+                        for (int k = 0; k < patch_size; ++k) {
+                            column[k] = 0;
+                        }
+                        continue;
+                    }
+                    // conv output pixel of this window position
+                    const int oh = (pixel + p) / out_width * pool_stride_height + ph;
+                    const int ow = (pixel + p) % out_width * pool_stride_width + pw;
+                    ConvPackPatch2D(column, inputs, oh * stride_height - padding_height, ow * stride_width - padding_width,
+                                    in_channels, in_height, in_width, kernel_height, kernel_width);
+                }
+                // the first window position initializes the pooled outputs
+                const bool first = ph == 0 && pw == 0;
+                ConvGemmTile<Scalar, out_channels, tile_pixels>(first ? out_tile : window, pixels, patches.data(), weights, biases, patch_size, activation_function, alpha);
+                if (first)
+                    continue;
+                for (int i = 0; i < pixels * out_channels; ++i)
+                {
+                    if constexpr (max_pool)
+                        out_tile[i] = std::max(out_tile[i], window[i]);
+                    else
+                        out_tile[i] += window[i];
+                }
+            }
+        }
+        if constexpr (!max_pool)
+        {
+            for (int i = 0; i < pixels * out_channels; ++i) {
+                out_tile[i] *= Scalar(1) / Scalar(pool_height * pool_width);
+            }
+        }
+    }
+}
+""",
+        "Conv2DGlobalPool": """
+template <typename Scalar, int out_channels, int conv_height, int conv_width, bool max_pool, int patch_size, typename ActivationFunc>
+inline void Conv2DGlobalPool(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar *__restrict weights, const Scalar *__restrict biases, int in_channels, int in_height, int in_width, int kernel_height, int kernel_width, int stride_height, int stride_width, int padding_height, int padding_width, Scalar pool_scale, ActivationFunc activation_function, Scalar alpha) noexcept
+{
+    // Conv2D + (batch normalization folded into the weights and biases) + activation + global max or average
+    // pooling (times pool_scale, 1 / (conv_height * conv_width) unless it is folded into the next layer).
+    // every tile of conv_height x conv_width conv outputs is reduced into outputs[out_channels] right away
+    constexpr int tile_pixels = 8;
+    constexpr int conv_pixels = conv_height * conv_width;
+    static std::array<Scalar, patch_size * tile_pixels> patches;
+    Scalar window[tile_pixels * out_channels];
+    for (int oc = 0; oc < out_channels; ++oc) {
+        outputs[oc] = max_pool ? -std::numeric_limits<Scalar>::infinity() : Scalar(0);
+    }
+
+    for (int pixel = 0; pixel < conv_pixels; pixel += tile_pixels)
+    {
+        const int pixels = std::min(tile_pixels, conv_pixels - pixel);
+        for (int p = 0; p < tile_pixels; ++p)
+        {
+            Scalar *column = patches.data() + p * patch_size;
+            if (p >= pixels)
+            {
+                for (int k = 0; k < patch_size; ++k) {
+                    column[k] = 0;
+                }
+                continue;
+            }
+            const int h_origin = (pixel + p) / conv_width * stride_height - padding_height;
+            const int w_origin = (pixel + p) % conv_width * stride_width - padding_width;
+            ConvPackPatch2D(column, inputs, h_origin, w_origin, in_channels, in_height, in_width, kernel_height, kernel_width);
+        }
+        ConvGemmTile<Scalar, out_channels, tile_pixels>(window, pixels, patches.data(), weights, biases, patch_size, activation_function, alpha);
+        ConvReduceTile<Scalar, out_channels, max_pool>(outputs, window, pixels);
+    }
+    if constexpr (!max_pool)
+    {
+        for (int oc = 0; oc < out_channels; ++oc) {
+            outputs[oc] *= pool_scale;
+        }
+    }
+}
+""",
+        "Conv2DWinograd": """
+template <typename Scalar, int out_channels, int out_height, int out_width, int tile_size, int in_channels, typename ActivationFunc>
+inline void Conv2DWinograd(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar *__restrict weights, const Scalar *__restrict biases, int in_height, int in_width, int padding_height, int padding_width, ActivationFunc activation_function, Scalar alpha) noexcept
+{
+    // winograd F(tile_size x tile_size, 3x3) for stride 1 3x3 convolutions, every tile of outputs is
+    // A^T [(G g G^T) . (B^T d B)] A. the weights are transformed at generation time and stored as
+    // [point][in_channels][out_channels], the products of a batch of tiles are one gemm per point
+    // of the transformed inputs v[point][tile][ic]
+    constexpr int tile_input = tile_size + 2;
+    constexpr int points = tile_input * tile_input;
+    constexpr int tiles_height = (out_height + tile_size - 1) / tile_size;
+    constexpr int tiles_width = (out_width + tile_size - 1) / tile_size;
+    constexpr int tiles = tiles_height * tiles_width;
+    constexpr int tile_batch = 8;
+    static std::array<Scalar, points * in_channels> d;
+    static std::array<Scalar, points * tile_batch * in_channels> v;
+    static std::array<Scalar, points * tile_batch * out_channels> m;
+    const auto assign = [](Scalar &out, Scalar value, Scalar) noexcept { out = value; };
+
+    for (int tile_begin = 0; tile_begin < tiles; tile_begin += tile_batch)
+    {
+        const int batch = std::min(tile_batch, tiles - tile_begin);
+        for (int t = 0; t < batch; ++t)
+        {
+            const int h_origin = (tile_begin + t) / tiles_width * tile_size - padding_height;
+            const int w_origin = (tile_begin + t) % tiles_width * tile_size - padding_width;
+
+            // zero padded input tile d[y][x][ic]
+            for (int y = 0; y < tile_input; ++y)
+            {
+                for (int x = 0; x < tile_input; ++x)
+                {
+                    const int ih = h_origin + y;
+                    const int iw = w_origin + x;
+                    Scalar *dst = d.data() + (y * tile_input + x) * in_channels;
+                    if (ih < 0 || ih >= in_height || iw < 0 || iw >= in_width)
+                    {
+                        for (int ic = 0; ic < in_channels; ++ic) {
+                            dst[ic] = 0;
+                        }
+                        continue;
+                    }
+                    const Scalar *src = inputs + (ih * in_width + iw) * in_channels;
+                    for (int ic = 0; ic < in_channels; ++ic) {
+                        dst[ic] = src[ic];
+                    }
+                }
+            }
+
+            WinogradInputTile<Scalar, tile_size>(v.data() + t * in_channels, tile_batch * in_channels, d.data(), in_channels);
+        }
+
+        // m[point][tile][oc] = sum_ic v[point][tile][ic] * weights[point][ic][oc]
+        for (int point = 0; point < points; ++point)
+        {
+            ConvGemmTile<Scalar, out_channels, tile_batch>(m.data() + point * tile_batch * out_channels, batch, v.data() + point * in_channels * tile_batch,
+                                                           weights + point * in_channels * out_channels, nullptr, in_channels, assign, Scalar(0));
+        }
+
+        // outputs = A^T m A + biases, the tiles on the bottom and right edges are cut to the output
+        for (int t = 0; t < batch; ++t)
+        {
+            const int oh = (tile_begin + t) / tiles_width * tile_size;
+            const int ow = (tile_begin + t) % tiles_width * tile_size;
+            WinogradOutputTile<Scalar, tile_size, out_channels>(outputs + (oh * out_width + ow) * out_channels, m.data() + t * out_channels, tile_batch * out_channels, biases,
+                                                                std::min(tile_size, out_height - oh), std::min(tile_size, out_width - ow), out_width, activation_function, alpha);
+        }
+    }
+}
+""",
+        "Conv2DUnrolled": """
+template <typename Scalar, int out_channels, int out_height, int out_width,
+          int in_channels, int in_height, int in_width,
+          int kernel_height, int kernel_width, int stride_height, int stride_width,
+          int padding_height, int padding_width, typename ActivationFunc>
+inline void Conv2DUnrolled(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar *__restrict weights, const Scalar *__restrict biases, ActivationFunc activation_function, Scalar alpha) noexcept
+{
+    // every dimension is a template constant so the tap and channel loops are fully unrolled
+    constexpr int input_row_stride = in_width * in_channels;
+    constexpr int weights_per_khkw = in_channels * out_channels;
+    constexpr int weights_per_kh = kernel_width * weights_per_khkw;
+    constexpr std::pair<int, int> rows = ConvInteriorRange(out_height, in_height, kernel_height, stride_height, padding_height);
+    constexpr std::pair<int, int> cols = ConvInteriorRange(out_width, in_width, kernel_width, stride_width, padding_width);
+
+    // the bounds checks are only compiled into the border version of the pixel sums, the
+    // activation stays outside the lambda so the compiler can still inline it
+    auto pixel_sums = [&](Scalar *sum_buf, int oh, int ow, auto interior) noexcept
+    {
+        const int h_origin = oh * stride_height - padding_height;
+        const int w_origin = ow * stride_width - padding_width;
+
+        #pragma GCC unroll 16
+        for (int kh = 0; kh < kernel_height; ++kh)
+        {
+            const int in_h = h_origin + kh;
+            if constexpr (!decltype(interior)::value) {
+                if (in_h < 0 || in_h >= in_height) continue;
+            }
+
+            #pragma GCC unroll 16
+            for (int kw = 0; kw < kernel_width; ++kw)
+            {
+                const int in_w = w_origin + kw;
+                if constexpr (!decltype(interior)::value) {
+                    if (in_w < 0 || in_w >= in_width) continue;
+                }
+                const Scalar *in_ptr = inputs + in_h * input_row_stride + in_w * in_channels;
+                const Scalar *w_ptr = weights + kh * weights_per_kh + kw * weights_per_khkw;
+
+                #pragma GCC unroll 64
+                for (int ic = 0; ic < in_channels; ++ic)
+                {
+                    #pragma GCC unroll 64
+                    for (int oc = 0; oc < out_channels; ++oc) {
+                        sum_buf[oc] += in_ptr[ic] * w_ptr[ic * out_channels + oc];
+                    }
+                }
+            }
+        }
+    };
+
+    for (int oh = 0; oh < out_height; ++oh)
+    {
+        const bool interior_row = oh >= rows.first && oh < rows.second;
+        for (int ow = 0; ow < out_width; ++ow)
+        {
+            Scalar sum_buf[out_channels];
+            #pragma GCC unroll 64
+            for (int oc = 0; oc < out_channels; ++oc) {
+                sum_buf[oc] = biases[oc];
+            }
+
+            if (interior_row && ow >= cols.first && ow < cols.second)
+                pixel_sums(sum_buf, oh, ow, std::true_type{});
+            else
+                pixel_sums(sum_buf, oh, ow, std::false_type{});
+
+            Scalar *out_pixel_ptr = outputs + ((oh * out_width + ow) * out_channels);
+            #pragma GCC unroll 64
+            for (int oc = 0; oc < out_channels; ++oc) {
+                activation_function(out_pixel_ptr[oc], sum_buf[oc], alpha);
+            }
+        }
+    }
+}
+""",
+        "Conv2DTranspose": """
+template <typename Scalar, int out_channels, int out_height, int out_width, typename ActFun>
+inline void Conv2DTranspose(Scalar * __restrict outputs, const Scalar * __restrict inputs,
+                     const Scalar * __restrict kernels, const Scalar * __restrict biases,
+                     int in_channels, int in_height, int in_width,
+                     int kernel_height, int kernel_width, int stride_height,
+                     int stride_width, int padding_height, int padding_width,
+                     ActFun activation_function,
+                     Scalar alpha) noexcept
+{
+    // the kernel is flipped and laid out (kh, kw, in_channels, out_channels) at generation time, so
+    // every output pixel gathers its inputs in increasing order and accumulates all of its channels at once
+    const int input_row_stride = in_width * in_channels;
+    const int weights_per_tap = in_channels * out_channels;
+
+    for (int oh = 0; oh < out_height; ++oh)
+    {
+        const int h_base = oh + padding_height - (kernel_height - 1);
+        const auto [kh_first, kh_last] = ConvTransposeTaps(h_base, kernel_height, stride_height, in_height);
+
+        for (int ow = 0; ow < out_width; ++ow)
+        {
+            Scalar sum_buf[out_channels];
+            for (int oc = 0; oc < out_channels; ++oc) {
+                sum_buf[oc] = biases[oc];
+            }
 
-                    const int weight_base = weight_kh_offset + (kw * weights_per_khkw);
+            const int w_base = ow + padding_width - (kernel_width - 1);
+            const auto [kw_first, kw_last] = ConvTransposeTaps(w_base, kernel_width, stride_width, in_width);
+            for (int kh = kh_first; kh < kh_last; kh += stride_height)
+            {
+                const Scalar *in_row = inputs + ((h_base + kh) / stride_height) * input_row_stride;
 
-                    for (int ic = 0; ic < in_channels; ++ic)
-                    {
-                        const Scalar input_val = inputs[input_base + ic];
-                        const Scalar *w_ptr = weights + weight_base + ic * out_channels;
+                for (int kw = kw_first; kw < kw_last; kw += stride_width)
+                {
+                    const Scalar *in_ptr = in_row + ((w_base + kw) / stride_width) * in_channels;
+                    const Scalar *w_ptr = kernels + (kh * kernel_width + kw) * weights_per_tap;
 
-                        
-                        for (int oc = 0; oc < out_channels; ++oc) {
-                            sum_buf[oc] += input_val * w_ptr[oc];
-                        }
-                    }
+                    ConvAccumulateTap<Scalar, out_channels>(sum_buf, in_ptr, w_ptr, in_channels);
                 }
             }
 
@@ -402,148 +2240,244 @@ inline void Conv2D(Scalar * __restrict outputs, const Scalar * __restrict inputs
     }
 }
 """,
-        "Conv2DTranspose": """
+        "Conv2DTransposeSubPixel": """
 template <typename Scalar, int out_channels, int out_height, int out_width, typename ActFun>
-inline void Conv2DTranspose(Scalar * __restrict outputs, const Scalar * __restrict inputs,
+inline void Conv2DTransposeSubPixel(Scalar * __restrict outputs, const Scalar * __restrict inputs,
                      const Scalar * __restrict kernels, const Scalar * __restrict biases,
                      int in_channels, int in_height, int in_width,
                      int kernel_height, int kernel_width, int stride_height,
                      int stride_width, int padding_height, int padding_width,
                      ActFun activation_function,
-                     Scalar alpha)
+                     Scalar alpha) noexcept
 {
-    for (int h = 0; h < out_height; ++h)
+    // codeGen splits the flipped kernel into one small kernel per output phase, phase (rh, rw) holds the
+    // taps that reach the outputs (qh * stride_height + rh, qw * stride_width + rw). every phase is a dense
+    // stride 1 convolution over the inputs whose results are written interleaved (a pixel shuffle)
+    const int input_row_stride = in_width * in_channels;
+    const int weights_per_tap = in_channels * out_channels;
+    const Scalar *phase_kernel = kernels;
+
+    for (int rh = 0; rh < stride_height; ++rh)
     {
-        for (int w = 0; w < out_width; ++w)
+        const auto [kh_count, h_offset] = ConvTransposePhase(rh, kernel_height, stride_height, padding_height);
+
+        for (int rw = 0; rw < stride_width; ++rw)
         {
-            
-            for (int oc = 0; oc < out_channels; ++oc)
+            const auto [kw_count, w_offset] = ConvTransposePhase(rw, kernel_width, stride_width, padding_width);
+
+            for (int oh = rh, qh = 0; oh < out_height; oh += stride_height, ++qh)
             {
-                int idx = (h * out_width + w) * out_channels + oc;
-                outputs[idx] = biases ? biases[oc] : Scalar(0);
+                const int h_origin = qh + h_offset;
+                const int jh_min = std::max(0, -h_origin);
+                const int jh_max = std::min(kh_count, in_height - h_origin);
+
+                for (int ow = rw, qw = 0; ow < out_width; ow += stride_width, ++qw)
+                {
+                    Scalar sum_buf[out_channels];
+                    for (int oc = 0; oc < out_channels; ++oc) {
+                        sum_buf[oc] = biases[oc];
+                    }
+
+                    const int w_origin = qw + w_offset;
+                    const int jw_min = std::max(0, -w_origin);
+                    const int jw_max = std::min(kw_count, in_width - w_origin);
+                    for (int jh = jh_min; jh < jh_max; ++jh)
+                    {
+                        const Scalar *in_row = inputs + (h_origin + jh) * input_row_stride;
+
+                        for (int jw = jw_min; jw < jw_max; ++jw)
+                        {
+                            const Scalar *in_ptr = in_row + (w_origin + jw) * in_channels;
+                            const Scalar *w_ptr = phase_kernel + (jh * kw_count + jw) * weights_per_tap;
+
+                            ConvAccumulateTap<Scalar, out_channels>(sum_buf, in_ptr, w_ptr, in_channels);
+                        }
+                    }
+
+                    Scalar *out_pixel_ptr = outputs + ((oh * out_width + ow) * out_channels);
+                    for (int oc = 0; oc < out_channels; ++oc) {
+                        activation_function(out_pixel_ptr[oc], sum_buf[oc], alpha);
+                    }
+                }
             }
+            phase_kernel += kh_count * kw_count * weights_per_tap;
         }
     }
+}
+""",
+        "Conv3D": """
+template <typename Scalar, int out_channels, int out_depth, int out_height, int out_width, typename ActFun>
+inline void Conv3D(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar * __restrict weights, const Scalar * __restrict biases,
+                   int in_channels, int in_depth, int in_height, int in_width,
+                   int kernel_depth, int kernel_height, int kernel_width, int stride_depth, int stride_height, int stride_width,
+                   int padding_depth, int padding_height, int padding_width,
+                   ActFun activation_function, Scalar alpha) noexcept
+{
+    const int input_row_stride = in_width * in_channels;
+    const int input_plane_stride = in_height * input_row_stride;
+    const int weights_per_kw = in_channels * out_channels;
 
-    for (int ic = 0; ic < in_channels; ++ic)
+    // output voxels whose whole kernel window lies inside the input, everything else is border
+    const auto [od_begin, od_end] = ConvInteriorRange(out_depth, in_depth, kernel_depth, stride_depth, padding_depth);
+    const auto [oh_begin, oh_end] = ConvInteriorRange(out_height, in_height, kernel_height, stride_height, padding_height);
+    const auto [ow_begin, ow_end] = ConvInteriorRange(out_width, in_width, kernel_width, stride_width, padding_width);
+
+    // interior voxels read every tap at a fixed offset from the window corner, the bounds of
+    // the window are only computed for the border voxels
+    auto voxel = [&](int od, int oh, int ow, auto interior) noexcept
     {
-        for (int ih = 0; ih < in_height; ++ih)
+        const int d_origin = od * stride_depth - padding_depth;
+        const int h_origin = oh * stride_height - padding_height;
+        const int w_origin = ow * stride_width - padding_width;
+        Scalar sum_buf[out_channels];
+        for (int oc = 0; oc < out_channels; ++oc) {
+            sum_buf[oc] = biases[oc];
+        }
+
+        if constexpr (decltype(interior)::value)
         {
-            for (int iw = 0; iw < in_width; ++iw)
+            const Scalar *window = inputs + d_origin * input_plane_stride + h_origin * input_row_stride + w_origin * in_channels;
+            for (int kd = 0; kd < kernel_depth; ++kd)
             {
-                Scalar current_value = inputs[(ih * in_width + iw) * in_channels + ic];
-                int base_height = ih * stride_height - padding_height;
-                int base_width = iw * stride_width - padding_width;
-
                 for (int kh = 0; kh < kernel_height; ++kh)
                 {
-                    int oh = base_height + kh;
-                    if (oh < 0 || oh >= out_height)
-                        continue;
+                    const Scalar *in_row = window + kd * input_plane_stride + kh * input_row_stride;
+                    const Scalar *w_row = weights + (kd * kernel_height + kh) * kernel_width * weights_per_kw;
+
                     for (int kw = 0; kw < kernel_width; ++kw)
                     {
-                        int ow = base_width + kw;
-                        if (ow < 0 || ow >= out_width)
-                            continue;
-                        int out_base = (oh * out_width + ow) * out_channels;
-                        int fh = kernel_height - 1 - kh;
-                        int fw = kernel_width - 1 - kw;
-                        int ker_base =
-                            (fh * kernel_width + fw) * (out_channels * in_channels) + ic;
-                        
-                        for (int oc = 0; oc < out_channels; ++oc)
-                        {
-                            int k_idx = ker_base + oc * in_channels;
-                            outputs[out_base + oc] += current_value * kernels[k_idx];
-                        }
+                        ConvAccumulateTap<Scalar, out_channels>(sum_buf, in_row + kw * in_channels, w_row + kw * weights_per_kw, in_channels);
                     }
                 }
             }
         }
-    }
+        else
+        {
+            const int kd_min = std::max(0, -d_origin);
+            const int kd_max = std::min(kernel_depth, in_depth - d_origin);
+            const int kh_min = std::max(0, -h_origin);
+            const int kh_max = std::min(kernel_height, in_height - h_origin);
+            const int kw_min = std::max(0, -w_origin);
+            const int kw_max = std::min(kernel_width, in_width - w_origin);
+            for (int kd = kd_min; kd < kd_max; ++kd)
+            {
+                for (int kh = kh_min; kh < kh_max; ++kh)
+                {
+                    const Scalar *in_row = inputs + (d_origin + kd) * input_plane_stride + (h_origin + kh) * input_row_stride;
+                    const Scalar *w_row = weights + (kd * kernel_height + kh) * kernel_width * weights_per_kw;
 
-    int total = out_height * out_width * out_channels;
-    for (int i = 0; i < total; ++i)
-    {
-        activation_function(outputs[i], outputs[i], alpha);
-    }
+                    for (int kw = kw_min; kw < kw_max; ++kw)
+                    {
+                        ConvAccumulateTap<Scalar, out_channels>(sum_buf, in_row + (w_origin + kw) * in_channels, w_row + kw * weights_per_kw, in_channels);
+                    }
+                }
+            }
+        }
 
-    std::array<Scalar, out_height * out_width * out_channels> tmp;
-    std::copy(outputs, outputs + total, tmp.begin());
+        Scalar *out_voxel_ptr = outputs + (((od * out_height + oh) * out_width + ow) * out_channels);
+        for (int oc = 0; oc < out_channels; ++oc) {
+            activation_function(out_voxel_ptr[oc], sum_buf[oc], alpha);
+        }
+    };
 
-    /*
-    NEEDED TO REORDER OUTPUTS (WILL UPDATE)
-    */
-    for (int h = 0; h < out_height; ++h)
-        for (int w = 0; w < out_width; ++w)
+    // the border planes and rows are whole strips, the interior rows have a left and a right
+    // border strip around their interior voxels
+    for (int od = 0; od < out_depth; ++od)
+    {
+        for (int oh = 0; oh < out_height; ++oh)
         {
-            const int dst_base = (h * out_width + w) * out_channels;
-            const int src_base =
-                ((out_height - 1 - h) * out_width + (out_width - 1 - w)) *
-                out_channels;
-
-            
-            for (int c = 0; c < out_channels; ++c)
-                outputs[dst_base + c] = tmp[src_base + c];
+            if (od < od_begin || od >= od_end || oh < oh_begin || oh >= oh_end)
+            {
+                for (int ow = 0; ow < out_width; ++ow) {
+                    voxel(od, oh, ow, std::false_type{});
+                }
+                continue;
+            }
+            for (int ow = 0; ow < ow_begin; ++ow) {
+                voxel(od, oh, ow, std::false_type{});
+            }
+            for (int ow = ow_begin; ow < ow_end; ++ow) {
+                voxel(od, oh, ow, std::true_type{});
+            }
+            for (int ow = ow_end; ow < out_width; ++ow) {
+                voxel(od, oh, ow, std::false_type{});
+            }
         }
-    /*
-    NEEDED TO REORDER OUTPUTS (WILL UPDATE)
-    */
+    }
 }
 """,
-        "Conv3D": """
-template <typename Scalar, int out_channels, int out_depth, int out_height, int out_width, typename ActFun>
-inline void Conv3D(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar * __restrict weights, const Scalar * __restrict biases,
-                   int in_channels, int in_depth, int in_height, int in_width,
-                   int kernel_depth, int kernel_height, int kernel_width, int stride_depth, int stride_height, int stride_width,
-                   int padding_depth, int padding_height, int padding_width,
-                   ActFun activation_function, Scalar alpha) noexcept
+        "Conv3DGemm": """
+template <typename Scalar, int out_channels, int out_depth, int out_height, int out_width, int patch_size, typename ActFun>
+inline void Conv3DGemm(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar * __restrict weights, const Scalar * __restrict biases,
+                       int in_channels, int in_depth, int in_height, int in_width,
+                       int kernel_depth, int kernel_height, int kernel_width, int stride_depth, int stride_height, int stride_width,
+                       int padding_depth, int padding_height, int padding_width,
+                       ActFun activation_function, Scalar alpha) noexcept
 {
-    for (int oc = 0; oc < out_channels; ++oc)
+    // im2col + gemm, see Conv2DGemm, patch_size = kernel_depth * kernel_height * kernel_width * in_channels
+    constexpr int tile_pixels = 8;
+    constexpr int out_plane = out_height * out_width;
+    constexpr int out_voxels = out_depth * out_plane;
+    static std::array<Scalar, patch_size * tile_pixels> patches;
+
+    for (int voxel = 0; voxel < out_voxels; voxel += tile_pixels)
     {
-        for (int od = 0; od < out_depth; ++od)
+        const int voxels = std::min(tile_pixels, out_voxels - voxel);
+        for (int p = 0; p < tile_pixels; ++p)
         {
-            for (int oh = 0; oh < out_height; ++oh)
+            Scalar *column = patches.data() + p * patch_size;
+            if (p >= voxels)
+            {
+                for (int k = 0; k < patch_size; ++k) {
+                    column[k] = 0;
+                }
+                continue;
+            }
+            const int d_origin = (voxel + p) / out_plane * stride_depth - padding_depth;
+            const int h_origin = (voxel + p) % out_plane / out_width * stride_height - padding_height;
+            const int w_origin = (voxel + p) % out_width * stride_width - padding_width;
+            for (int kd = 0; kd < kernel_depth; ++kd)
             {
-                for (int ow = 0; ow < out_width; ++ow)
+                const int id = d_origin + kd;
+                for (int kh = 0; kh < kernel_height; ++kh)
                 {
-                    Scalar sum = 0;
-                    for (int ic = 0; ic < in_channels; ++ic)
+                    const int ih = h_origin + kh;
+                    for (int kw = 0; kw < kernel_width; ++kw)
                     {
-                        for (int kd = 0; kd < kernel_depth; ++kd)
+                        const int iw = w_origin + kw;
+                        Scalar *tap = column + ((kd * kernel_height + kh) * kernel_width + kw) * in_channels;
+                        if (id < 0 || id >= in_depth || ih < 0 || ih >= in_height || iw < 0 || iw >= in_width)
                         {
-                            for (int kh = 0; kh < kernel_height; ++kh)
-                            {
-                                
-                                for (int kw = 0; kw < kernel_width; ++kw)
-                                {
-                                    int in_d = od * stride_depth - padding_depth + kd;
-                                    int in_h = oh * stride_height - padding_height + kh;
-                                    int in_w = ow * stride_width - padding_width + kw;
-                                    if (in_d >= 0 && in_d < in_depth &&
-                                        in_h >= 0 && in_h < in_height &&
-                                        in_w >= 0 && in_w < in_width)
-                                    {
-                                        int input_index = ((in_d * in_height * in_width * in_channels) +
-                                                           (in_h * in_width * in_channels) +
-                                                           (in_w * in_channels) + ic);
-                                        int weight_index = (((((kd * kernel_height + kh) * kernel_width + kw) * in_channels + ic) * out_channels) + oc);
-                                        sum += inputs[input_index] * weights[weight_index];
-                                    }
-                                }
+                            for (int ic = 0; ic < in_channels; ++ic) {
+                                tap[ic] = 0;
                             }
+                            continue;
+                        }
+                        const Scalar *in_ptr = inputs + ((id * in_height + ih) * in_width + iw) * in_channels;
+                        for (int ic = 0; ic < in_channels; ++ic) {
+                            tap[ic] = in_ptr[ic];
                         }
                     }
-                    sum += biases[oc];
-                    int output_index = ((od * out_height * out_width * out_channels) +
-                                        (oh * out_width * out_channels) +
-                                        (ow * out_channels) + oc);
-                    activation_function(outputs[output_index], sum, alpha);
                 }
             }
         }
+        ConvGemmTile<Scalar, out_channels, tile_pixels>(outputs + voxel * out_channels, voxels, patches.data(), weights, biases, patch_size, activation_function, alpha);
     }
 }
+""",
+        "Conv3DGrouped": """
+template <typename Scalar, int out_channels, int out_depth, int out_height, int out_width, int groups, int patch_size, typename ActFun>
+inline void Conv3DGrouped(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar * __restrict weights, const Scalar * __restrict biases,
+                          int in_channels, int in_depth, int in_height, int in_width,
+                          int kernel_depth, int kernel_height, int kernel_width,
+                          int stride_depth, int stride_height, int stride_width,
+                          int padding_depth, int padding_height, int padding_width,
+                          ActFun activation_function, Scalar alpha) noexcept
+{
+    ConvGroupedGemm<Scalar, out_channels, out_depth, out_height, out_width, groups, patch_size>(outputs, inputs, weights, biases, in_channels, in_depth, in_height, in_width,
+                                                                                   kernel_depth, kernel_height, kernel_width, stride_depth, stride_height, stride_width,
+                                                                                   padding_depth, padding_height, padding_width, activation_function, alpha);
+}
 """,
         "Conv3DTranspose": """
 template <typename Scalar, int out_channels, int out_depth, int out_height,
@@ -555,193 +2489,215 @@ inline void Conv3DTranspose(Scalar * __restrict outputs, const Scalar * __restri
                      int stride_depth, int stride_height, int stride_width,
                      int padding_depth, int padding_height, int padding_width,
                      ActFun activation_function,
-                     Scalar alpha)
+                     Scalar alpha) noexcept
 {
-    for (int d = 0; d < out_depth; ++d)
+    // the kernel is flipped and laid out (kd, kh, kw, in_channels, out_channels) at generation time, so
+    // every output voxel gathers its inputs in increasing order and accumulates all of its channels at once
+    const int input_row_stride = in_width * in_channels;
+    const int input_plane_stride = in_height * input_row_stride;
+    const int weights_per_tap = in_channels * out_channels;
+
+    for (int od = 0; od < out_depth; ++od)
     {
-        for (int h = 0; h < out_height; ++h)
+        const int d_base = od + padding_depth - (kernel_depth - 1);
+        const auto [kd_first, kd_last] = ConvTransposeTaps(d_base, kernel_depth, stride_depth, in_depth);
+
+        for (int oh = 0; oh < out_height; ++oh)
         {
-            for (int w = 0; w < out_width; ++w)
+            const int h_base = oh + padding_height - (kernel_height - 1);
+            const auto [kh_first, kh_last] = ConvTransposeTaps(h_base, kernel_height, stride_height, in_height);
+
+            for (int ow = 0; ow < out_width; ++ow)
             {
-                
-                for (int oc = 0; oc < out_channels; ++oc)
+                Scalar sum_buf[out_channels];
+                for (int oc = 0; oc < out_channels; ++oc) {
+                    sum_buf[oc] = biases[oc];
+                }
+
+                const int w_base = ow + padding_width - (kernel_width - 1);
+                const auto [kw_first, kw_last] = ConvTransposeTaps(w_base, kernel_width, stride_width, in_width);
+                for (int kd = kd_first; kd < kd_last; kd += stride_depth)
                 {
-                    int idx = ((d * out_height + h) * out_width + w) * out_channels + oc;
-                    outputs[idx] = biases ? biases[oc] : Scalar(0);
+                    const Scalar *in_plane = inputs + ((d_base + kd) / stride_depth) * input_plane_stride;
+
+                    for (int kh = kh_first; kh < kh_last; kh += stride_height)
+                    {
+                        const Scalar *in_row = in_plane + ((h_base + kh) / stride_height) * input_row_stride;
+
+                        for (int kw = kw_first; kw < kw_last; kw += stride_width)
+                        {
+                            const Scalar *in_ptr = in_row + ((w_base + kw) / stride_width) * in_channels;
+                            const Scalar *w_ptr = kernels + ((kd * kernel_height + kh) * kernel_width + kw) * weights_per_tap;
+
+                            ConvAccumulateTap<Scalar, out_channels>(sum_buf, in_ptr, w_ptr, in_channels);
+                        }
+                    }
+                }
+
+                Scalar *out_voxel_ptr = outputs + (((od * out_height + oh) * out_width + ow) * out_channels);
+                for (int oc = 0; oc < out_channels; ++oc) {
+                    activation_function(out_voxel_ptr[oc], sum_buf[oc], alpha);
                 }
             }
         }
     }
+}
+""",
+        "Conv3DTransposeSubPixel": """
+template <typename Scalar, int out_channels, int out_depth, int out_height,
+          int out_width, typename ActFun>
+inline void Conv3DTransposeSubPixel(Scalar * __restrict outputs, const Scalar * __restrict inputs,
+                     const Scalar * __restrict kernels, const Scalar * __restrict biases,
+                     int in_channels, int in_depth, int in_height, int in_width,
+                     int kernel_depth, int kernel_height, int kernel_width,
+                     int stride_depth, int stride_height, int stride_width,
+                     int padding_depth, int padding_height, int padding_width,
+                     ActFun activation_function,
+                     Scalar alpha) noexcept
+{
+    // codeGen splits the flipped kernel into one small kernel per output phase, phase (rd, rh, rw) holds
+    // the taps that reach the outputs (qd * stride_depth + rd, qh * stride_height + rh, qw * stride_width + rw).
+    // every phase is a dense stride 1 convolution over the inputs whose results are written interleaved
+    const int input_row_stride = in_width * in_channels;
+    const int input_plane_stride = in_height * input_row_stride;
+    const int weights_per_tap = in_channels * out_channels;
+    const Scalar *phase_kernel = kernels;
 
-    for (int ic = 0; ic < in_channels; ++ic)
+    for (int rd = 0; rd < stride_depth; ++rd)
     {
-        for (int id = 0; id < in_depth; ++id)
+        const auto [kd_count, d_offset] = ConvTransposePhase(rd, kernel_depth, stride_depth, padding_depth);
+
+        for (int rh = 0; rh < stride_height; ++rh)
         {
-            for (int ih = 0; ih < in_height; ++ih)
+            const auto [kh_count, h_offset] = ConvTransposePhase(rh, kernel_height, stride_height, padding_height);
+
+            for (int rw = 0; rw < stride_width; ++rw)
             {
-                for (int iw = 0; iw < in_width; ++iw)
+                const auto [kw_count, w_offset] = ConvTransposePhase(rw, kernel_width, stride_width, padding_width);
+
+                for (int od = rd, qd = 0; od < out_depth; od += stride_depth, ++qd)
                 {
-                    Scalar in_val =
-                        inputs[((id * in_height + ih) * in_width + iw) * in_channels +
-                               ic];
-                    int base_d = id * stride_depth - padding_depth;
-                    int base_h = ih * stride_height - padding_height;
-                    int base_w = iw * stride_width - padding_width;
-
-                    for (int kd = 0; kd < kernel_depth; ++kd)
+                    const int d_origin = qd + d_offset;
+                    const int jd_min = std::max(0, -d_origin);
+                    const int jd_max = std::min(kd_count, in_depth - d_origin);
+
+                    for (int oh = rh, qh = 0; oh < out_height; oh += stride_height, ++qh)
                     {
-                        int od = base_d + kd;
-                        if (od < 0 || od >= out_depth)
-                            continue;
-                        for (int kh = 0; kh < kernel_height; ++kh)
+                        const int h_origin = qh + h_offset;
+                        const int jh_min = std::max(0, -h_origin);
+                        const int jh_max = std::min(kh_count, in_height - h_origin);
+
+                        for (int ow = rw, qw = 0; ow < out_width; ow += stride_width, ++qw)
                         {
-                            int oh = base_h + kh;
-                            if (oh < 0 || oh >= out_height)
-                                continue;
-                            for (int kw = 0; kw < kernel_width; ++kw)
+                            Scalar sum_buf[out_channels];
+                            for (int oc = 0; oc < out_channels; ++oc) {
+                                sum_buf[oc] = biases[oc];
+                            }
+
+                            const int w_origin = qw + w_offset;
+                            const int jw_min = std::max(0, -w_origin);
+                            const int jw_max = std::min(kw_count, in_width - w_origin);
+                            for (int jd = jd_min; jd < jd_max; ++jd)
                             {
-                                int ow = base_w + kw;
-                                if (ow < 0 || ow >= out_width)
-                                    continue;
-
-                                int out_base =
-                                    ((od * out_height + oh) * out_width + ow) * out_channels;
-                                int fd = kernel_depth - 1 - kd;
-                                int fh = kernel_height - 1 - kh;
-                                int fw = kernel_width - 1 - kw;
-                                int ker_base = ((fd * kernel_height + fh) * kernel_width + fw) *
-                                                   (out_channels * in_channels) +
-                                               ic;
-
-                                
-                                for (int oc = 0; oc < out_channels; ++oc)
+                                for (int jh = jh_min; jh < jh_max; ++jh)
                                 {
-                                    int k_idx = ker_base + oc * in_channels;
-                                    outputs[out_base + oc] += in_val * kernels[k_idx];
+                                    const Scalar *in_row = inputs + (d_origin + jd) * input_plane_stride + (h_origin + jh) * input_row_stride;
+
+                                    for (int jw = jw_min; jw < jw_max; ++jw)
+                                    {
+                                        const Scalar *in_ptr = in_row + (w_origin + jw) * in_channels;
+                                        const Scalar *w_ptr = phase_kernel + ((jd * kh_count + jh) * kw_count + jw) * weights_per_tap;
+
+                                        ConvAccumulateTap<Scalar, out_channels>(sum_buf, in_ptr, w_ptr, in_channels);
+                                    }
                                 }
                             }
+
+                            Scalar *out_voxel_ptr = outputs + (((od * out_height + oh) * out_width + ow) * out_channels);
+                            for (int oc = 0; oc < out_channels; ++oc) {
+                                activation_function(out_voxel_ptr[oc], sum_buf[oc], alpha);
+                            }
                         }
                     }
                 }
+                phase_kernel += kd_count * kh_count * kw_count * weights_per_tap;
             }
         }
     }
-
-    int total = out_depth * out_height * out_width * out_channels;
-    for (int i = 0; i < total; ++i)
-    {
-        activation_function(outputs[i], outputs[i], alpha);
-    }
-
-    /*
-    NEEDED TO REORDER OUTPUTS (WILL UPDATE)
-    */
-    std::array<Scalar, out_depth * out_height * out_width * out_channels> tmp;
-    std::copy(outputs, outputs + total, tmp.begin());
-
-    for (int d = 0; d < out_depth; ++d)
-    {
-        for (int h = 0; h < out_height; ++h)
-        {
-            for (int w = 0; w < out_width; ++w)
-            {
-                int dst_base = ((d * out_height + h) * out_width + w) * out_channels;
-                int src_base =
-                    (((out_depth - 1 - d) * out_height + (out_height - 1 - h)) *
-                         out_width +
-                     (out_width - 1 - w)) *
-                    out_channels;
-                
-                for (int c = 0; c < out_channels; ++c)
-                {
-                    outputs[dst_base + c] = tmp[src_base + c];
-                }
-            }
-        }
-    }
-    /*
-    NEEDED TO REORDER OUTPUTS (WILL UPDATE)
-    */
-   
 }
 """,
         "DepthwiseConv2D": """
-template <typename Scalar, typename ActFun>
+template <typename Scalar, int out_channels, int out_height, int out_width, typename ActFun>
 inline void DepthwiseConv2D(Scalar * __restrict outputs, const Scalar * __restrict inputs, const Scalar * __restrict weights, const Scalar * __restrict biases,
-                            int out_channels, int out_height, int out_width,
                             int in_channels, int in_height, int in_width,
                             int kernel_height, int kernel_width, int stride_height, int stride_width,
                             int padding_height, int padding_width,
                             ActFun activation_function, Scalar alpha) noexcept
 {
-    for (int c = 0; c < in_channels; ++c)
+    // the kernel is stored (kh, kw, in_channels, depth_multiplier) so for every tap the output
+    // channels c * depth_multiplier + m are contiguous, just like the input and output pixels
+    const int depth_multiplier = out_channels / in_channels;
+    const int input_row_stride = in_width * in_channels;
+
+    // output pixels whose whole kernel window lies inside the input, everything else is border
+    const auto [oh_begin, oh_end] = ConvInteriorRange(out_height, in_height, kernel_height, stride_height, padding_height);
+    const auto [ow_begin, ow_end] = ConvInteriorRange(out_width, in_width, kernel_width, stride_width, padding_width);
+
+    for (int oh = 0; oh < out_height; ++oh)
     {
-        for (int oh = 0; oh < out_height; ++oh)
+        const bool interior_row = oh >= oh_begin && oh < oh_end;
+        const int h_origin = oh * stride_height - padding_height;
+        for (int ow = 0; ow < out_width; ++ow)
         {
-            for (int ow = 0; ow < out_width; ++ow)
+            const int w_origin = ow * stride_width - padding_width;
+            Scalar sum_buf[out_channels];
+            for (int oc = 0; oc < out_channels; ++oc) {
+                sum_buf[oc] = biases[oc];
+            }
+
+            // interior pixels use the whole kernel window, border pixels clip it to the input
+            const bool interior = interior_row && ow >= ow_begin && ow < ow_end;
+            const int kh_min = interior ? 0 : std::max(0, -h_origin);
+            const int kh_max = interior ? kernel_height : std::min(kernel_height, in_height - h_origin);
+            const int kw_min = interior ? 0 : std::max(0, -w_origin);
+            const int kw_max = interior ? kernel_width : std::min(kernel_width, in_width - w_origin);
+
+            for (int kh = kh_min; kh < kh_max; ++kh)
             {
-                Scalar sum = 0;
-                for (int kh = 0; kh < kernel_height; ++kh)
+                for (int kw = kw_min; kw < kw_max; ++kw)
                 {
-                    
-                    for (int kw = 0; kw < kernel_width; ++kw)
+                    const Scalar *in_ptr = inputs + (h_origin + kh) * input_row_stride + (w_origin + kw) * in_channels;
+                    const Scalar *w_ptr = weights + (kh * kernel_width + kw) * out_channels;
+
+                    // channels innermost, so the loads and the accumulation are unit stride
+                    if (depth_multiplier == 1)
                     {
-                        int in_h = oh * stride_height - padding_height + kh;
-                        int in_w = ow * stride_width - padding_width + kw;
-                        if (in_h >= 0 && in_h < in_height && in_w >= 0 && in_w < in_width)
-                        {
-                            int input_index = (in_h * in_width * in_channels) + (in_w * in_channels) + c;
-                            int weight_index = (kh * kernel_width + kw) * in_channels + c;
-                            sum += inputs[input_index] * weights[weight_index];
+                        for (int c = 0; c < out_channels; ++c) {
+                            sum_buf[c] += in_ptr[c] * w_ptr[c];
                         }
                     }
-                }
-                sum += biases[c];
-                int output_index = (oh * out_width * in_channels) + (ow * in_channels) + c;
-                activation_function(outputs[output_index], sum, alpha);
-            }
-        }
-    }
-}
-""",
-        "SeparableConv2D": """
-template <typename Scalar>
-inline void DepthwiseForsSeparableConv2D(Scalar *__restrict outputs, const Scalar *__restrict inputs, const Scalar *__restrict weights, const Scalar *__restrict biases,
-                                  int out_height, int out_width,
-                                  int in_channels, int in_height, int in_width,
-                                  int kernel_height, int kernel_width, int stride_height, int stride_width,
-                                  int padding_height, int padding_width) noexcept
-{
-    for (int c = 0; c < in_channels; ++c)
-    {
-        for (int oh = 0; oh < out_height; ++oh)
-        {
-            for (int ow = 0; ow < out_width; ++ow)
-            {
-                Scalar sum = 0;
-                for (int kh = 0; kh < kernel_height; ++kh)
-                {
-                    
-                    for (int kw = 0; kw < kernel_width; ++kw)
+                    else
                     {
-                        int in_h = oh * stride_height - padding_height + kh;
-                        int in_w = ow * stride_width - padding_width + kw;
-                        if (in_h >= 0 && in_h < in_height && in_w >= 0 && in_w < in_width)
+                        for (int c = 0; c < in_channels; ++c)
                         {
-                            int input_index = (in_h * in_width * in_channels) + (in_w * in_channels) + c;
-                            int weight_index = (kh * kernel_width + kw) * in_channels + c;
-                            sum += inputs[input_index] * weights[weight_index];
+                            const Scalar input_val = in_ptr[c];
+                            for (int m = 0; m < depth_multiplier; ++m) {
+                                sum_buf[c * depth_multiplier + m] += input_val * w_ptr[c * depth_multiplier + m];
+                            }
                         }
                     }
                 }
-                sum += biases[c];
-                int output_index = ((oh * out_width + ow) * in_channels) + c;
-                outputs[output_index] = sum;
+            }
+
+            Scalar *out_pixel_ptr = outputs + ((oh * out_width + ow) * out_channels);
+            for (int oc = 0; oc < out_channels; ++oc) {
+                activation_function(out_pixel_ptr[oc], sum_buf[oc], alpha);
             }
         }
     }
 }
-
+""",
+        "SeparableConv2D": """
 template <typename Scalar, int out_channels, int out_height, int out_width, typename ActFun>
 inline void SeparableConv2D(
     Scalar *__restrict outputs,
@@ -763,23 +2719,37 @@ inline void SeparableConv2D(
         kernel_height, kernel_width,
         stride_height, stride_width,
         padding_height, padding_width);
-    for (int oc = 0; oc < out_channels; ++oc)
-    {
-        for (int i = 0; i < out_height * out_width; ++i)
-        {
-            Scalar sum = 0;
-            
-            for (int ic = 0; ic < in_channels; ++ic)
-            {
-                int index = i * in_channels + ic;
-                int weight_index = ic * out_channels + oc;
-                sum += depthwise_output[index] * pointwise_weights[weight_index];
-            }
-            sum += biases[oc];
-            int output_index = i * out_channels + oc;
-            activation_function(outputs[output_index], sum, alpha);
-        }
-    }
+    // the pointwise stage is a 1x1 convolution of the depthwise outputs
+    ConvPointwise<Scalar, out_channels, out_height * out_width>(
+        outputs, depthwise_output.data(), pointwise_weights, biases, in_channels, activation_function, alpha);
+}
+""",
+        "SeparableConv2DGlobalPool": """
+template <typename Scalar, int out_channels, int out_height, int out_width, bool max_pool, int in_channels, typename ActFun>
+inline void SeparableConv2DGlobalPool(
+    Scalar *__restrict outputs,
+    const Scalar *__restrict inputs,
+    const Scalar *__restrict depthwise_weights,
+    const Scalar *__restrict pointwise_weights,
+    const Scalar *__restrict biases,
+    int in_height, int in_width,
+    int kernel_height, int kernel_width,
+    int stride_height, int stride_width,
+    int padding_height, int padding_width,
+    Scalar pool_scale, ActFun activation_function, Scalar alpha) noexcept
+{
+    // SeparableConv2D whose pointwise outputs are reduced by global max or average pooling
+    // (see Conv2DGlobalPool) as they are computed, only the depthwise outputs are stored
+    static std::array<Scalar, out_height * out_width * in_channels> depthwise_output;
+    static const std::array<Scalar, in_channels> zero_bias{};
+    DepthwiseForsSeparableConv2D(
+        depthwise_output.data(), inputs, depthwise_weights, zero_bias.data(), out_height, out_width,
+        in_channels, in_height, in_width,
+        kernel_height, kernel_width,
+        stride_height, stride_width,
+        padding_height, padding_width);
+    ConvPointwiseGlobalPool<Scalar, out_channels, out_height * out_width, max_pool>(
+        outputs, depthwise_output.data(), pointwise_weights, biases, in_channels, pool_scale, activation_function, alpha);
 }
 """,
         "ConvLSTM2D": """
@@ -1089,7 +3059,7 @@ inline void GlobalMaxPooling1D(Scalar * __restrict outputs, const Scalar * __res
                 max_val = inputs[idx];
             }
         }
-        output[c] = max_val;
+        outputs[c] = max_val;
     }
 }
 """,
@@ -1112,7 +3082,7 @@ inline void GlobalMaxPooling2D(Scalar * __restrict outputs, const Scalar * __res
                 }
             }
         }
-        output[c] = max_val;
+        outputs[c] = max_val;
     }
 }
 """,
@@ -1138,7 +3108,7 @@ inline void GlobalMaxPooling3D(Scalar * __restrict outputs, const Scalar * __res
                 }
             }
         }
-        output[c] = max_val;
+        outputs[c] = max_val;
     }
 }
 """,
@@ -1146,15 +3116,16 @@ inline void GlobalMaxPooling3D(Scalar * __restrict outputs, const Scalar * __res
 template <typename Scalar>
 inline void GlobalAvgPooling1D(Scalar * __restrict outputs, const Scalar * __restrict inputs, int in_length, int channels)
 {
-    for (int ic = 0, ic < channels, ic++)
+    for (int c = 0; c < channels; ++c)
     {
+        Scalar sum = 0;
         
-        for (int i = 0, i < in_length, i++)
+        for (int i = 0; i < in_length; ++i)
         {
-            int idx = (i * channels) + (channels) + c;
+            int idx = (i * channels) + c;
             sum += inputs[idx];
         }
-        output[c] = sum / (length);
+        outputs[c] = sum / in_length;
     }
 }
 """,
@@ -1175,7 +3146,7 @@ inline void GlobalAvgPooling2D(Scalar * __restrict outputs, const Scalar * __res
                 sum += inputs[idx];
             }
         }
-        output[c] = sum / (in_height * in_width);
+        outputs[c] = sum / (in_height * in_width);
     }
 }
 """,
@@ -1198,7 +3169,7 @@ inline void GlobalAvgPooling3D(Scalar * __restrict outputs, const Scalar * __res
                 }
             }
         }
-        output[c] = sum / (in_depth * in_height * in_width);
+        outputs[c] = sum / (in_depth * in_height * in_width);
     }
 }
 """,
@@ -1215,20 +3186,46 @@ inline void GlobalAvgPooling3D(Scalar * __restrict outputs, const Scalar * __res
 
         cpp_lambda = """"""
 
-        # set activation functions
+        # Dense layers with a softmax activation run linear before the softmax
+        if "softmax" in current_activations:
+            current_activations.add("linear")
+
+        # set activation functions, the approximated ones after the helpers they call
+        approximated = {
+            act: approx_lambda_functions[activation_approx[act]][act]
+            for act in current_activations
+            if activation_approx is not None and act in activation_approx
+        }
+        for helper in approx_helpers:
+            if any(helper in helpers for helpers, _ in approximated.values()):
+                cpp_lambda += approx_helpers[helper]
         for act in current_activations:
-            if act in lambda_functions:
+            if act in approximated:
+                cpp_lambda += approximated[act][1]
+            elif act in lambda_functions:
                 cpp_lambda += lambda_functions[act]
 
         # deduplicate layer_type list
         unique_layer_types = {lt for lt in layer_type if lt is not None}
 
         # set layer propagation layers
+        if unique_layer_types & convolution_functions.keys():
+            cpp_code += convolution_helpers
+        if unique_layer_types & {"DenseInt8", "Conv2DInt8", "Conv2DFusedInt8", "Conv2DGlobalPoolInt8"}:
+            cpp_code += quantization_helpers
+        if unique_layer_types & {"DenseHalf", "Conv2DHalf"}:
+            cpp_code += half_precision_helpers
+        if unique_layer_types & {"DensePalette", "Conv2DPalette"}:
+            cpp_code += palette_helpers
+        if unique_layer_types & fixed_point_functions.keys():
+            cpp_code += fixed_point_helpers
         for type in unique_layer_types:
             if type in preprocessing_functions:
                 cpp_code += preprocessing_functions[type]
             if type in dense_function:
                 cpp_code += dense_function[type]
+            if type in fixed_point_functions:
+                cpp_code += fixed_point_functions[type]
             if type in reshape_functions:
                 cpp_code += reshape_functions[type]
             if type in normalization_functions:
@@ -1,26 +1,49 @@
 import os
+import re
+import itertools
 import absl.logging
 import warnings
+import numpy as np
 
 absl.logging.set_verbosity("error")
 warnings.filterwarnings("ignore", category=UserWarning, module="keras")
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 
 
-def preambleHeader():
+def standardIncludes():
     # ===========================================
-    # generate the preamble for the header file
+    # standard library headers every generated file depends on
     # ===========================================
-    cpp_code = """#pragma once
-#include <iostream>
+    return """#include <iostream>
 #include <array>
+#include <vector>
 #include <random>
 #include <cmath>
+#include <limits>
 #include <functional>
 #include <stdexcept>
-#include <algorithm> 
-#include <cstddef> 
+#include <algorithm>
+#include <cstddef>
+#include <cstdint>
+#include <type_traits>
+#include <bit>
+#include <utility>
+"""
+
+
+def preambleHeader(kernels_header=None):
+    # ===========================================
+    # generate the preamble for the header file
 
+    # args:
+    #   kernels_header: optional name of a shared kernels header. when given,
+    #                   the model header includes it instead of carrying its
+    #                   own copy of the layer propagation functions.
+    # ===========================================
+    cpp_code = "#pragma once\n" + standardIncludes()
+    if kernels_header is not None:
+        cpp_code += f'#include "{kernels_header}"\n'
+    cpp_code += """
 // template<typename Scalar>
 // using activationFunction = void(*)(Scalar&, Scalar, Scalar);
 
@@ -31,6 +54,34 @@ def preambleHeader():
     return cpp_code
 
 
+def moduleInterface(module_name, body, imports=()):
+    # ===========================================
+    # wrap generated code in a c++20 named module interface unit. the standard
+    # headers go in the global module fragment and everything in the body is
+    # exported, so consumers can "import module_name;" instead of including
+    # (and reparsing) the header.
+
+    # args:
+    #   module_name: name of the exported module (e.g. codejenn.kernels)
+    #   body: layer propagation functions or model function to export
+    #   imports: modules the body depends on
+
+    # returns:
+    #   cpp_code: the module interface unit
+    # ===========================================
+    # <functional> (unused by the generated code) in the global module fragment makes g++ 12
+    # miscompile the std::vector constructors of the imported kernels, which then segfault
+    cpp_code = "module;\n" + standardIncludes().replace("#include <functional>\n", "") + "\n"
+    cpp_code += f"export module {module_name};\n"
+    for imp in imports:
+        cpp_code += f"import {imp};\n"
+    cpp_code += "\nexport {\n"
+    cpp_code += body
+    cpp_code += "\n} // export\n"
+
+    return cpp_code
+
+
 def codeGen(
     cpp_code,
     cpp_lambda,
@@ -51,6 +102,13 @@ def codeGen(
     output_mins,
     layer_shape,
     layer_type,
+    tile_plans=None,
+    quant_params=None,
+    layer_precision=None,
+    half_params=None,
+    palette_params=None,
+    low_rank_params=None,
+    sparse_params=None,
 ):
     # ===============================================================================
     # function to generate put all the cpp code together from the previous scripts
@@ -76,6 +134,20 @@ def codeGen(
     #   output_mins: the output minimum values
     #   layer_shape: the shape of the layers
     #   layer_type: the type of the layers
+    #   tile_plans: depth-first tiled runs of layers from tileSchedule(), keyed by their first layer
+    #   quant_params: int8 weights, scales, biases and input scale of the quantized layers from
+    #                 quantizeLayers(), None for the float layers
+    #   layer_precision: dict of layer index -> "float", "double" or "mixed" (float weights with
+    #                    double accumulation, Dense layers only) for the layers that do not run in
+    #                    Scalar, their buffers are converted where the type changes
+    #   half_params: fp16 / bfloat16 weight bits and biases of the layers from halfPrecisionLayers(),
+    #                None for the other layers
+    #   palette_params: codebooks, packed codebook indices and biases of the layers from
+    #                   palettizeLayers(), None for the other layers
+    #   low_rank_params: svd factors and biases of the layers from lowRankLayers(), None for the
+    #                    other layers
+    #   sparse_params: nonzero weight blocks and biases of the pruned layers from sparseLayers(),
+    #                  None for the other layers
 
     # returns:
     #   cpp_code: the fully generated cpp code
@@ -90,6 +162,179 @@ def codeGen(
             return prod
         return shape
 
+    # leading padding of a "same" convolution (keras pads the odd extra at the end)
+    def same_padding(in_size, out_size, kernel_size, stride):
+        return max((out_size - 1) * stride + kernel_size - in_size, 0) // 2
+
+    # leading padding of a transposed convolution, the one of the "same" convolution it inverts
+    def transpose_padding(padding, kernel_size, stride):
+        return max(kernel_size - stride, 0) // 2 if padding.lower() == "same" else 0
+
+    # flipped taps of every output phase of a strided transposed convolution, see ConvTransposePhase()
+    def transpose_phase_taps(kernel_size, stride, padding):
+        return [
+            list(range((kernel_size - 1 - padding - phase) % stride, kernel_size, stride))
+            for phase in range(stride)
+        ]
+
+    # call of layer i on a strip of rows: out_rows output rows from in_rows input rows, where
+    # the first output row reads the input row -pad_h (see tileSchedule())
+    def strip_call(i, out_ptr, in_ptr, in_shape, out_shape, in_rows, out_rows, pad_h):
+        ltype = layer_type[i]
+        conv_dict = conv_layer_params[i]
+        act = activation_func_map.get(activation_functions[i], "linear")
+        alpha = alphas[i]
+        idx = i + 1
+        in_w, in_c = in_shape[1], in_shape[2]
+        out_w, out_c = out_shape[1], out_shape[2]
+        if ltype == "Activation":
+            return (
+                f"        for (int i = 0; i < {out_rows * out_w * out_c}; ++i) {{\n"
+                f"            {act}({out_ptr}[i], {in_ptr}[i], {alpha});\n"
+                f"        }}\n"
+            )
+        if ltype == "BatchNormalization2D":
+            return (
+                f"        BatchNormalization2D<Scalar, {out_c}, {out_rows}, {out_w}>({out_ptr}, {in_ptr},\n"
+                f"            gamma_{idx}.data(), beta_{idx}.data(), mean_{idx}.data(), variance_{idx}.data(), epsilon_{idx});\n"
+            )
+        if ltype in ["MaxPooling2D", "AvgPooling2D"]:
+            pool_size = conv_dict["pool_size"]
+            strides = conv_dict["strides"]
+            return (
+                f"        {ltype}<Scalar, {pool_size[0]}, {pool_size[1]}, {strides[0]}, {strides[1]}>(\n"
+                f"            {out_ptr}, {in_ptr}, {in_rows}, {in_w}, {in_c});\n"
+            )
+        kernel = conv_dict.get("kernel_size", (3, 3))
+        strides = conv_dict.get("strides", (1, 1))
+        pad_w = 0
+        if conv_dict.get("padding", "valid").lower() == "same":
+            pad_w = same_padding(conv_dict["in_shape"][1], conv_dict["out_shape"][1], kernel[1], strides[1])
+        window = f"{kernel[0]}, {kernel[1]}, {strides[0]}, {strides[1]}, {pad_h}, {pad_w}"
+        if ltype == "Conv2DPointwise":
+            return (
+                f"        Conv2DPointwise<Scalar, {out_c}, {out_rows}, {out_w}>({out_ptr}, {in_ptr},\n"
+                f"            convKernel_{idx}.data(), convBias_{idx}.data(), {in_c}, {act}, {alpha});\n"
+            )
+        if ltype == "Conv2DWinograd":
+            return (
+                f"        Conv2DWinograd<Scalar, {out_c}, {out_rows}, {out_w}, {conv_dict['winograd_tile']}, {in_c}>({out_ptr}, {in_ptr},\n"
+                f"            winogradKernel_{idx}.data(), convBias_{idx}.data(), {in_rows}, {in_w}, {pad_h}, {pad_w}, {act}, {alpha});\n"
+            )
+        if ltype == "Conv2DFused":
+            pool_size = conv_dict["pool_size"]
+            pool_strides = conv_dict["pool_strides"]
+            max_pool = "true" if conv_dict["pool_type"] == "max" else "false"
+            return (
+                f"        Conv2DFused<Scalar, {out_c}, {out_rows}, {out_w}, {pool_size[0]}, {pool_size[1]}, {max_pool}, {kernel[0] * kernel[1] * in_c}>({out_ptr}, {in_ptr},\n"
+                f"            convKernel_{idx}.data(), convBias_{idx}.data(), {in_c}, {in_rows}, {in_w},\n"
+                f"            {window}, {pool_strides[0]}, {pool_strides[1]}, {act}, {alpha});\n"
+            )
+        if ltype == "DepthwiseConv2D":
+            params = f"depthwiseKernel_{idx}.data(), depthwiseBias_{idx}.data()"
+        elif ltype == "SeparableConv2D":
+            params = f"sepDepthwise_{idx}.data(), sepPointwise_{idx}.data(), sepPointwiseBias_{idx}.data()"
+        else:
+            params = f"convKernel_{idx}.data(), convBias_{idx}.data()"
+        groups = f", {conv_dict['groups']}" if ltype == "Conv2DGrouped" else ""
+        # size of the im2col patches
+        if ltype == "Conv2DGemm":
+            patch = f", {kernel[0] * kernel[1] * in_c}"
+        elif ltype == "Conv2DGrouped":
+            patch = f", {kernel[0] * kernel[1] * in_c // conv_dict['groups']}"
+        else:
+            patch = ""
+        return (
+            f"        {ltype}<Scalar, {out_c}, {out_rows}, {out_w}{groups}{patch}>({out_ptr}, {in_ptr},\n"
+            f"            {params}, {in_c}, {in_rows}, {in_w},\n"
+            f"            {window}, {act}, {alpha});\n"
+        )
+
+    # depth-first tiled run of layers, see tileSchedule(): every strip runs the layers on the
+    # rows they need for it through two ping-pong buffers, only the last layer output is stored whole
+    def tiled_run(plan, input_name):
+        layers = plan["layers"]
+        first_idx, last_idx = layers[0] + 1, layers[-1] + 1
+        first_in, last_out = plan["shapes"][0][0], plan["shapes"][-1][1]
+        code = f"    // layers {first_idx}-{last_idx} depth-first in strips of {plan['tile_rows']} output rows\n"
+        code += f"    static std::array<Scalar, ({last_out[0]} * {last_out[1]} * {last_out[2]})> layer_{last_idx}_output;\n"
+        code += f"    static std::array<Scalar, {plan['buffer_size']}> tile_{first_idx}_buffer_0;\n"
+        code += f"    static std::array<Scalar, {plan['buffer_size']}> tile_{first_idx}_buffer_1;\n"
+        for group in plan["groups"]:
+            in_row = f"{group['in_row']} + strip * {group['in_step']}" if group["count"] > 1 else f"{group['in_row']}"
+            out_row = f"{group['out_row']} + strip * {group['out_step']}" if group["count"] > 1 else f"{group['out_row']}"
+            code += f"    for (int strip = 0; strip < {group['count']}; ++strip) {{\n"
+            code += f"        const Scalar *tile_input = {input_name}.data() + ({in_row}) * {first_in[1] * first_in[2]};\n"
+            code += f"        Scalar *tile_output = layer_{last_idx}_output.data() + ({out_row}) * {last_out[1] * last_out[2]};\n"
+            in_ptr = "tile_input"
+            for n, (i, (in_shape, out_shape), (in_rows, out_rows, pad_h)) in enumerate(zip(layers, plan["shapes"], group["rows"])):
+                out_ptr = "tile_output" if n == len(layers) - 1 else f"tile_{first_idx}_buffer_{n % 2}.data()"
+                code += strip_call(i, out_ptr, in_ptr, in_shape, out_shape, in_rows, out_rows, pad_h)
+                in_ptr = out_ptr
+            code += "    }\n"
+        return code + "\n"
+
+    # 3x3 kernels transformed to G g G^T for Conv2DWinograd(), as [point][in_channels][out_channels]
+    def winograd_kernel(kernel, tile_size):
+        G = {
+            2: [[1, 0, 0], [1 / 2, 1 / 2, 1 / 2], [1 / 2, -1 / 2, 1 / 2], [0, 0, 1]],
+            4: [[1 / 4, 0, 0], [-1 / 6, -1 / 6, -1 / 6], [-1 / 6, 1 / 6, -1 / 6],
+                [1 / 24, 1 / 12, 1 / 6], [1 / 24, -1 / 12, 1 / 6], [0, 0, 1]],
+        }[tile_size]
+        return np.einsum("ak,klio,bl->abio", np.array(G), kernel, np.array(G))
+
+    # fft of the reversed Conv1D kernels for Conv1DFFT(), scaled by 1 / (2 fft_size), as [re | im][bin][in][out]
+    def fft_spectra(kernel, fft_size):
+        spectra = np.fft.rfft(kernel[::-1], n=fft_size, axis=0) / (2 * fft_size)
+        return np.concatenate([spectra.real.flatten(), spectra.imag.flatten()])
+
+    # twiddles of FFTRadix2(), cos(pi k / half) of the stages half = 1, 2, 4, ... then -sin in the same order
+    def fft_twiddles(fft_size):
+        halves = [2**stage for stage in range(int(np.log2(fft_size)))]
+        angles = np.concatenate([np.pi * np.arange(half) / half for half in halves])
+        return np.concatenate([np.cos(angles), -np.sin(angles)])
+
+    # copy of a buffer in another type for the next layer
+    def convert_buffer(source, target, scalar):
+        code = f"    // {source} in {scalar}\n"
+        code += f"    static std::array<{scalar}, std::tuple_size_v<std::remove_reference_t<decltype({source})>>> {target};\n"
+        code += f"    std::copy({source}.begin(), {source}.end(), {target}.begin());\n"
+        return code
+
+    # swap Scalar for the types of layer_precision in the parameters and calls of those layers, the
+    # activation functions for their typed copies, and convert the buffers where the type changes
+    def retype_layers(code):
+        buffer_types = {"model_input": "Scalar"}
+        calls = []
+        for i in range(len(call_offsets) - 1):
+            (start, source), (end, result) = call_offsets[i], call_offsets[i + 1]
+            chunk = code[start:end]
+            scalar = compute_types.get(i + 1, "Scalar")
+            if source != result:
+                if scalar != "Scalar":
+                    chunk = re.sub(r"\bScalar\b", scalar, chunk)
+                    if lambda_names:
+                        chunk = re.sub(rf"\b({'|'.join(lambda_names)})\b", rf"\1_{scalar}", chunk)
+                if buffer_types.get(source, "Scalar") != scalar:
+                    converted = f"layer_{i + 1}_input"
+                    chunk = convert_buffer(source, converted, scalar) + re.sub(rf"\b{source}\b", converted, chunk)
+                buffer_types[result] = scalar
+            calls.append(chunk)
+        end, result = call_offsets[-1]
+        tail = code[end:]
+        if buffer_types.get(result, "Scalar") != "Scalar":
+            tail = convert_buffer(result, "model_result", "Scalar") + re.sub(rf"\b{result}\b", "model_result", tail)
+        code = code[: call_offsets[0][0]] + "".join(calls) + tail
+
+        params = []
+        for i in range(len(param_offsets) - 1):
+            chunk = code[param_offsets[i] : param_offsets[i + 1]]
+            if i + 1 in layer_precision:
+                storage = "float" if layer_precision[i + 1] == "mixed" else layer_precision[i + 1]
+                chunk = re.sub(r"\bScalar\b", storage, chunk)
+            params.append(chunk)
+        return code[: param_offsets[0]] + "".join(params) + code[param_offsets[-1] :]
+
     # list out all supported activation functions as a map
     activation_func_map = {
         "relu": "relu",
@@ -107,6 +352,25 @@ def codeGen(
         "flatten": None,
     }
 
+    # check the layers of layer_precision exist and can run in their type
+    for idx, precision in (layer_precision or {}).items():
+        if not 1 <= idx <= len(layer_type) or layer_type[idx - 1] is None:
+            raise ValueError(f"layer {idx} of the layer precisions is not in the generated model")
+        if precision == "mixed" and layer_type[idx - 1] != "Dense":
+            raise ValueError(f"mixed precision is only available for Dense layers, layer {idx} is {layer_type[idx - 1]}")
+        if tile_plans and any(idx - 1 in plan["layers"] for plan in tile_plans.values()):
+            raise ValueError(f"layer {idx} of the layer precisions is part of a depth-first tiled run")
+
+    # int8 layers that pass their outputs on in int8 (the "output_scale" of quantizeLayers()), except
+    # next to the layers of layer_precision, whose buffers are converted as Scalar values
+    requantized = set()
+    for i, q in enumerate(quant_params or []):
+        if q is None or q["output_scale"] is None:
+            continue
+        j = next(j for j in range(i + 1, len(layer_type)) if layer_type[j] is not None)
+        if i + 1 not in (layer_precision or {}) and j + 1 not in (layer_precision or {}):
+            requantized.add(i)
+
     # build user header file name
     name_space = os.path.splitext(os.path.basename(user_file))[0]
     name_space = name_space.replace("-", "_").replace(" ", "_")
@@ -139,10 +403,95 @@ auto {name_space}(const {input_type}& initial_input) {{\n
     ##################################
     ## PRINT EACH LAYERS PARAMETERS ##
     ##################################
+    # where the code of every layer starts, to retype the layers of layer_precision
+    param_offsets = []
     for i, (w, b, norm_params, conv_dict, ltype) in enumerate(
         zip(weights_list, biases_list, norm_layer_params, conv_layer_params, layer_type)
     ):
         layer_idx = i + 1
+        param_offsets.append(len(cpp_code))
+
+        ## FP16 / BFLOAT16 WEIGHT LAYERS ##
+        if half_params is not None and half_params[i] is not None:
+            h = half_params[i]
+            hflat = h["weights"].flatten()
+            cpp_code += f"    // Layer {layer_idx}: {ltype}, {h['format']} weights\n"
+            cpp_code += f"    constexpr std::array<uint16_t, {len(hflat)}> weightsHalf_{layer_idx} = {{"
+            cpp_code += ", ".join(f"0x{int(val):04x}" for val in hflat)
+            cpp_code += "};\n"
+            cpp_code += f"    constexpr std::array<Scalar, {len(h['biases'])}> biases_{layer_idx} = {{"
+            cpp_code += ", ".join(f"{val:10.9e}" for val in h["biases"])
+            cpp_code += "};\n\n"
+            continue
+
+        ## SPARSE LAYERS ##
+        if sparse_params is not None and sparse_params[i] is not None:
+            sp = sparse_params[i]
+            cpp_code += f"    // Layer {layer_idx}: {ltype}, {len(sp['columns'])} nonzero blocks of {sp['block']}\n"
+            cpp_code += f"    constexpr std::array<int32_t, {len(sp['starts'])}> sparseStarts_{layer_idx} = {{"
+            cpp_code += ", ".join(str(int(val)) for val in sp["starts"])
+            cpp_code += "};\n"
+            cpp_code += f"    constexpr std::array<uint16_t, {max(len(sp['columns']), 1)}> sparseColumns_{layer_idx} = {{"
+            cpp_code += ", ".join(str(int(val)) for val in sp["columns"])
+            cpp_code += "};\n"
+            cpp_code += f"    constexpr std::array<Scalar, {max(len(sp['values']), 1)}> sparseValues_{layer_idx} = {{"
+            cpp_code += ", ".join(f"{val:10.9e}" for val in sp["values"])
+            cpp_code += "};\n"
+            cpp_code += f"    constexpr std::array<Scalar, {len(sp['biases'])}> biases_{layer_idx} = {{"
+            cpp_code += ", ".join(f"{val:10.9e}" for val in sp["biases"])
+            cpp_code += "};\n\n"
+            continue
+
+        ## LOW-RANK FACTORED LAYERS ##
+        if low_rank_params is not None and low_rank_params[i] is not None:
+            lr = low_rank_params[i]
+            lflat, rflat = lr["left"].flatten(), lr["right"].flatten()
+            cpp_code += f"    // Layer {layer_idx}: {ltype}, rank {lr['rank']} factors\n"
+            cpp_code += f"    constexpr std::array<Scalar, {len(lflat)}> weightsLeft_{layer_idx} = {{"
+            cpp_code += ", ".join(f"{val:10.9e}" for val in lflat)
+            cpp_code += "};\n"
+            cpp_code += f"    constexpr std::array<Scalar, {len(rflat)}> weightsRight_{layer_idx} = {{"
+            cpp_code += ", ".join(f"{val:10.9e}" for val in rflat)
+            cpp_code += "};\n"
+            cpp_code += f"    constexpr std::array<Scalar, {len(lr['biases'])}> biases_{layer_idx} = {{"
+            cpp_code += ", ".join(f"{val:10.9e}" for val in lr["biases"])
+            cpp_code += "};\n\n"
+            continue
+
+        ## PALETTIZED LAYERS ##
+        if palette_params is not None and palette_params[i] is not None:
+            pal = palette_params[i]
+            cpp_code += f"    // Layer {layer_idx}: {ltype}, {pal['clusters']} centroid codebook\n"
+            cpp_code += f"    constexpr std::array<uint8_t, {len(pal['indices'])}> weightsPalette_{layer_idx} = {{"
+            cpp_code += ", ".join(str(int(val)) for val in pal["indices"])
+            cpp_code += "};\n"
+            cpp_code += f"    constexpr std::array<Scalar, {pal['clusters']}> codebook_{layer_idx} = {{"
+            cpp_code += ", ".join(f"{val:10.9e}" for val in pal["codebook"])
+            cpp_code += "};\n"
+            cpp_code += f"    constexpr std::array<Scalar, {len(pal['biases'])}> biases_{layer_idx} = {{"
+            cpp_code += ", ".join(f"{val:10.9e}" for val in pal["biases"])
+            cpp_code += "};\n\n"
+            continue
+
+        ## INT8 QUANTIZED LAYERS ##
+        if quant_params is not None and quant_params[i] is not None:
+            q = quant_params[i]
+            qflat = q["weights"].flatten()
+            cpp_code += f"    // Layer {layer_idx}: {ltype}, int8 weights with one scale per output channel\n"
+            cpp_code += f"    constexpr std::array<int8_t, {len(qflat)}> weightsInt8_{layer_idx} = {{"
+            cpp_code += ", ".join(str(int(val)) for val in qflat)
+            cpp_code += "};\n"
+            cpp_code += f"    constexpr std::array<Scalar, {len(q['scales'])}> weightScales_{layer_idx} = {{"
+            cpp_code += ", ".join(f"{val:10.9e}" for val in q["scales"])
+            cpp_code += "};\n"
+            cpp_code += f"    constexpr std::array<Scalar, {len(q['biases'])}> biases_{layer_idx} = {{"
+            cpp_code += ", ".join(f"{val:10.9e}" for val in q["biases"])
+            cpp_code += "};\n"
+            cpp_code += f"    constexpr Scalar inputScale_{layer_idx} = {q['input_scale']:10.9e};\n"
+            if i in requantized:
+                cpp_code += f"    constexpr Scalar outputScale_{layer_idx} = {q['output_scale']:10.9e};\n"
+            cpp_code += "\n"
+            continue
 
         ## PREPROCESSING LAYERS ##
         if ltype == "Rescale":
@@ -213,7 +562,24 @@ auto {name_space}(const {input_type}& initial_input) {{\n
             if ltype in ["Conv1D", "Conv2D", "Conv3D"]:
                 kernel = conv_dict.get("weights", None)
                 bias = conv_dict.get("biases", None)
-                if kernel is not None:
+                if kernel is not None and layer_type[i] == "Conv2DWinograd":
+                    # stored in the winograd domain instead of convKernel_
+                    kflat = winograd_kernel(kernel, conv_dict["winograd_tile"]).flatten()
+                    cpp_code += f"    constexpr std::array<Scalar, {len(kflat)}> winogradKernel_{layer_idx} = {{"
+                    cpp_code += ", ".join(f"{val:10.9e}" for val in kflat)
+                    cpp_code += "};\n"
+                elif kernel is not None and layer_type[i] == "Conv1DFFT":
+                    # stored as the spectra of the kernels instead of convKernel_
+                    fft_size = conv_dict["fft_size"]
+                    sflat = fft_spectra(kernel, fft_size)
+                    tflat = fft_twiddles(fft_size)
+                    cpp_code += f"    constexpr std::array<Scalar, {len(sflat)}> fftSpectra_{layer_idx} = {{"
+                    cpp_code += ", ".join(f"{val:10.9e}" for val in sflat)
+                    cpp_code += "};\n"
+                    cpp_code += f"    constexpr std::array<Scalar, {len(tflat)}> fftTwiddles_{layer_idx} = {{"
+                    cpp_code += ", ".join(f"{val:10.9e}" for val in tflat)
+                    cpp_code += "};\n"
+                elif kernel is not None:
                     kflat = kernel.flatten()
                     cpp_code += f"    constexpr std::array<Scalar, {len(kflat)}> convKernel_{layer_idx} = {{"
                     cpp_code += ", ".join(f"{val:10.9e}" for val in kflat)
@@ -244,6 +610,9 @@ auto {name_space}(const {input_type}& initial_input) {{\n
                     cpp_code += f"    constexpr std::array<Scalar, {len(dbflat)}> depthwiseBias_{layer_idx} = {{"
                     cpp_code += ", ".join(f"{val:10.9e}" for val in dbflat)
                     cpp_code += "};\n"
+                else:
+                    size = conv_dict["out_shape"][-1]
+                    cpp_code += f"    constexpr std::array<Scalar, {size}> depthwiseBias_{layer_idx} = {{}};\n"
                 cpp_code += "\n"
 
             # 2d serpable convolutional layers
@@ -279,7 +648,24 @@ auto {name_space}(const {input_type}& initial_input) {{\n
                 kernel = conv_dict.get("weights", None)
                 bias = conv_dict.get("biases", None)
                 if kernel is not None:
-                    kflat = kernel.flatten()
+                    # flip the taps and swap (out, in) -> (in, out) so the kernels gather their inputs
+                    # in order and read the output channels of a tap contiguously
+                    spatial = tuple(range(kernel.ndim - 2))
+                    kernel = np.swapaxes(np.flip(kernel, axis=spatial), -1, -2)
+                    if layer_type[i].endswith("SubPixel"):
+                        # one dense kernel per output phase, phases and their taps in row major order
+                        kernel_size = kernel.shape[:-2]
+                        strides = np.atleast_1d(conv_dict.get("strides", 1))
+                        phase_taps = [
+                            transpose_phase_taps(k, s, transpose_padding(conv_dict.get("padding", "valid"), k, s))
+                            for k, s in zip(kernel_size, strides)
+                        ]
+                        kflat = np.concatenate([
+                            kernel[np.ix_(*[taps[r] for taps, r in zip(phase_taps, phase)])].flatten()
+                            for phase in itertools.product(*[range(s) for s in strides])
+                        ])
+                    else:
+                        kflat = kernel.flatten()
                     cpp_code += f"    constexpr std::array<Scalar, {len(kflat)}> convKernel_{layer_idx} = {{"
                     cpp_code += ", ".join(f"{val:10.9e}" for val in kflat)
                     cpp_code += "};\n"
@@ -288,6 +674,9 @@ auto {name_space}(const {input_type}& initial_input) {{\n
                     cpp_code += f"    constexpr std::array<Scalar, {len(bflat)}> convBias_{layer_idx} = {{"
                     cpp_code += ", ".join(f"{val:10.9e}" for val in bflat)
                     cpp_code += "};\n"
+                else:
+                    size = conv_dict["out_shape"][-1]
+                    cpp_code += f"    constexpr std::array<Scalar, {size}> convBias_{layer_idx} = {{}};\n"
 
             ##########################################################################
             # -------------------------------------------------------------------------
@@ -368,6 +757,7 @@ auto {name_space}(const {input_type}& initial_input) {{\n
                 cpp_code += f"    // {ltype} layer parameters for layer {layer_idx}\n"
                 cpp_code += f"    constexpr std::array<int, 3> poolSize_{layer_idx} = "
                 cpp_code += f"{{{in_shape[0]}, {in_shape[1]}, {in_shape[2]}}};\n\n"
+    param_offsets.append(len(cpp_code))
 
 
     cpp_code += "\n//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\// \n\n"
@@ -412,11 +802,22 @@ auto {name_space}(const {input_type}& initial_input) {{\n
     #################################
     if isinstance(cpp_lambda, dict):
         relevant_activations = set(activation_functions)
-        for key, val in cpp_lambda.items():
-            if key in relevant_activations:
-                cpp_code += val
-    else:
-        cpp_code += cpp_lambda
+        cpp_lambda = "".join(val for key, val in cpp_lambda.items() if key in relevant_activations)
+    cpp_code += cpp_lambda
+
+    # copies of the activation functions for the layers of layer_precision, e.g. relu_double, with
+    # their own copies of the constants, helpers and tables they use (kC0_double of gelu,
+    # approxExp_double of --activation-approx) so nothing is declared twice
+    lambda_names = re.findall(r"auto (\w+) = \+\[", cpp_lambda)
+    declared_names = lambda_names + re.findall(
+        r"static constexpr (?:Scalar|auto|std::array<Scalar, \d+>) (\w+) =", cpp_lambda
+    )
+    compute_types = {idx: "double" if p == "mixed" else p for idx, p in (layer_precision or {}).items()}
+    for scalar in sorted(set(compute_types.values())):
+        typed = re.sub(r"\bScalar\b", scalar, cpp_lambda)
+        if declared_names:
+            typed = re.sub(rf"\b({'|'.join(declared_names)})\b", rf"\1_{scalar}", typed)
+        cpp_code += typed
 
 
     cpp_code += "\n\n//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\// \n\n"
@@ -493,6 +894,8 @@ auto {name_space}(const {input_type}& initial_input) {{\n
     ######################################
     ## PRINT EACH LAYERS FUNCTION CALLS ##
     ######################################
+    # where the code of every layer starts and the buffer it reads
+    call_offsets = []
     for i, (w, b, norm_params, conv_dict, ltype, alpha, act_fun) in enumerate(
         zip(
             weights_list,
@@ -507,6 +910,7 @@ auto {name_space}(const {input_type}& initial_input) {{\n
 
         # layer iterator index
         layer_idx = i + 1
+        call_offsets.append((len(cpp_code), last_layer))
 
         # update current layers shape
         if len(layer_shape) > i + 1:
@@ -517,6 +921,17 @@ auto {name_space}(const {input_type}& initial_input) {{\n
         # retrieve activation function
         mapped_act = activation_func_map.get(act_fun, "linear")
 
+        # depth-first tiled runs are emitted whole at their first layer
+        if tile_plans:
+            if i in tile_plans:
+                plan = tile_plans[i]
+                cpp_code += tiled_run(plan, last_layer)
+                last_layer = f"layer_{plan['layers'][-1] + 1}_output"
+                last_shape = plan["shapes"][-1][1]
+                continue
+            if any(i in plan["layers"] for plan in tile_plans.values()):
+                continue
+
         ##########################
         ## PREPROCESSING LAYERS ##
         ##########################
@@ -553,10 +968,21 @@ auto {name_space}(const {input_type}& initial_input) {{\n
             # print(last_shape)
             continue
 
+        # reshapes of the flat buffers are references to the previous output
+        elif ltype == "ReshapeAlias":
+            cpp_code += f"    // Reshape, layer {layer_idx} (alias of {last_layer})\n"
+            cpp_code += f"    auto& layer_{layer_idx}_output = {last_layer};\n\n"
+            last_layer = f"layer_{layer_idx}_output"
+            last_shape = current_shape
+            continue
+
         #################
         ## CORE LAYERS ##
         #################
-        elif ltype == "Dense":
+        elif ltype in [
+            "Dense", "DenseUnrolled", "DenseActSparse", "DenseInt8", "DenseHalf", "DensePalette", "DenseLowRank",
+            "DenseSparse",
+        ]:
             out_size = w.shape[1]
 
             # if the dense activation is softmax, override with linear activation
@@ -571,17 +997,60 @@ auto {name_space}(const {input_type}& initial_input) {{\n
                 effective_alpha = alpha
 
             cpp_code += f"    // {ltype}, layer {layer_idx}\n"
+            # int8 outputs for the next int8 layer
+            output_type = "int8_t" if i in requantized else "Scalar"
             cpp_code += (
-                f"    static std::array<Scalar, {out_size}> layer_{layer_idx}_output;\n"
+                f"    static std::array<{output_type}, {out_size}> layer_{layer_idx}_output;\n"
             )
-            cpp_code += f"    Dense<Scalar, {out_size}>(\n"
+            if ltype == "DenseUnrolled":
+                cpp_code += f"    DenseUnrolled<Scalar, {out_size}, {get_flat_size(last_shape)}>(\n"
+            elif ltype == "DenseActSparse":
+                cpp_code += f"    DenseActSparse<Scalar, {out_size}, {get_flat_size(last_shape)}>(\n"
+            elif ltype == "DenseInt8":
+                cpp_code += f"    DenseInt8<Scalar, {out_size}, {get_flat_size(last_shape)}>(\n"
+            elif ltype == "DenseHalf":
+                bfloat = "true" if half_params[i]["format"] == "bf16" else "false"
+                cpp_code += f"    DenseHalf<Scalar, {out_size}, {get_flat_size(last_shape)}, {bfloat}>(\n"
+            elif ltype == "DenseSparse":
+                block = sparse_params[i]["block"]
+                cpp_code += f"    DenseSparse<Scalar, {out_size}, {get_flat_size(last_shape)}, {block}>(\n"
+            elif ltype == "DenseLowRank":
+                rank = low_rank_params[i]["rank"]
+                cpp_code += f"    DenseLowRank<Scalar, {out_size}, {get_flat_size(last_shape)}, {rank}>(\n"
+            elif ltype == "DensePalette":
+                clusters = palette_params[i]["clusters"]
+                cpp_code += f"    DensePalette<Scalar, {out_size}, {get_flat_size(last_shape)}, {clusters}>(\n"
+            else:
+                cpp_code += f"    Dense<Scalar, {out_size}>(\n"
             cpp_code += (
                 f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
             )
-            cpp_code += (
-                f"        weights_{layer_idx}.data(), biases_{layer_idx}.data(),\n"
-            )
-            cpp_code += f"        {get_flat_size(last_shape)}, {effective_activation}, {effective_alpha});\n\n"
+            if ltype == "DenseInt8":
+                cpp_code += f"        weightsInt8_{layer_idx}.data(), weightScales_{layer_idx}.data(), biases_{layer_idx}.data(),\n"
+                output_scale = f"outputScale_{layer_idx}" if i in requantized else "Scalar(1)"
+                cpp_code += f"        inputScale_{layer_idx}, {output_scale}, {effective_activation}, {effective_alpha});\n\n"
+            elif ltype == "DenseHalf":
+                cpp_code += f"        weightsHalf_{layer_idx}.data(), biases_{layer_idx}.data(),\n"
+                cpp_code += f"        {effective_activation}, {effective_alpha});\n\n"
+            elif ltype == "DenseSparse":
+                cpp_code += f"        sparseStarts_{layer_idx}.data(), sparseColumns_{layer_idx}.data(), sparseValues_{layer_idx}.data(),\n"
+                cpp_code += f"        biases_{layer_idx}.data(), {effective_activation}, {effective_alpha});\n\n"
+            elif ltype == "DenseLowRank":
+                cpp_code += f"        weightsLeft_{layer_idx}.data(), weightsRight_{layer_idx}.data(), biases_{layer_idx}.data(),\n"
+                cpp_code += f"        {effective_activation}, {effective_alpha});\n\n"
+            elif ltype == "DensePalette":
+                cpp_code += f"        weightsPalette_{layer_idx}.data(), codebook_{layer_idx}.data(), biases_{layer_idx}.data(),\n"
+                cpp_code += f"        {effective_activation}, {effective_alpha});\n\n"
+            else:
+                cpp_code += (
+                    f"        weights_{layer_idx}.data(), biases_{layer_idx}.data(),\n"
+                )
+                if ltype in ["DenseUnrolled", "DenseActSparse"]:
+                    cpp_code += f"        {effective_activation}, {effective_alpha});\n\n"
+                else:
+                    cpp_code += f"        {get_flat_size(last_shape)}, {effective_activation}, {effective_alpha});\n\n"
+            if act_fun == "softmax":
+                cpp_code += f"    softmax(layer_{layer_idx}_output.data(), layer_{layer_idx}_output.data(), {out_size});\n\n"
             last_layer = f"layer_{layer_idx}_output"
             last_shape = (out_size,)
             continue
@@ -743,20 +1212,34 @@ auto {name_space}(const {input_type}& initial_input) {{\n
             )
 
             # 1d convolutional layers
-            if ltype == "Conv1D":
+            if ltype in ["Conv1D", "Conv1DFFT", "Conv1DGrouped"]:
+                kernel = conv_dict.get("kernel_size", (3,))[0]
+                strides = conv_dict.get("strides", (1,))[0]
+                pad = 0
+                if conv_dict.get("padding", "valid").lower() == "same":
+                    pad = same_padding(in_shape[0], out_shape[0], kernel, strides)
                 cpp_code += f"    // {ltype}, layer {layer_idx}\n"
-                cpp_code += f"    static std::array<Scalar, {out_shape[2]}> layer_{layer_idx}_output;\n"
-                cpp_code += f"    Conv1D<Scalar, {out_shape[2]}>(\n"
-                cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
-                cpp_code += f"        convKernel_{layer_idx}.data(), convBias_{layer_idx}.data(),\n"
-                cpp_code += f"        {in_shape[2]}, {conv_dict.get('kernel_size', (3,))[0]}, {conv_dict.get('strides', (1,))[0]}, 0,\n"
+                cpp_code += f"    static std::array<Scalar, ({out_shape[0]} * {out_shape[1]})> layer_{layer_idx}_output;\n"
+                if ltype == "Conv1DFFT":
+                    cpp_code += f"    Conv1DFFT<Scalar, {out_shape[1]}, {out_shape[0]}, {conv_dict['fft_size']}, {in_shape[1]}>(\n"
+                    cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
+                    cpp_code += f"        fftSpectra_{layer_idx}.data(), fftTwiddles_{layer_idx}.data(), convBias_{layer_idx}.data(),\n"
+                    cpp_code += f"        {in_shape[0]}, {kernel}, {pad},\n"
+                else:
+                    groups = f", {conv_dict['groups']}" if ltype == "Conv1DGrouped" else ""
+                    # size of the im2col patches
+                    patch = f", {kernel * in_shape[1] // conv_dict['groups']}" if ltype == "Conv1DGrouped" else ""
+                    cpp_code += f"    {ltype}<Scalar, {out_shape[1]}, {out_shape[0]}{groups}{patch}>(\n"
+                    cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
+                    cpp_code += f"        convKernel_{layer_idx}.data(), convBias_{layer_idx}.data(),\n"
+                    cpp_code += f"        {in_shape[1]}, {in_shape[0]}, {kernel}, {strides}, {pad},\n"
                 cpp_code += f"        {mapped_act}, {alpha});\n\n"
                 last_layer = f"layer_{layer_idx}_output"
-                last_shape = (out_shape[2],)
+                last_shape = out_shape
                 continue
 
             # 2d convolutional layers
-            elif ltype == "Conv2D":
+            elif ltype in ["Conv2D", "Conv2DUnrolled", "Conv2DGemm", "Conv2DWinograd", "Conv2DPointwise", "Conv2DGrouped", "Conv2DFused", "Conv2DGlobalPool", "Conv2DInt8", "Conv2DFusedInt8", "Conv2DGlobalPoolInt8", "Conv2DHalf", "Conv2DPalette", "Conv2DSparse"]:
                 in_shape = conv_dict.get(
                     "in_shape",
                     ("/* in_height */", "/* in_width */", "/* in_channels */"),
@@ -780,39 +1263,147 @@ auto {name_space}(const {input_type}& initial_input) {{\n
                 padding = conv_dict.get("padding", "valid")
                 pad_h = pad_w = 0
                 if padding.lower() == "same":
-                    pad_h = kernel[0] // 2
-                    pad_w = kernel[1] // 2
+                    pad_h = same_padding(in_shape[0], out_shape[0], kernel[0], strides[0])
+                    pad_w = same_padding(in_shape[1], out_shape[1], kernel[1], strides[1])
                 cpp_code += f"    // {ltype}, layer {layer_idx}\n"
-                cpp_code += f"    static std::array<Scalar, ({out_shape[0]} * {out_shape[1]} * {out_shape[2]})> layer_{layer_idx}_output;\n"
-                cpp_code += f"    Conv2D<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]}>(\n"
-                cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
-                cpp_code += f"        convKernel_{layer_idx}.data(), convBias_{layer_idx}.data(),\n"
-                cpp_code += (
-                    f"        {in_shape[2]}, {in_shape[0]}, {in_shape[1]},\n"
-                )
-                cpp_code += f"        {kernel[0]}, {kernel[1]}, {strides[0]}, {strides[1]}, {pad_h}, {pad_w},\n"
+                # int8 outputs for the next int8 layer
+                output_type = "int8_t" if i in requantized else "Scalar"
+                output_scale = f"outputScale_{layer_idx}" if i in requantized else "Scalar(1)"
+                if ltype in ["Conv2DFused", "Conv2DFusedInt8"]:
+                    # only the pooled outputs are stored
+                    pool_shape = conv_dict["pool_shape"]
+                    pool_size = conv_dict["pool_size"]
+                    pool_strides = conv_dict["pool_strides"]
+                    max_pool = "true" if conv_dict["pool_type"] == "max" else "false"
+                    cpp_code += f"    static std::array<{output_type}, ({pool_shape[0]} * {pool_shape[1]} * {pool_shape[2]})> layer_{layer_idx}_output;\n"
+                    cpp_code += f"    {ltype}<Scalar, {pool_shape[2]}, {pool_shape[0]}, {pool_shape[1]}, {pool_size[0]}, {pool_size[1]}, {max_pool},\n"
+                    if ltype == "Conv2DFused":
+                        cpp_code += f"        {kernel[0] * kernel[1] * in_shape[2]}>(\n"
+                        cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
+                        cpp_code += f"        convKernel_{layer_idx}.data(), convBias_{layer_idx}.data(),\n"
+                    else:
+                        cpp_code += f"        {kernel[0] * kernel[1] * in_shape[2]}, {in_shape[0] * in_shape[1] * in_shape[2]}>(\n"
+                        cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
+                        cpp_code += f"        weightsInt8_{layer_idx}.data(), weightScales_{layer_idx}.data(), biases_{layer_idx}.data(),\n"
+                    cpp_code += f"        {in_shape[2]}, {in_shape[0]}, {in_shape[1]},\n"
+                    cpp_code += f"        {kernel[0]}, {kernel[1]}, {strides[0]}, {strides[1]}, {pad_h}, {pad_w}, {pool_strides[0]}, {pool_strides[1]},\n"
+                    if ltype == "Conv2DFusedInt8":
+                        cpp_code += f"        inputScale_{layer_idx}, {output_scale},\n"
+                    cpp_code += f"        {mapped_act}, {alpha});\n\n"
+                    last_layer = f"layer_{layer_idx}_output"
+                    last_shape = pool_shape
+                    continue
+                if ltype in ["Conv2DGlobalPool", "Conv2DGlobalPoolInt8"]:
+                    # only the pooled channels are stored
+                    max_pool = "true" if conv_dict["pool_type"] == "max" else "false"
+                    cpp_code += f"    static std::array<{output_type}, {out_shape[2]}> layer_{layer_idx}_output;\n"
+                    if ltype == "Conv2DGlobalPool":
+                        cpp_code += f"    Conv2DGlobalPool<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]}, {max_pool}, {kernel[0] * kernel[1] * in_shape[2]}>(\n"
+                        cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
+                        cpp_code += f"        convKernel_{layer_idx}.data(), convBias_{layer_idx}.data(),\n"
+                    else:
+                        cpp_code += f"    Conv2DGlobalPoolInt8<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]}, {max_pool},\n"
+                        cpp_code += f"        {kernel[0] * kernel[1] * in_shape[2]}, {in_shape[0] * in_shape[1] * in_shape[2]}>(\n"
+                        cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
+                        cpp_code += f"        weightsInt8_{layer_idx}.data(), weightScales_{layer_idx}.data(), biases_{layer_idx}.data(),\n"
+                    cpp_code += f"        {in_shape[2]}, {in_shape[0]}, {in_shape[1]},\n"
+                    cpp_code += f"        {kernel[0]}, {kernel[1]}, {strides[0]}, {strides[1]}, {pad_h}, {pad_w}, {conv_dict['pool_scale']:10.9e},\n"
+                    if ltype == "Conv2DGlobalPoolInt8":
+                        cpp_code += f"        inputScale_{layer_idx}, {output_scale},\n"
+                    cpp_code += f"        {mapped_act}, {alpha});\n\n"
+                    last_layer = f"layer_{layer_idx}_output"
+                    last_shape = (out_shape[2],)
+                    continue
+                cpp_code += f"    static std::array<{output_type}, ({out_shape[0]} * {out_shape[1]} * {out_shape[2]})> layer_{layer_idx}_output;\n"
+                if ltype == "Conv2DUnrolled":
+                    cpp_code += f"    Conv2DUnrolled<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]},\n"
+                    cpp_code += f"        {in_shape[2]}, {in_shape[0]}, {in_shape[1]},\n"
+                    cpp_code += f"        {kernel[0]}, {kernel[1]}, {strides[0]}, {strides[1]}, {pad_h}, {pad_w}>(\n"
+                    cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
+                    cpp_code += f"        convKernel_{layer_idx}.data(), convBias_{layer_idx}.data(),\n"
+                elif ltype == "Conv2DWinograd":
+                    cpp_code += f"    Conv2DWinograd<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]}, {conv_dict['winograd_tile']}, {in_shape[2]}>(\n"
+                    cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
+                    cpp_code += f"        winogradKernel_{layer_idx}.data(), convBias_{layer_idx}.data(),\n"
+                    cpp_code += f"        {in_shape[0]}, {in_shape[1]}, {pad_h}, {pad_w},\n"
+                elif ltype == "Conv2DInt8":
+                    cpp_code += f"    Conv2DInt8<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]},\n"
+                    cpp_code += f"        {kernel[0] * kernel[1] * in_shape[2]}, {in_shape[0] * in_shape[1] * in_shape[2]}>(\n"
+                    cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
+                    cpp_code += f"        weightsInt8_{layer_idx}.data(), weightScales_{layer_idx}.data(), biases_{layer_idx}.data(),\n"
+                    cpp_code += f"        {in_shape[2]}, {in_shape[0]}, {in_shape[1]},\n"
+                    cpp_code += f"        {kernel[0]}, {kernel[1]}, {strides[0]}, {strides[1]}, {pad_h}, {pad_w}, inputScale_{layer_idx}, {output_scale},\n"
+                elif ltype == "Conv2DHalf":
+                    bfloat = "true" if half_params[i]["format"] == "bf16" else "false"
+                    cpp_code += f"    Conv2DHalf<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]}, {bfloat}, {kernel[0] * kernel[1] * in_shape[2]}>(\n"
+                    cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
+                    cpp_code += f"        weightsHalf_{layer_idx}.data(), biases_{layer_idx}.data(),\n"
+                    cpp_code += f"        {in_shape[2]}, {in_shape[0]}, {in_shape[1]},\n"
+                    cpp_code += f"        {kernel[0]}, {kernel[1]}, {strides[0]}, {strides[1]}, {pad_h}, {pad_w},\n"
+                elif ltype == "Conv2DSparse":
+                    block = sparse_params[i]["block"]
+                    cpp_code += f"    Conv2DSparse<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]}, {block}, {kernel[0] * kernel[1] * in_shape[2]}>(\n"
+                    cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
+                    cpp_code += f"        sparseStarts_{layer_idx}.data(), sparseColumns_{layer_idx}.data(), sparseValues_{layer_idx}.data(),\n"
+                    cpp_code += f"        biases_{layer_idx}.data(), {in_shape[2]}, {in_shape[0]}, {in_shape[1]},\n"
+                    cpp_code += f"        {kernel[0]}, {kernel[1]}, {strides[0]}, {strides[1]}, {pad_h}, {pad_w},\n"
+                elif ltype == "Conv2DPalette":
+                    clusters = palette_params[i]["clusters"]
+                    cpp_code += f"    Conv2DPalette<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]}, {clusters}, {kernel[0] * kernel[1] * in_shape[2]}>(\n"
+                    cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
+                    cpp_code += f"        weightsPalette_{layer_idx}.data(), codebook_{layer_idx}.data(), biases_{layer_idx}.data(),\n"
+                    cpp_code += f"        {in_shape[2]}, {in_shape[0]}, {in_shape[1]},\n"
+                    cpp_code += f"        {kernel[0]}, {kernel[1]}, {strides[0]}, {strides[1]}, {pad_h}, {pad_w},\n"
+                elif ltype == "Conv2DPointwise":
+                    cpp_code += f"    Conv2DPointwise<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]}>(\n"
+                    cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
+                    cpp_code += f"        convKernel_{layer_idx}.data(), convBias_{layer_idx}.data(), {in_shape[2]},\n"
+                else:
+                    groups = f", {conv_dict['groups']}" if ltype == "Conv2DGrouped" else ""
+                    # size of the im2col patches
+                    if ltype == "Conv2DGemm":
+                        patch = f", {kernel[0] * kernel[1] * in_shape[2]}"
+                    elif ltype == "Conv2DGrouped":
+                        patch = f", {kernel[0] * kernel[1] * in_shape[2] // conv_dict['groups']}"
+                    else:
+                        patch = ""
+                    cpp_code += f"    {ltype}<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]}{groups}{patch}>(\n"
+                    cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
+                    cpp_code += f"        convKernel_{layer_idx}.data(), convBias_{layer_idx}.data(),\n"
+                    cpp_code += (
+                        f"        {in_shape[2]}, {in_shape[0]}, {in_shape[1]},\n"
+                    )
+                    cpp_code += f"        {kernel[0]}, {kernel[1]}, {strides[0]}, {strides[1]}, {pad_h}, {pad_w},\n"
                 cpp_code += f"        {mapped_act}, {alpha});\n\n"
                 last_layer = f"layer_{layer_idx}_output"
                 last_shape = out_shape
                 continue
 
             # 3d convolutional layers
-            elif ltype == "Conv3D":
+            elif ltype in ["Conv3D", "Conv3DGemm", "Conv3DGrouped"]:
                 kernel = conv_dict.get("kernel_size", (3, 3, 3))
                 strides = conv_dict.get("strides", (1, 1, 1))
                 padding = conv_dict.get("padding", "valid")
                 pd = ph = pw = 0
                 if padding.lower() == "same":
-                    pd = kernel[0] // 2
-                    ph = kernel[1] // 2
-                    pw = kernel[2] // 2
+                    pd = same_padding(in_shape[0], out_shape[0], kernel[0], strides[0])
+                    ph = same_padding(in_shape[1], out_shape[1], kernel[1], strides[1])
+                    pw = same_padding(in_shape[2], out_shape[2], kernel[2], strides[2])
                 cpp_code += f"    // {ltype}, layer {layer_idx}\n"
                 cpp_code += (
                     f"    static std::array<Scalar, "
                     f"{out_shape[0]} * {out_shape[1]} * {out_shape[2]} * {out_shape[3]}"
                     f"> layer_{layer_idx}_output;\n"
                 )
-                cpp_code += f"    Conv3D<Scalar, {out_shape[3]}, {out_shape[0]}, {out_shape[1]}, {out_shape[2]}>(\n"
+                groups = f", {conv_dict['groups']}" if ltype == "Conv3DGrouped" else ""
+                # size of the im2col patches
+                if ltype == "Conv3DGemm":
+                    patch = f", {kernel[0] * kernel[1] * kernel[2] * in_shape[3]}"
+                elif ltype == "Conv3DGrouped":
+                    patch = f", {kernel[0] * kernel[1] * kernel[2] * in_shape[3] // conv_dict['groups']}"
+                else:
+                    patch = ""
+                cpp_code += f"    {ltype}<Scalar, {out_shape[3]}, {out_shape[0]}, {out_shape[1]}, {out_shape[2]}{groups}{patch}>(\n"
                 cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
                 cpp_code += f"        convKernel_{layer_idx}.data(), convBias_{layer_idx}.data(),\n"
                 cpp_code += f"        {in_shape[3]}, {in_shape[0]}, {in_shape[1]}, {in_shape[2]},\n"
@@ -829,16 +1420,13 @@ auto {name_space}(const {input_type}& initial_input) {{\n
                 padding = conv_dict.get("padding", "valid")
                 pad_h = pad_w = 0
                 if padding.lower() == "same":
-                    pad_h = kernel[0] // 2
-                    pad_w = kernel[1] // 2
+                    pad_h = same_padding(in_shape[0], out_shape[0], kernel[0], strides[0])
+                    pad_w = same_padding(in_shape[1], out_shape[1], kernel[1], strides[1])
                 cpp_code += f"    // {ltype}, layer {layer_idx}\n"
-                cpp_code += f"    static std::array<Scalar, ({out_shape[0]} * {out_shape[1]} * {in_shape[2]})> layer_{layer_idx}_output;\n"
-                cpp_code += f"    DepthwiseConv2D(\n"
+                cpp_code += f"    static std::array<Scalar, ({out_shape[0]} * {out_shape[1]} * {out_shape[2]})> layer_{layer_idx}_output;\n"
+                cpp_code += f"    DepthwiseConv2D<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]}>(\n"
                 cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
                 cpp_code += f"        depthwiseKernel_{layer_idx}.data(), depthwiseBias_{layer_idx}.data(),\n"
-                cpp_code += (
-                    f"        {in_shape[2]}, {out_shape[0]}, {out_shape[1]},\n"
-                )
                 cpp_code += (
                     f"        {in_shape[2]}, {in_shape[0]}, {in_shape[1]},\n"
                 )
@@ -849,41 +1437,52 @@ auto {name_space}(const {input_type}& initial_input) {{\n
                 continue
 
             # 2d seperable convolutional layers
-            elif ltype == "SeparableConv2D":
+            elif ltype in ["SeparableConv2D", "SeparableConv2DGlobalPool"]:
                 kernel = conv_dict.get("kernel_size", (3, 3))
                 strides = conv_dict.get("strides", (1, 1))
                 padding = conv_dict.get("padding", "valid")
                 pad_h = pad_w = 0
                 if padding.lower() == "same":
-                    pad_h = kernel[0] // 2
-                    pad_w = kernel[1] // 2
+                    pad_h = same_padding(in_shape[0], out_shape[0], kernel[0], strides[0])
+                    pad_w = same_padding(in_shape[1], out_shape[1], kernel[1], strides[1])
                 cpp_code += f"    // {ltype}, layer {layer_idx}\n"
-                cpp_code += f"    static std::array<Scalar, ({out_shape[0]} * {out_shape[1]} * {out_shape[2]})> layer_{layer_idx}_output;\n"
-                cpp_code += f"    SeparableConv2D<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]}>(\n"
+                if ltype == "SeparableConv2DGlobalPool":
+                    # only the pooled channels are stored
+                    max_pool = "true" if conv_dict["pool_type"] == "max" else "false"
+                    cpp_code += f"    static std::array<Scalar, {out_shape[2]}> layer_{layer_idx}_output;\n"
+                    cpp_code += f"    SeparableConv2DGlobalPool<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]}, {max_pool}, {in_shape[2]}>(\n"
+                else:
+                    cpp_code += f"    static std::array<Scalar, ({out_shape[0]} * {out_shape[1]} * {out_shape[2]})> layer_{layer_idx}_output;\n"
+                    cpp_code += f"    SeparableConv2D<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]}>(\n"
                 cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
                 cpp_code += f"        sepDepthwise_{layer_idx}.data(), sepPointwise_{layer_idx}.data(), sepPointwiseBias_{layer_idx}.data(),\n"
-                cpp_code += (
-                    f"        {in_shape[2]}, {in_shape[0]}, {in_shape[1]},\n"
-                )
+                if ltype == "SeparableConv2DGlobalPool":
+                    cpp_code += f"        {in_shape[0]}, {in_shape[1]},\n"
+                else:
+                    cpp_code += (
+                        f"        {in_shape[2]}, {in_shape[0]}, {in_shape[1]},\n"
+                    )
                 cpp_code += f"        {kernel[0]}, {kernel[1]}, {strides[0]}, {strides[1]}, {pad_h}, {pad_w},\n"
-                cpp_code += f"        {mapped_act}, {alpha});\n\n"
+                if ltype == "SeparableConv2DGlobalPool":
+                    cpp_code += f"        {conv_dict['pool_scale']:10.9e}, {mapped_act}, {alpha});\n\n"
+                    last_shape = (out_shape[2],)
+                else:
+                    cpp_code += f"        {mapped_act}, {alpha});\n\n"
+                    last_shape = out_shape
                 last_layer = f"layer_{layer_idx}_output"
-                last_shape = out_shape
                 continue
 
             # 1d transposed convolutional layers
-            elif ltype == "Conv1DTranspose":
+            elif ltype in ["Conv1DTranspose", "Conv1DTransposeSubPixel"]:
                 out_shape = conv_dict["out_shape"]
                 in_shape = conv_dict["in_shape"]
                 kernel = conv_dict.get("kernel_size", (3,))[0]
                 strides = conv_dict.get("strides", (1,))[0]
-                pad = 0
-                if conv_dict.get("padding", "valid").lower() == "same":
-                    pad = kernel // 2
+                pad = transpose_padding(conv_dict.get("padding", "valid"), kernel, strides)
                 cpp_code += f"    // {ltype}, layer {layer_idx}\n"
                 cpp_code += f"    static std::array<Scalar, ({out_shape[0]} * {out_shape[1]})> layer_{layer_idx}_output;\n"
                 cpp_code += (
-                    f"    Conv1DTranspose<Scalar, {out_shape[1]}, {out_shape[0]}>"
+                    f"    {ltype}<Scalar, {out_shape[1]}, {out_shape[0]}>"
                 )
                 cpp_code += "(layer_{0}_output.data(), {1}.data(), convKernel_{0}.data(), convBias_{0}.data(),".format(
                     layer_idx, last_layer
@@ -894,19 +1493,17 @@ auto {name_space}(const {input_type}& initial_input) {{\n
                 continue
 
             # 2d transposed convolutional layers
-            elif ltype == "Conv2DTranspose":
+            elif ltype in ["Conv2DTranspose", "Conv2DTransposeSubPixel"]:
                 kernel = conv_dict.get("kernel_size", (3, 3))
                 strides = conv_dict.get("strides", (1, 1))
                 padding = conv_dict.get("padding", "valid")
-                pad_h = pad_w = 0
-                if padding.lower() == "same":
-                    pad_h = kernel[0] // 2
-                    pad_w = kernel[1] // 2
+                pad_h = transpose_padding(padding, kernel[0], strides[0])
+                pad_w = transpose_padding(padding, kernel[1], strides[1])
                 out_shape = conv_dict.get("out_shape")
                 in_shape = conv_dict.get("in_shape")
                 cpp_code += f"    // {ltype}, layer {layer_idx}\n"
                 cpp_code += f"    static std::array<Scalar, ({out_shape[0]} * {out_shape[1]} * {out_shape[2]})> layer_{layer_idx}_output;\n"
-                cpp_code += f"    Conv2DTranspose<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]}>(\n"
+                cpp_code += f"    {ltype}<Scalar, {out_shape[2]}, {out_shape[0]}, {out_shape[1]}>(\n"
                 cpp_code += f"        layer_{layer_idx}_output.data(), {last_layer}.data(),\n"
                 cpp_code += f"        convKernel_{layer_idx}.data(), convBias_{layer_idx}.data(),\n"
                 cpp_code += (
@@ -919,17 +1516,18 @@ auto {name_space}(const {input_type}& initial_input) {{\n
                 continue
 
             # 3d transposed convolutional layers
-            elif ltype == "Conv3DTranspose":
+            elif ltype in ["Conv3DTranspose", "Conv3DTransposeSubPixel"]:
                 out_shape = conv_dict["out_shape"]
                 in_shape = conv_dict["in_shape"]
                 kd, kh, kw = conv_dict.get("kernel_size", (3, 3, 3))
                 sd, sh, sw = conv_dict.get("strides", (1, 1, 1))
-                pd = ph = pw = 0
-                if conv_dict.get("padding", "valid").lower() == "same":
-                    pd, ph, pw = kd // 2, kh // 2, kw // 2
+                padding = conv_dict.get("padding", "valid")
+                pd = transpose_padding(padding, kd, sd)
+                ph = transpose_padding(padding, kh, sh)
+                pw = transpose_padding(padding, kw, sw)
                 cpp_code += f"    // {ltype}, layer {layer_idx}\n"
                 cpp_code += f"    static std::array<Scalar, ({out_shape[0]} * {out_shape[1]} * {out_shape[2]} * {out_shape[3]})> layer_{layer_idx}_output;\n"
-                cpp_code += f"    Conv3DTranspose<Scalar, {out_shape[3]}, {out_shape[0]}, {out_shape[1]}, {out_shape[2]}>"
+                cpp_code += f"    {ltype}<Scalar, {out_shape[3]}, {out_shape[0]}, {out_shape[1]}, {out_shape[2]}>"
                 cpp_code += "(layer_{0}_output.data(), {1}.data(), convKernel_{0}.data(), convBias_{0}.data(),".format(
                     layer_idx, last_layer
                 )
@@ -1076,7 +1674,7 @@ auto {name_space}(const {input_type}& initial_input) {{\n
                 continue
 
             # 2d global average pooling layers
-            elif ltype == "GlobalAveragePooling2D":
+            elif ltype == "GlobalAvgPooling2D":
                 cpp_code += f"    // {ltype}, layer {layer_idx}\n"
                 cpp_code += f"    static std::array<Scalar, {in_shape[2]}> layer_{layer_idx}_output;\n"
                 cpp_code += f"    GlobalAvgPooling2D(\n"
@@ -1095,6 +1693,7 @@ auto {name_space}(const {input_type}& initial_input) {{\n
                 last_shape = (in_shape[3],)
                 continue
 
+    call_offsets.append((len(cpp_code), last_layer))
 
     cpp_code += "\n//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\// \n\n\n"
 
@@ -1118,7 +1717,9 @@ auto {name_space}(const {input_type}& initial_input) {{\n
             dims = len(raw_dims)
 
             if dims == 1:
-                cpp_code += f"    static std::array<Scalar, {out_size[0]}> model_output = {last_layer};\n\n"
+                # assigned on every call, an initializer would only run on the first one
+                cpp_code += f"    static std::array<Scalar, {out_size[0]}> model_output;\n"
+                cpp_code += f"    model_output = {last_layer};\n\n"
             elif dims == 2:
                 cpp_code += f"    static std::array<std::array<Scalar, {out_size[1]}>, {out_size[0]}> model_output;\n"
                 cpp_code += f"    for(int i = 0; i < {out_size[0]}; i++) {{\n"
@@ -1135,8 +1736,110 @@ auto {name_space}(const {input_type}& initial_input) {{\n
 
         # hand single-dimensional output layer
         else:
-            cpp_code += f"static std::array<Scalar, {out_size}> model_output = {last_layer};\n\n"
+            cpp_code += f"static std::array<Scalar, {out_size}> model_output;\n"
+            cpp_code += f"model_output = {last_layer};\n\n"
 
     cpp_code += f"return model_output;\n\n}}"
 
+    if layer_precision:
+        cpp_code = retype_layers(cpp_code)
+
+    return cpp_code
+
+
+def fixedPointCodeGen(cpp_code, fixed_params, user_file):
+    # ===============================================================================
+    # function to generate the integer-only model function of a fixed-point model
+    # from fixedPointLayers(): the integer weights and biases of every operation, the
+    # DenseFixed / AffineFixed calls and the integer activations. the function takes
+    # and returns the flat model input and output as integers with the fractional bits
+    # given by the <name>_input_frac_bits / <name>_output_frac_bits constants, so the
+    # generated code has no floating-point operations.
+
+    # args:
+    #   cpp_code: the code to be generated (preamble and fixed-point kernels)
+    #   fixed_params: the fixed-point model from fixedPointLayers()
+    #   user_file: the name of the user file
+
+    # returns:
+    #   cpp_code: the fully generated cpp code
+    # ===============================================================================
+    name_space = os.path.splitext(os.path.basename(user_file))[0]
+    name_space = name_space.replace("-", "_").replace(" ", "_")
+    word, bits = fixed_params["word"], fixed_params["bits"]
+
+    cpp_code += "\n//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\// \n\n"
+    cpp_code += f"// fixed-point model: the {word} values x stand for x / 2^frac_bits\n"
+    cpp_code += f"constexpr int {name_space}_input_frac_bits = {fixed_params['input_frac']};\n"
+    cpp_code += f"constexpr int {name_space}_output_frac_bits = {fixed_params['output_frac']};\n"
+    cpp_code += f"""
+inline auto {name_space}(const std::array<{word}, {fixed_params['input_size']}>& initial_input) noexcept {{\n
+"""
+
+    ##################################
+    ## PRINT EACH LAYERS PARAMETERS ##
+    ##################################
+    for k, op in enumerate(fixed_params["ops"]):
+        if op["kernel"] is None:
+            continue
+        wflat = op["weights"].flatten()
+        cpp_code += f"    // {op['label']}: {op['frac_in']} -> {op['frac_pre']} fractional bits\n"
+        cpp_code += f"    static constexpr std::array<{word}, {len(wflat)}> weights_{k} = {{"
+        cpp_code += ", ".join(str(int(val)) for val in wflat)
+        cpp_code += "};\n"
+        cpp_code += f"    static constexpr std::array<int64_t, {len(op['biases'])}> biases_{k} = {{"
+        cpp_code += ", ".join(f"{int(val)}LL" for val in op["biases"])
+        cpp_code += "};\n\n"
+
+    cpp_code += "\n//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\// \n\n"
+
+    ##############################
+    ## PRINT EACH FUNCTION CALL ##
+    ##############################
+    last_layer = "initial_input"
+    last_size = fixed_params["input_size"]
+    for k, op in enumerate(fixed_params["ops"]):
+        name = op["name"]
+        if op["kernel"] == "DenseFixed":
+            size = op["weights"].shape[0]
+            cpp_code += f"    // {op['label']}\n"
+            cpp_code += f"    static std::array<{word}, {size}> {name};\n"
+            cpp_code += f"    DenseFixed<{word}, {size}, {last_size}, {op['shift']}, {bits}>(\n"
+            cpp_code += f"        {name}.data(), {last_layer}.data(), weights_{k}.data(), biases_{k}.data());\n"
+            source = name
+        elif op["kernel"] == "AffineFixed":
+            size = last_size
+            cpp_code += f"    // {op['label']}\n"
+            cpp_code += f"    static std::array<{word}, {size}> {name};\n"
+            cpp_code += f"    AffineFixed<{word}, {size}, {op['shift']}, {bits}>(\n"
+            cpp_code += f"        {name}.data(), {last_layer}.data(), weights_{k}.data(), biases_{k}.data());\n"
+            source = name
+        else:
+            size = last_size
+            cpp_code += f"    // {op['label']}\n"
+            cpp_code += f"    static std::array<{word}, {size}> {name};\n"
+            source = last_layer
+
+        act = op["activation"]
+        if act == "relu":
+            value = f"{source}[i] < 0 ? {word}(0) : {source}[i]"
+        elif act == "leakyrelu":
+            value = f"FixedLeakyRelu<{word}, {bits}>({source}[i], {op['alpha_q']})"
+        elif act == "tanh":
+            value = f"FixedTanh<{word}, {bits}, {op['frac_pre']}, {op['frac_out']}>({source}[i])"
+        elif act == "sigmoid":
+            value = f"FixedSigmoid<{word}, {bits}, {op['frac_pre']}, {op['frac_out']}>({source}[i])"
+        elif op["kernel"] is None:
+            value = f"{source}[i]"
+        else:
+            value = None
+        if value is not None:
+            cpp_code += f"    for (int i = 0; i < {size}; ++i) {{ {name}[i] = {value}; }}\n"
+        cpp_code += "\n"
+        last_layer = name
+        last_size = size
+
+    cpp_code += "\n//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\//\\\// \n\n\n"
+    cpp_code += f"    return {last_layer};\n\n}}\n"
+
     return cpp_code
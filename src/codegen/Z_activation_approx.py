@@ -0,0 +1,249 @@
+import math
+import numpy as np
+from Z_quantization import castModel, referenceForward
+
+
+# activations with a fast approximation (--activation-approx), the rest keep the exact lambdas
+approx_activations = ["sigmoid", "tanh", "elu", "selu", "swish", "silu", "gelu"]
+
+# (step, segments) of the piecewise cubic tables: tanh(u) for u in [0, 9) and exp(-u) - 1 for
+# u in [0, 17), beyond them the middle of the last piece (within 4e-8 of +-1 and -1)
+approx_tables = {"tanh": (1 / 32, 288), "expm1": (1 / 16, 272)}
+
+# 1.5 * 2^mantissa bits, adding and subtracting it rounds to an integer (ties to even)
+shifters = {np.float32: 12582912.0, np.float64: 6755399441055744.0}
+
+# max |approximation - exact value| per method and precision of the generated code, over x in
+# [-30, 30] (testing/activation_approx.py). in float the largest errors are the rounding of the
+# outputs near |x| = 30 (up to 1.3e-6 for the exact swish lambda), the table errors of swish, silu
+# and gelu grow with |x| (|x| / 2 times the error of the tanh they are built on)
+approx_max_error = {
+    ("rational", "float"): {
+        "sigmoid": 8.9e-8, "tanh": 2.8e-7, "elu": 5.1e-8, "selu": 2.0e-6, "swish": 1.3e-6, "silu": 1.3e-6,
+        "gelu": 8.3e-7,
+    },
+    ("rational", "double"): {
+        "sigmoid": 1.7e-16, "tanh": 2.4e-16, "elu": 2.2e-16, "selu": 3.0e-15, "swish": 5.1e-15, "silu": 5.1e-15,
+        "gelu": 1.1e-15,
+    },
+    ("table", "float"): {
+        "sigmoid": 6.0e-8, "tanh": 6.0e-8, "elu": 7.5e-8, "selu": 2.0e-6, "swish": 1.2e-6, "silu": 1.2e-6,
+        "gelu": 9.0e-7,
+    },
+    ("table", "double"): {
+        "sigmoid": 1.6e-8, "tanh": 3.2e-8, "elu": 4.3e-8, "selu": 7.6e-8, "swish": 4.8e-7, "silu": 4.8e-7,
+        "gelu": 4.8e-7,
+    },
+}
+
+
+def activationTable(function):
+    # ===================================================================================
+    # function for the coefficients of the piecewise cubic tables of the "table" method:
+    # the cubic hermite interpolation of tanh(u) ("tanh") or exp(-u) - 1 ("expm1") on
+    # every segment of approx_tables, in the segment coordinate t in [0, 1):
+    # c0 + c1 t + c2 t^2 + c3 t^3. shared by the lambdas of C_layer_propagation.py and
+    # approxActivation() so both interpolate the same way.
+
+    # args:
+    #     function: "tanh" or "expm1".
+
+    # returns:
+    #     list of 4 * segments floats, the coefficients of segment s at 4 * s.
+    # ===================================================================================
+    step, segments = approx_tables[function]
+    if function == "tanh":
+        value = math.tanh
+        slope = lambda u: 1 - math.tanh(u) ** 2
+    else:
+        value = lambda u: math.expm1(-u)
+        slope = lambda u: -math.exp(-u)
+    coefficients = []
+    for s in range(segments):
+        f0, f1 = value(s * step), value((s + 1) * step)
+        d0, d1 = slope(s * step) * step, slope((s + 1) * step) * step
+        coefficients += [f0, d0, 3 * (f1 - f0) - 2 * d0 - d1, 2 * (f0 - f1) + d0 + d1]
+    return coefficients
+
+
+def tableLookup(function, u):
+    # ===================================================================================
+    # function for the piecewise cubic of activationTable() at u >= 0 in the precision of
+    # u, clamped to the middle of the last piece. the piece is round(u / step - 0.5) with
+    # the rounding of the shifter sum like the lambdas.
+    # ===================================================================================
+    dtype = u.dtype
+    step, segments = approx_tables[function]
+    shifter = dtype.type(shifters[dtype.type])
+    table = np.asarray(activationTable(function), dtype=dtype).reshape(segments, 4)
+    u = np.minimum(dtype.type(segments - 0.5), u * dtype.type(1 / step))
+    segment = (u - dtype.type(0.5) + shifter) - shifter
+    t = u - segment
+    c = table[segment.astype(np.int64)]
+    return ((c[..., 3] * t + c[..., 2]) * t + c[..., 1]) * t + c[..., 0]
+
+
+def approxExp(x):
+    # ===================================================================================
+    # function for the exp of the "rational" method in the precision of x: 2^k exp(r) with
+    # k = round(x / ln 2) and |r| <= ln 2 / 2, exp(r) from its taylor polynomial (degree 7
+    # for float32, 12 for float64).
+    # ===================================================================================
+    dtype = x.dtype
+    single = dtype == np.float32
+    limit = 87 if single else 708
+    shifter = dtype.type(shifters[dtype.type])
+    x = np.clip(x, -limit, limit).astype(dtype)
+    k = (x * dtype.type(1.4426950408889634) + shifter) - shifter
+    r = (x - k * dtype.type(0.693145751953125)) - k * dtype.type(1.4286068203094173e-06)
+    p = np.ones_like(x)
+    for n in range(7 if single else 12, 0, -1):
+        p = dtype.type(1) + p * r * dtype.type(1.0 / n)
+    return p * np.ldexp(dtype.type(1), k.astype(np.int32)).astype(dtype)
+
+
+def approxTanh(x, method):
+    # ===================================================================================
+    # function for the tanh of a method in the precision of x: the rational minimax
+    # approximation in float32 and 1 - 2 / (exp(2 |x|) + 1) in float64 for "rational",
+    # the cubic pieces of activationTable("tanh") for "table".
+    # ===================================================================================
+    dtype = x.dtype
+    if method == "table":
+        return np.copysign(tableLookup("tanh", np.abs(x)), x)
+    if dtype == np.float32:
+        c = np.clip(x, -7.90531110763549805, 7.90531110763549805).astype(dtype)
+        c2 = c * c
+        p = dtype.type(-2.76076847742355e-16)
+        for a in [2.00018790482477e-13, -8.60467152213735e-11, 5.12229709037114e-08, 1.48572235717979e-05,
+                  6.37261928875436e-04, 4.89352455891786e-03]:
+            p = p * c2 + dtype.type(a)
+        q = dtype.type(1.19825839466702e-06)
+        for b in [1.18534705686654e-04, 2.26843463243900e-03, 4.89352518554385e-03]:
+            q = q * c2 + dtype.type(b)
+        return np.where(np.abs(x) < dtype.type(0.0004), x, c * p / q)
+    return np.copysign(dtype.type(1) - dtype.type(2) / (approxExp(dtype.type(2) * np.abs(x)) + dtype.type(1)), x)
+
+
+def approxExpm1(x, method):
+    # ===================================================================================
+    # function for the exp(x) - 1 of the negative inputs of elu / selu in the precision
+    # of x (the positive inputs are not used).
+    # ===================================================================================
+    dtype = x.dtype
+    if method == "rational":
+        return approxExp(x) - dtype.type(1)
+    return tableLookup("expm1", np.maximum(-x, dtype.type(0)))
+
+
+def approxActivation(name, x, alpha, method):
+    # ===================================================================================
+    # function for the approximated activation lambdas of C_layer_propagation.py in the
+    # precision of x (up to the rounding of the fused multiply-adds), or the exact
+    # lambdas for method None.
+
+    # args:
+    #     name: activation function from approx_activations.
+    #     x: float32 or float64 array.
+    #     alpha: activation parameter (elu alpha, swish beta).
+    #     method: "rational", "table" or None.
+
+    # returns:
+    #     array of the activated values in the precision of x.
+    # ===================================================================================
+    dtype = x.dtype
+    one, half = dtype.type(1), dtype.type(0.5)
+    alpha = dtype.type(alpha)
+    if method is None:
+        tanh, expm1 = np.tanh, lambda v: np.exp(v) - one
+        sigmoid = lambda v: one / (one + np.exp(-v))
+    else:
+        tanh = lambda v: approxTanh(v, method)
+        expm1 = lambda v: approxExpm1(v, method)
+        if method == "rational":
+            sigmoid = lambda v: one / (one + approxExp(-v))
+        else:
+            sigmoid = lambda v: half + half * approxTanh(half * v, method)
+    if name == "sigmoid":
+        return sigmoid(x)
+    if name == "tanh":
+        return tanh(x)
+    if name == "elu":
+        return np.where(x > 0, x, alpha * expm1(np.minimum(x, 0)))
+    if name == "selu":
+        return dtype.type(1.0507009873554804934193349852946) * np.where(
+            x > 0, x, dtype.type(1.6732632423543772848170429916717) * expm1(np.minimum(x, 0))
+        )
+    if name == "swish":
+        return x * sigmoid(alpha * x)
+    if name == "silu":
+        return x * sigmoid(x)
+    y = dtype.type(0.7978845608028654) * (x + dtype.type(0.044715) * x * x * x)
+    return half * x * (one + tanh(y))
+
+
+def activationApprox(model, layer_type, extracted_layer_type, weights_list, biases_list, conv_layer_params,
+                     extracted_activations, extracted_alphas, method, tolerance, inputs, scalar_bytes):
+    # ===================================================================================
+    # function to choose the activation functions that use the fast approximations of
+    # --activation-approx. the activations of approx_activations in the model are tried
+    # one at a time and kept if the model outputs on the check inputs stay within
+    # tolerance of the outputs with the exact lambdas, with the activations kept before.
+    # the activations are taken per keras layer from extractModel(), so the ones fused
+    # into other layers later are evaluated where keras applies them. for a double
+    # Scalar the keras layers run in float64 (castModel()), float32 would hide the
+    # approximation errors below its own rounding.
+
+    # args:
+    #     model: keras model the layer lists were extracted from.
+    #     layer_type: list of layer types after the fusion and simplification passes.
+    #     extracted_layer_type: list of layer types from extractModel(), one per layer.
+    #     weights_list: list of dense weights for each layer.
+    #     biases_list: list of dense biases for each layer.
+    #     conv_layer_params: list of convolution layer parameters for each layer.
+    #     extracted_activations: list of activation functions from extractModel().
+    #     extracted_alphas: list of activation parameters from extractModel().
+    #     method: "rational" or "table".
+    #     tolerance: max |output - exact output| on the check inputs.
+    #     inputs: batch of check inputs.
+    #     scalar_bytes: size of the generated Scalar type, the precision of the check.
+
+    # returns:
+    #     dict of the approximated activation functions (lambda names, "tanhCustom" for
+    #     tanh) to method, and a report dict with the "errors" of every tried activation
+    #     (max |output error| with it and the ones kept before, by name), the "used"
+    #     activations and the "max_abs_error" and "relative_error" of the kept ones.
+    # ===================================================================================
+    dtype = np.float32 if scalar_bytes == 4 else np.float64
+    if dtype == np.float64:
+        model = castModel(model, "float64")
+    candidates = [name for name in approx_activations if name in extracted_activations]
+
+    def forward(approximated):
+        overrides = {}
+        for i, name in enumerate(extracted_activations):
+            if name in candidates:
+                overrides[i] = lambda z, name=name, alpha=extracted_alphas[i]: approxActivation(
+                    name, np.asarray(z, dtype=dtype), alpha, method if name in approximated else None
+                ).astype(np.float64)
+        return referenceForward(model, layer_type, extracted_layer_type, weights_list, biases_list,
+                                conv_layer_params, inputs, activations=overrides)
+
+    # exp(-x) of the exact sigmoids overflows to inf for large negative x, which gives 0
+    with np.errstate(over="ignore"):
+        exact = forward(set())
+        scale = float(np.max(np.abs(exact))) or 1.0
+        used, errors, max_abs_error = [], {}, 0.0
+        for name in candidates:
+            error = float(np.max(np.abs(forward(set(used) | {name}) - exact)))
+            errors[name] = error
+            if error <= tolerance:
+                used.append(name)
+                max_abs_error = error
+    approximated = {("tanhCustom" if name == "tanh" else name): method for name in used}
+    return approximated, {
+        "errors": errors,
+        "used": used,
+        "max_abs_error": max_abs_error,
+        "relative_error": max_abs_error / scale,
+    }
@@ -0,0 +1,367 @@
+import math
+import numpy as np
+
+
+# activations with an integer implementation, None / "linear" pass values through
+fixed_point_activations = [None, "linear", "relu", "leakyrelu", "tanh", "sigmoid"]
+
+# magnitude bits of the values in each word size: int32 words keep 24 so that the int64
+# accumulators of the Dense layers hold 2^14 products of two values without overflowing
+fixed_point_words = {16: ("int16_t", 15), 32: ("int32_t", 24)}
+
+
+def tanhKnots():
+    # ===================================================================================
+    # function for the knots of the piecewise linear tanh of the fixed-point kernels:
+    # tanh(k / 32) for k = 0..128 (the interval [0, 4]) in Q30. shared by FixedTanhQ30()
+    # in C_layer_propagation.py and fixedForward() so both round the same way.
+
+    # returns:
+    #     list of 129 integers.
+    # ===================================================================================
+    return [int(round(math.tanh(k / 32) * 2**30)) for k in range(129)]
+
+
+def fracBits(absmax, bits, headroom=1.0):
+    # ===================================================================================
+    # function to pick the Q format of a tensor: the most fractional bits that still hold
+    # |values| up to absmax * headroom in the given magnitude bits.
+
+    # args:
+    #     absmax: largest |value| of the tensor.
+    #     bits: magnitude bits of the word (15 for int16_t, 24 for int32_t).
+    #     headroom: margin over absmax for values the range analysis did not see.
+
+    # returns:
+    #     number of fractional bits (negative if the integer part needs more than bits).
+    # ===================================================================================
+    if absmax <= 0:
+        return bits
+    return bits - (int(math.floor(math.log2(absmax * headroom))) + 1)
+
+
+def fixedShift(values, shift):
+    # ===================================================================================
+    # function for the rounding arithmetic shift of FixedShift(): right by shift bits with
+    # rounding half up, or a left shift for negative shifts.
+    # ===================================================================================
+    values = np.asarray(values, dtype=np.int64)
+    if shift > 0:
+        return (values + (1 << (shift - 1))) >> shift
+    return values * (1 << -shift)
+
+
+def fixedSaturate(values, bits):
+    # ===================================================================================
+    # function for the saturation of FixedSaturate() to +-(2^bits - 1).
+
+    # returns:
+    #     the saturated values and the number of values that were clipped.
+    # ===================================================================================
+    limit = (1 << bits) - 1
+    return np.clip(values, -limit, limit), int(np.count_nonzero(np.abs(values) > limit))
+
+
+def fixedTanhQ30(values, frac_in):
+    # ===================================================================================
+    # function for FixedTanhQ30(): tanh of values with frac_in fractional bits in Q30,
+    # interpolated between the tanhKnots() and saturated to +-1 beyond |x| = 4.
+    # ===================================================================================
+    knots = np.asarray(tanhKnots(), dtype=np.int64)
+    values = np.asarray(values, dtype=np.int64)
+    position = fixedShift(np.abs(values), frac_in - 21)
+    segment = position >> 16
+    k = np.minimum(segment, 127)
+    inside = knots[k] + (((knots[k + 1] - knots[k]) * (position & 0xFFFF)) >> 16)
+    result = np.where(segment < 128, inside, 1 << 30)
+    return np.where(values < 0, -result, result)
+
+
+def fixedPointOps(layer_type, weights_list, biases_list, activation_functions, alphas, norm_layer_params,
+                  input_size, input_norms, input_mins, output_norms, output_mins):
+    # ===================================================================================
+    # function to turn the layer lists into the sequence of float operations the
+    # fixed-point backend can run: Dense layers (with their activation), 1d batch
+    # normalizations, Rescale layers and the input / output normalization as per-feature
+    # affine maps, and standalone activations. Dropout, Flatten and Reshape layers only
+    # pass the flat values along.
+
+    # args:
+    #     layer_type: list of layer types after the fusion and simplification passes.
+    #     weights_list: list of dense weights for each layer.
+    #     biases_list: list of dense biases for each layer.
+    #     activation_functions: list of activation functions for each layer.
+    #     alphas: list of activation alphas for each layer.
+    #     norm_layer_params: list of normalization parameters for each layer.
+    #     input_size: flat size of the model input.
+    #     input_norms, input_mins, output_norms, output_mins: normalization parameters or None.
+
+    # returns:
+    #     list of dicts with "kind" ("dense", "affine" or "activation"), "name" of the
+    #     output buffer, "label", "weights" / "scale" and "biases" / "shift" (float64),
+    #     "activation" and "alpha".
+
+    # raises:
+    #     ValueError: for layers or activations without an integer implementation.
+    # ===================================================================================
+    ops = []
+    width = input_size
+    if input_norms is not None:
+        norms = np.asarray(input_norms, dtype=np.float64)
+        ops.append({
+            "kind": "affine", "name": "model_input", "label": "input normalization",
+            "scale": 1.0 / norms, "shift": -np.asarray(input_mins, dtype=np.float64) / norms,
+            "activation": "linear", "alpha": 0.0,
+        })
+
+    for i, ltype in enumerate(layer_type):
+        if ltype is None or ltype in ["Dropout", "Flatten", "Reshape", "ReshapeAlias"]:
+            continue
+        act = activation_functions[i]
+        if act not in fixed_point_activations:
+            raise ValueError(f"the fixed-point backend has no integer {act} activation (layer {i + 1})")
+        act = act or "linear"
+        name = f"layer_{i + 1}_output"
+        if ltype == "Dense":
+            weights = np.asarray(weights_list[i], dtype=np.float64)
+            biases = biases_list[i]
+            ops.append({
+                "kind": "dense", "name": name, "label": f"Dense layer {i + 1}",
+                "weights": weights,
+                "biases": np.zeros(weights.shape[1]) if biases is None else np.asarray(biases, dtype=np.float64),
+                "activation": act, "alpha": alphas[i],
+            })
+            width = weights.shape[1]
+        elif ltype == "BatchNormalization":
+            gamma, beta, mean, var, eps = norm_layer_params[i]
+            scale = np.asarray(gamma, dtype=np.float64) / np.sqrt(np.asarray(var, dtype=np.float64) + eps)
+            ops.append({
+                "kind": "affine", "name": name, "label": f"BatchNormalization layer {i + 1}",
+                "scale": scale, "shift": np.asarray(beta, dtype=np.float64) - np.asarray(mean, dtype=np.float64) * scale,
+                "activation": "linear", "alpha": 0.0,
+            })
+        elif ltype == "Rescale":
+            scale, offset = norm_layer_params[i]
+            ops.append({
+                "kind": "affine", "name": name, "label": f"Rescale layer {i + 1}",
+                "scale": np.broadcast_to(np.asarray(scale, dtype=np.float64), (width,)).copy(),
+                "shift": np.broadcast_to(np.asarray(offset, dtype=np.float64), (width,)).copy(),
+                "activation": "linear", "alpha": 0.0,
+            })
+        elif ltype == "Activation":
+            ops.append({
+                "kind": "activation", "name": name, "label": f"Activation layer {i + 1}",
+                "activation": act, "alpha": alphas[i],
+            })
+        else:
+            raise ValueError(f"the fixed-point backend does not support {ltype} layers (layer {i + 1})")
+
+    if output_norms is not None:
+        ops.append({
+            "kind": "affine", "name": "model_output", "label": "output denormalization",
+            "scale": np.asarray(output_norms, dtype=np.float64), "shift": np.asarray(output_mins, dtype=np.float64),
+            "activation": "linear", "alpha": 0.0,
+        })
+    return ops
+
+
+def floatForward(ops, inputs, ranges=None):
+    # ===================================================================================
+    # function to run raw (unnormalized) inputs through the fixedPointOps() in double
+    # precision, the reference the fixed-point model is measured against.
+
+    # args:
+    #     ops: list of operations from fixedPointOps().
+    #     inputs: batch of flat raw inputs.
+    #     ranges: optional list, filled with the largest |pre-activation| and |output| of
+    #             every operation.
+
+    # returns:
+    #     the model outputs for the batch.
+    # ===================================================================================
+    x = np.asarray(inputs, dtype=np.float64)
+    for op in ops:
+        if op["kind"] == "dense":
+            z = x @ op["weights"] + op["biases"]
+        elif op["kind"] == "affine":
+            z = x * op["scale"] + op["shift"]
+        else:
+            z = x
+        act = op["activation"]
+        if act == "relu":
+            x = np.maximum(z, 0.0)
+        elif act == "leakyrelu":
+            x = np.where(z < 0, op["alpha"] * z, z)
+        elif act == "tanh":
+            x = np.tanh(z)
+        elif act == "sigmoid":
+            x = 1.0 / (1.0 + np.exp(-z))
+        else:
+            x = z
+        if ranges is not None:
+            ranges.append((float(np.max(np.abs(z))), float(np.max(np.abs(x)))))
+    return x
+
+
+def fixedForward(fixed_params, inputs):
+    # ===================================================================================
+    # function to run integer inputs through the fixed-point model exactly like the
+    # generated DenseFixed / AffineFixed kernels and activation helpers do.
+
+    # args:
+    #     fixed_params: fixed-point model from fixedPointLayers().
+    #     inputs: batch of flat inputs with fixed_params["input_frac"] fractional bits.
+
+    # returns:
+    #     the integer outputs for the batch and the number of saturated values.
+    # ===================================================================================
+    bits = fixed_params["bits"]
+    x = np.asarray(inputs, dtype=np.int64)
+    saturated = 0
+    for op in fixed_params["ops"]:
+        if op["kernel"] == "DenseFixed":
+            z, clipped = fixedSaturate(fixedShift(x @ op["weights"].T + op["biases"], op["shift"]), bits)
+            saturated += clipped
+        elif op["kernel"] == "AffineFixed":
+            z, clipped = fixedSaturate(fixedShift(x * op["weights"] + op["biases"], op["shift"]), bits)
+            saturated += clipped
+        else:
+            z = x
+        act = op["activation"]
+        if act == "relu":
+            x = np.maximum(z, 0)
+        elif act == "leakyrelu":
+            x = np.where(z < 0, fixedSaturate(fixedShift(z * op["alpha_q"], 15), bits)[0], z)
+        elif act == "tanh":
+            x = fixedSaturate(fixedShift(fixedTanhQ30(z, op["frac_pre"]), 30 - op["frac_out"]), bits)[0]
+        elif act == "sigmoid":
+            half = ((1 << 30) + fixedTanhQ30(z, op["frac_pre"] + 1)) >> 1
+            x = fixedSaturate(fixedShift(half, 30 - op["frac_out"]), bits)[0]
+        else:
+            x = z
+    return x, saturated
+
+
+def fixedPointLayers(layer_type, weights_list, biases_list, activation_functions, alphas, norm_layer_params,
+                     input_size, input_norms, input_mins, output_norms, output_mins, calibration, validation,
+                     word_bits, headroom=1.25):
+    # ===================================================================================
+    # function for the integer-only fixed-point version of a model. the calibration
+    # inputs are run through the float operations (fixedPointOps()) to find the range of
+    # every tensor, which sets its Q format (fracBits(), with some headroom for unseen
+    # inputs): the raw model input, the pre-activation sums and the outputs of each
+    # operation, while weights and scales get the finest format of their largest value.
+    # Dense / affine sums accumulate in int64 at the input + weight fractional bits, the
+    # biases are stored in that format, and the sums are rounded and saturated to the
+    # pre-activation format. relu and leakyrelu keep it, tanh and sigmoid map it to 1
+    # integer bit through a piecewise linear tanh (tanhKnots()). the normalization of the
+    # inputs and outputs is an integer affine map as well, so the generated model takes
+    # and returns integers only. the fixed-point model is simulated bit-exactly
+    # (fixedForward()) on the validation inputs to report its error against the double
+    # precision model.
+
+    # args:
+    #     layer_type, weights_list, biases_list, activation_functions, alphas,
+    #     norm_layer_params: layer lists after the fusion and simplification passes.
+    #     input_size: flat size of the model input.
+    #     input_norms, input_mins, output_norms, output_mins: normalization parameters or None.
+    #     calibration: batch of model inputs (normalized like the keras model takes them)
+    #                  for the range analysis (loadCalibration()).
+    #     validation: batch of model inputs for the error report.
+    #     word_bits: 16 or 32, the integer type of the values and weights.
+    #     headroom: margin of the activation formats over the calibrated ranges.
+
+    # returns:
+    #     the fixed-point model, a dict with "word", "bits", "input_frac", "output_frac",
+    #     "input_size" and the "ops" (each with its "kernel" ("DenseFixed", "AffineFixed"
+    #     or None), integer "weights" and int64 "biases", "shift", "frac_in", "frac_pre",
+    #     "frac_out", "activation", "alpha_q", "name" and "label"), and a report dict:
+    #     "layers", "max_abs_error" and "relative_error" (over the largest |output|)
+    #     against the double model and the number of "saturated" values.
+
+    # raises:
+    #     ValueError: for unsupported layers or tensors too large for the word size.
+    # ===================================================================================
+    word, bits = fixed_point_words[word_bits]
+    ops = fixedPointOps(layer_type, weights_list, biases_list, activation_functions, alphas, norm_layer_params,
+                        input_size, input_norms, input_mins, output_norms, output_mins)
+
+    def raw_inputs(inputs):
+        inputs = np.asarray(inputs, dtype=np.float64).reshape(len(inputs), -1)
+        if inputs.shape[1] != input_size:
+            raise ValueError(f"inputs of {inputs.shape[1]} values do not match the model input of {input_size}")
+        if input_norms is not None:
+            inputs = inputs * np.asarray(input_norms) + np.asarray(input_mins)
+        return inputs
+
+    def checked_frac(absmax, what):
+        frac = fracBits(absmax, bits, headroom)
+        if frac < 0:
+            raise ValueError(
+                f"{what} reaches {absmax:.3e}, which does not fit in {word} with an integer step, "
+                "use 32 bit words"
+            )
+        return frac
+
+    calibration = raw_inputs(calibration)
+    ranges = []
+    floatForward(ops, calibration, ranges)
+
+    input_frac = checked_frac(float(np.max(np.abs(calibration))), "the model input")
+    frac_in = input_frac
+    limit = (1 << bits) - 1
+    fixed_ops = []
+    for op, (pre_absmax, _) in zip(ops, ranges):
+        act = op["activation"]
+        fixed_op = {
+            "kernel": None, "name": op["name"], "label": op["label"], "activation": act,
+            "frac_in": frac_in, "shift": 0,
+            "alpha_q": int(round(op["alpha"] * 2**15)) if act == "leakyrelu" else 0,
+        }
+        if op["kind"] == "activation":
+            frac_pre = frac_in
+        else:
+            weights = op["weights"] if op["kind"] == "dense" else op["scale"]
+            biases = op["biases"] if op["kind"] == "dense" else op["shift"]
+            frac_w = fracBits(float(np.max(np.abs(weights))), bits)
+            # keep the biases (and so the sums) within the int64 accumulator
+            largest_bias = float(np.max(np.abs(biases))) if np.size(biases) else 0.0
+            if largest_bias > 0:
+                frac_w -= max(0, int(math.ceil(math.log2(largest_bias))) + frac_in + frac_w - 60)
+            frac_pre = checked_frac(pre_absmax, f"the {op['label']} sum")
+            quantized = np.clip(np.round(weights * 2.0**frac_w), -limit, limit).astype(np.int64)
+            fixed_op.update({
+                "kernel": "DenseFixed" if op["kind"] == "dense" else "AffineFixed",
+                # [output_size][input_size] rows for contiguous dot products
+                "weights": np.ascontiguousarray(quantized.T) if op["kind"] == "dense" else quantized,
+                "biases": np.round(np.asarray(biases) * 2.0 ** (frac_in + frac_w)).astype(np.int64),
+                "shift": frac_in + frac_w - frac_pre,
+            })
+        fixed_op["frac_pre"] = frac_pre
+        fixed_op["frac_out"] = bits - 1 if act in ["tanh", "sigmoid"] else frac_pre
+        frac_in = fixed_op["frac_out"]
+        fixed_ops.append(fixed_op)
+
+    fixed_params = {
+        "word": word,
+        "bits": bits,
+        "input_frac": input_frac,
+        "output_frac": frac_in,
+        "input_size": input_size,
+        "ops": fixed_ops,
+    }
+
+    validation = raw_inputs(validation)
+    reference = floatForward(ops, validation)
+    quantized_inputs, saturated = fixedSaturate(np.round(validation * 2.0**input_frac).astype(np.int64), bits)
+    outputs, clipped = fixedForward(fixed_params, quantized_inputs)
+    outputs = outputs / 2.0**frac_in
+    max_abs_error = float(np.max(np.abs(outputs - reference)))
+    largest = float(np.max(np.abs(reference)))
+    report = {
+        "layers": sum(op["kernel"] is not None or op["activation"] != "linear" for op in fixed_ops),
+        "max_abs_error": max_abs_error,
+        "relative_error": max_abs_error / largest if largest > 0 else max_abs_error,
+        "saturated": saturated + clipped,
+    }
+    return fixed_params, report
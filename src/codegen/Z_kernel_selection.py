@@ -0,0 +1,798 @@
+import numpy as np
+
+
+def layerParameterCount(weights, biases, conv_dict):
+    # ===================================================================================
+    # function to count the trainable parameters of a dense or convolutional layer.
+
+    # args:
+    #     weights: dense weight matrix or None.
+    #     biases: dense bias vector or None.
+    #     conv_dict: convolution layer parameters or None.
+
+    # returns:
+    #     number of weights plus biases of the layer, 0 for parameter-free layers.
+    # ===================================================================================
+    count = 0
+    for arr in (weights, biases):
+        if arr is not None:
+            count += int(np.size(arr))
+    if conv_dict is not None:
+        for key in ["weights", "biases", "depthwise_kernel", "depthwise_bias", "pointwise_kernel", "pointwise_bias"]:
+            if conv_dict.get(key) is not None:
+                count += int(np.size(conv_dict[key]))
+    return count
+
+
+def useConvGemm(conv_dict, tile_pixels=8):
+    # ===================================================================================
+    # function to decide between the direct and the im2col + gemm convolution kernels.
+    # the gemm kernels load every weight once per tile of tile_pixels outputs instead of
+    # once per output and pay one copy of the patch per tile_pixels * out_channels
+    # multiply-adds for the packing. this pays off once there are enough output channels
+    # to vectorize over and enough output pixels to fill a few tiles, tiny layers and
+    # layers with 1-3 output channels stay on the direct kernels.
+
+    # args:
+    #     conv_dict: Conv2D or Conv3D layer parameters from extractModel().
+    #     tile_pixels: output pixels per tile of the gemm kernels.
+
+    # returns:
+    #     True if the gemm kernel is expected to be faster than the direct kernel.
+    # ===================================================================================
+    out_shape = conv_dict.get("out_shape")
+    if out_shape is None:
+        return False
+    out_channels = int(out_shape[-1])
+    out_pixels = int(np.prod(out_shape[:-1]))
+    return out_channels >= 4 and out_pixels >= 2 * tile_pixels
+
+
+def isPointwise(conv_dict):
+    # ===================================================================================
+    # function to check if a Conv2D layer is a 1x1 stride 1 (pointwise) convolution. its
+    # channels-last inputs already are the im2col patches, so it is a plain
+    # [pixels, in_channels] x [in_channels, out_channels] gemm without any padding or
+    # kernel window bookkeeping, whatever the padding and dilation.
+
+    # args:
+    #     conv_dict: Conv2D layer parameters from extractModel().
+
+    # returns:
+    #     True if the layer is a pointwise convolution with weights.
+    # ===================================================================================
+    return (
+        conv_dict.get("weights") is not None
+        and tuple(np.atleast_1d(conv_dict.get("kernel_size", 0))) == (1, 1)
+        and tuple(np.atleast_1d(conv_dict.get("strides", 1))) in [(1,), (1, 1)]
+    )
+
+
+def useWinograd(conv_dict, tile_size, tile_batch=8):
+    # ===================================================================================
+    # function to check if a Conv2D layer should use the winograd kernels. they only exist
+    # for 3x3 kernels with stride 1 and no dilation, and only pay off when the layer has at
+    # least one full batch of output tiles for the per point gemms and enough input
+    # channels to amortize the input and output transforms.
+
+    # args:
+    #     conv_dict: Conv2D layer parameters from extractModel().
+    #     tile_size: output tile size of the winograd kernels (2 or 4).
+    #     tile_batch: output tiles multiplied together by the winograd kernels.
+
+    # returns:
+    #     True if the layer is a stride 1 3x3 convolution worth transforming.
+    # ===================================================================================
+    if (
+        conv_dict.get("weights") is None
+        or tuple(np.atleast_1d(conv_dict.get("kernel_size", 0))) != (3, 3)
+        or tuple(np.atleast_1d(conv_dict.get("strides", 1))) not in [(1,), (1, 1)]
+        or tuple(np.atleast_1d(conv_dict.get("dilation_rate", 1))) not in [(1,), (1, 1)]
+    ):
+        return False
+    out_height, out_width = conv_dict["out_shape"][:2]
+    tiles = -(-out_height // tile_size) * -(-out_width // tile_size)
+    return tiles >= tile_batch and conv_dict["in_shape"][-1] >= 8
+
+
+def fftSize(conv_dict):
+    # ===================================================================================
+    # function to choose the fft size of an overlap-save Conv1DFFT layer. every block of
+    # fft_size inputs costs in_channels forward and out_channels inverse ffts plus one
+    # complex multiply-add per bin, input and output channel, and gives
+    # fft_size - kernel_size + 1 outputs. the power of two with the fewest estimated flops
+    # for the whole output is used.
+
+    # args:
+    #     conv_dict: Conv1D layer parameters from extractModel().
+
+    # returns:
+    #     the fft size, a power of two larger than the kernel.
+    # ===================================================================================
+    kernel_size = conv_dict["kernel_size"][0]
+    out_length, out_channels = conv_dict["out_shape"]
+    in_channels = conv_dict["in_shape"][-1]
+
+    def cost(fft_size):
+        blocks = -(-out_length // (fft_size - kernel_size + 1))
+        ffts = (in_channels + out_channels) * 5 * fft_size * np.log2(fft_size)
+        products = 8 * (fft_size // 2 + 1) * in_channels * out_channels
+        return blocks * (ffts + products)
+
+    # from the smallest fft longer than the kernel to the one covering the whole output
+    smallest = int(np.ceil(np.log2(kernel_size + 1)))
+    largest = max(smallest, int(np.ceil(np.log2(out_length + kernel_size - 1))))
+    return min((2**e for e in range(smallest, largest + 1)), key=cost)
+
+
+def fuseConvLayers(layer_type, weights_list, activation_functions, alphas, batch_norm_params, conv_layer_params):
+    # ===================================================================================
+    # function to fuse Conv2D / SeparableConv2D / DepthwiseConv2D -> [BatchNormalization]
+    # -> [Activation] -> [pooling] chains. the batch normalization is folded into the
+    # conv weights and biases (w * gamma / sqrt(var + eps), (b - mean) * gamma /
+    # sqrt(var + eps) + beta) and the activation becomes the conv activation, without
+    # pooling the conv keeps its layer type (and kernel selection). Conv2D followed by
+    # valid, non-overlapping Max/AvgPooling2D becomes Conv2DFused, Conv2D and
+    # SeparableConv2D followed by GlobalMax/AvgPooling2D become Conv2DGlobalPool and
+    # SeparableConv2DGlobalPool, the pooling is recorded in the conv parameters as
+    # "pool_type", "pool_size", "pool_strides", "pool_shape" (and "pool_scale" for the
+    # global average, 1 when the 1 / (height * width) is folded into the weights of a
+    # directly following Dense layer), so the generated kernels only write the pooled
+    # outputs. the fused away layers are left as None entries, which codeGen() skips. an
+    # activation that is already applied by the conv cannot move past the batch
+    # normalization or another activation.
+
+    # args:
+    #     layer_type: list of layer types from extractModel().
+    #     weights_list: list of dense weights for each layer.
+    #     activation_functions: list of activation functions for each layer.
+    #     alphas: list of activation alphas for each layer.
+    #     batch_norm_params: list of normalization parameters for each layer.
+    #     conv_layer_params: list of convolution layer parameters for each layer.
+
+    # returns:
+    #     new lists of layer types, dense weights, activation functions, alphas,
+    #     normalization and convolution parameters with the chains fused.
+    # ===================================================================================
+    layer_type = list(layer_type)
+    weights_list = list(weights_list)
+    activation_functions = list(activation_functions)
+    alphas = list(alphas)
+    batch_norm_params = list(batch_norm_params)
+    conv_layer_params = list(conv_layer_params)
+
+    # weights and biases the batch normalization folds into, per conv layer type
+    folded_params = {
+        "Conv2D": ("weights", "biases"),
+        "SeparableConv2D": ("pointwise_kernel", "pointwise_bias"),
+        "DepthwiseConv2D": ("depthwise_kernel", "depthwise_bias"),
+    }
+
+    i = 0
+    while i < len(layer_type):
+        ltype = layer_type[i]
+        conv_dict = conv_layer_params[i]
+        if (
+            ltype not in folded_params
+            or conv_dict is None
+            or conv_dict.get(folded_params[ltype][0]) is None
+            or (conv_dict.get("groups") or 1) > 1
+        ):
+            i += 1
+            continue
+        out_channels = conv_dict["out_shape"][-1]
+        linear = activation_functions[i] in [None, "linear"]
+        j = i + 1
+
+        # batch normalization over the channels
+        bn = None
+        if (
+            linear
+            and j < len(layer_type)
+            and layer_type[j] == "BatchNormalization2D"
+            and batch_norm_params[j] is not None
+            and np.size(batch_norm_params[j][2]) == out_channels
+        ):
+            bn = j
+            j += 1
+
+        # activation layer
+        act = None
+        if (
+            linear
+            and j < len(layer_type)
+            and layer_type[j] == "Activation"
+            and activation_functions[j] not in [None, "linear", "softmax"]
+        ):
+            act = j
+            j += 1
+
+        # valid pooling whose windows do not overlap, or global pooling
+        pool = None
+        if j < len(layer_type) and ltype == "Conv2D" and layer_type[j] in ["MaxPooling2D", "AvgPooling2D"]:
+            pool_dict = conv_layer_params[j]
+            if (
+                pool_dict is not None
+                and pool_dict.get("padding", "valid").lower() == "valid"
+                and all(s >= p for s, p in zip(pool_dict["strides"], pool_dict["pool_size"]))
+            ):
+                pool = j
+                j += 1
+        elif (
+            j < len(layer_type)
+            and ltype in ["Conv2D", "SeparableConv2D"]
+            and layer_type[j] in ["GlobalMaxPooling2D", "GlobalAvgPooling2D"]
+        ):
+            pool = j
+            j += 1
+
+        if bn is None and act is None and pool is None:
+            i += 1
+            continue
+
+        fused = dict(conv_dict)
+        if bn is not None:
+            gamma, beta, mean, var, eps = batch_norm_params[bn]
+            scale = gamma / np.sqrt(var + eps)
+            kernel_key, bias_key = folded_params[ltype]
+            kernel = conv_dict[kernel_key]
+            bias = conv_dict[bias_key] if conv_dict.get(bias_key) is not None else np.zeros(out_channels)
+            # depthwise kernels are [height][width][in_channels][multiplier], the outputs are in_channels * multiplier
+            fused[kernel_key] = kernel * scale.reshape(kernel.shape[-2:] if ltype == "DepthwiseConv2D" else (-1,))
+            fused[bias_key] = (bias - mean) * scale + beta
+            layer_type[bn] = None
+            batch_norm_params[bn] = None
+        if act is not None:
+            activation_functions[i] = activation_functions[act]
+            alphas[i] = alphas[act]
+            layer_type[act] = None
+            activation_functions[act] = None
+        if pool is not None and layer_type[pool] in ["MaxPooling2D", "AvgPooling2D"]:
+            fused["pool_type"] = "max" if layer_type[pool] == "MaxPooling2D" else "avg"
+            fused["pool_size"] = tuple(conv_layer_params[pool]["pool_size"])
+            fused["pool_strides"] = tuple(conv_layer_params[pool]["strides"])
+            fused["pool_shape"] = tuple(conv_layer_params[pool]["output_shape"])
+            layer_type[i] = "Conv2DFused"
+        elif pool is not None:
+            height, width = conv_dict["out_shape"][:2]
+            fused["pool_type"] = "max" if layer_type[pool] == "GlobalMaxPooling2D" else "avg"
+            fused["pool_shape"] = (out_channels,)
+            fused["pool_scale"] = 1.0 / (height * width)
+            # a Dense layer right after the average can take the 1 / (height * width) in its weights
+            if (
+                fused["pool_type"] == "avg"
+                and j < len(layer_type)
+                and layer_type[j] == "Dense"
+                and weights_list[j] is not None
+            ):
+                weights_list[j] = weights_list[j] * fused["pool_scale"]
+                fused["pool_scale"] = 1.0
+            layer_type[i] = ltype + "GlobalPool"
+        if pool is not None:
+            layer_type[pool] = None
+            conv_layer_params[pool] = None
+            activation_functions[pool] = None
+        conv_layer_params[i] = fused
+        i = j
+
+    return layer_type, weights_list, activation_functions, alphas, batch_norm_params, conv_layer_params
+
+
+def isMonotone(activation, alpha):
+    # ===================================================================================
+    # function to check if an activation is non-decreasing, so it commutes with a max
+    # (max(f(x), f(y)) == f(max(x, y))).
+
+    # args:
+    #     activation: activation function name.
+    #     alpha: activation parameter (negative slope of the leaky relus, elu scale).
+
+    # returns:
+    #     True if the activation can be applied after a max pooling instead of before it.
+    # ===================================================================================
+    if activation in ["relu", "sigmoid", "tanh", "linear", "selu"]:
+        return True
+    if activation in ["leakyrelu", "prelu", "elu"]:
+        return alpha is not None and np.all(np.asarray(alpha) >= 0)
+    return False
+
+
+def simplifyLayers(layer_type, weights_list, biases_list, activation_functions, alphas, conv_layer_params,
+                   layer_shape, scalar_bytes):
+    # ===================================================================================
+    # function to rewrite the layer lists with algebraic identities that remove work
+    # without changing the model output (up to rounding):
+    #     - Dropout / SpatialDropout layers are the identity at inference and Flatten
+    #       layers a no-op on the flat buffers, both are removed.
+    #     - Reshape layers become "ReshapeAlias", a reference to the previous output
+    #       instead of a Reshape copy loop.
+    #     - a linear Dense layer followed by a Dense layer is merged into the second one
+    #       (W = W1 W2, b = b1 W2 + b2), if the merged matrix is not bigger than the two.
+    #     - a non-decreasing activation layer (isMonotone()) followed by a max pooling is
+    #       moved after the pooling, so it runs on the pooled elements only.
+    # removed layers are left as None entries like the fused away layers.
+
+    # args:
+    #     layer_type: list of layer types.
+    #     weights_list: list of dense weights for each layer.
+    #     biases_list: list of dense biases for each layer.
+    #     activation_functions: list of activation functions for each layer.
+    #     alphas: list of activation parameters for each layer.
+    #     conv_layer_params: list of convolution / pooling layer parameters for each layer.
+    #     layer_shape: list of layer shapes, layer_shape[i + 1] is the output of layer i.
+    #     scalar_bytes: size of the generated Scalar type, for the traffic estimate.
+
+    # returns:
+    #     new lists of layer types, dense weights and biases, activation functions, alphas,
+    #     convolution parameters and layer shapes, the number of layers removed and the
+    #     bytes of memory traffic per call saved (weights, layer outputs and copies).
+    # ===================================================================================
+    layer_type = list(layer_type)
+    weights_list = list(weights_list)
+    biases_list = list(biases_list)
+    activation_functions = list(activation_functions)
+    alphas = list(alphas)
+    conv_layer_params = list(conv_layer_params)
+    layer_shape = list(layer_shape)
+    removed_layers = 0
+    saved_elements = 0
+
+    def remove(i):
+        layer_type[i] = None
+        weights_list[i] = None
+        biases_list[i] = None
+        activation_functions[i] = None
+        conv_layer_params[i] = None
+
+    def next_layer(i):
+        j = i + 1
+        while j < len(layer_type) and layer_type[j] is None:
+            j += 1
+        return j if j < len(layer_type) else None
+
+    # identities and copies
+    for i, ltype in enumerate(layer_type):
+        if ltype in ["Dropout", "Flatten"]:
+            remove(i)
+            removed_layers += 1
+        elif ltype == "Reshape":
+            layer_type[i] = "ReshapeAlias"
+            removed_layers += 1
+            saved_elements += 2 * int(np.prod(layer_shape[i + 1]))
+
+    # linear dense chains
+    for i, ltype in enumerate(layer_type):
+        j = next_layer(i)
+        if (
+            ltype != "Dense"
+            or activation_functions[i] not in [None, "linear"]
+            or j is None
+            or layer_type[j] != "Dense"
+            or weights_list[i] is None
+            or weights_list[j] is None
+        ):
+            continue
+        (in_size, mid_size), out_size = weights_list[i].shape, weights_list[j].shape[1]
+        if in_size * out_size > in_size * mid_size + mid_size * out_size:
+            continue
+        w1, w2 = np.asarray(weights_list[i], dtype=np.float64), np.asarray(weights_list[j], dtype=np.float64)
+        b1 = np.zeros(mid_size) if biases_list[i] is None else np.asarray(biases_list[i], dtype=np.float64)
+        b2 = np.zeros(out_size) if biases_list[j] is None else np.asarray(biases_list[j], dtype=np.float64)
+        weights_list[j] = w1 @ w2
+        biases_list[j] = b1 @ w2 + b2
+        remove(i)
+        removed_layers += 1
+        # the smaller weights and the intermediate output written and read back
+        saved_elements += in_size * mid_size + mid_size * out_size - in_size * out_size + mid_size + 2 * mid_size
+
+    # monotone activations before max pooling
+    max_pools = ["MaxPooling1D", "MaxPooling2D", "MaxPooling3D", "GlobalMaxPooling1D", "GlobalMaxPooling2D",
+                 "GlobalMaxPooling3D"]
+    for i in range(len(layer_type)):
+        j = next_layer(i)
+        if (
+            layer_type[i] != "Activation"
+            or not isMonotone(activation_functions[i], alphas[i])
+            or j is None
+            or layer_type[j] not in max_pools
+            or conv_layer_params[j] is None
+        ):
+            continue
+        pool_dict = conv_layer_params[j]
+        in_elements = int(np.prod(pool_dict["in_shape"]))
+        if layer_type[j].startswith("Global"):
+            out_elements = int(pool_dict["in_shape"][-1])
+        else:
+            out_elements = int(np.prod(pool_dict["output_shape"]))
+        for values in (layer_type, weights_list, biases_list, activation_functions, alphas, conv_layer_params):
+            values[i], values[j] = values[j], values[i]
+        # both now output the pooled shape
+        layer_shape[i + 1] = layer_shape[j + 1]
+        # the activation reads and writes the pooled elements only
+        saved_elements += 2 * (in_elements - out_elements)
+
+    return (
+        layer_type,
+        weights_list,
+        biases_list,
+        activation_functions,
+        alphas,
+        conv_layer_params,
+        layer_shape,
+        removed_layers,
+        saved_elements * scalar_bytes,
+    )
+
+
+def sparseLayers(layer_type, weights_list, biases_list, conv_layer_params, threshold, block, scalar_bytes):
+    # ===================================================================================
+    # function to store the weights of the pruned Dense and ungrouped, undilated Conv2D
+    # layers as sparse rows for the "DenseSparse" / "Conv2DSparse" kernels. the weights are taken as rows of outputs
+    # ([input][output], the [kernel_height][kernel_width][in] patch rows of [out] for
+    # convolutions) cut into blocks of block consecutive outputs, and only the blocks with
+    # a nonzero weight are kept, if the zeros they skip are at least the threshold
+    # fraction of the weights: "starts" (where the blocks of every row start, one past
+    # the last row at the end), "columns" (the first output of every block / block) and
+    # "values" (the block weights, zero padded past the last output). block 1 is plain
+    # csr, blocks of 8 or 16 keep the kernels' updates vectorizable at the cost of the
+    # zeros inside the kept blocks.
+
+    # args:
+    #     layer_type: list of layer types after the fusion and simplification passes.
+    #     weights_list: list of dense weights for each layer.
+    #     biases_list: list of dense biases for each layer.
+    #     conv_layer_params: list of convolution layer parameters for each layer.
+    #     threshold: fraction of the weights the skipped blocks must cover for a layer to
+    #                be stored sparse.
+    #     block: number of consecutive outputs per stored block.
+    #     scalar_bytes: size of the generated Scalar type, for the weight footprint.
+
+    # returns:
+    #     the new list of layer types, the list of sparse weights for each layer ("starts",
+    #     "columns", "values", "block", "biases", None for the other layers) and a report
+    #     dict of the candidate layers by their index: "density" (fraction of nonzero
+    #     weights), "stored" (fraction of the weights in kept blocks, None where the dense
+    #     weights were kept), "mac_reduction" (dense / sparse multiply-adds, not a
+    #     measured speedup), "dense_bytes" / "sparse_bytes" and "fused" (pruned enough,
+    #     but kept dense because a pooling was fused into the convolution).
+    # ===================================================================================
+    layer_type = list(layer_type)
+    sparse_params = [None] * len(layer_type)
+    report = {}
+    for i, ltype in enumerate(layer_type):
+        if ltype == "Dense" and weights_list[i] is not None:
+            weights, biases = weights_list[i], biases_list[i]
+        elif (
+            ltype in ["Conv2D", "Conv2DFused", "Conv2DGlobalPool"]
+            and conv_layer_params[i] is not None
+            and conv_layer_params[i].get("weights") is not None
+            and (conv_layer_params[i].get("groups") or 1) == 1
+            and np.all(np.atleast_1d(conv_layer_params[i].get("dilation_rate") or 1) == 1)
+        ):
+            weights, biases = conv_layer_params[i]["weights"], conv_layer_params[i]["biases"]
+        else:
+            continue
+        weights = np.asarray(weights, dtype=np.float64)
+        out_channels = weights.shape[-1]
+        rows = weights.reshape(-1, out_channels)
+        density = float(np.count_nonzero(rows)) / rows.size
+        report[i + 1] = {"density": density, "stored": None, "mac_reduction": 1.0, "dense_bytes": rows.size * scalar_bytes,
+                         "sparse_bytes": rows.size * scalar_bytes, "fused": False}
+        padded = np.zeros((rows.shape[0], -(-out_channels // block) * block))
+        padded[:, :out_channels] = rows
+        blocks = padded.reshape(rows.shape[0], -1, block)
+        kept = np.any(blocks != 0, axis=2)
+        row_index, columns = np.nonzero(kept)
+        stored = len(columns) * block
+        if 1.0 - stored / rows.size < threshold or np.max(columns, initial=0) > np.iinfo(np.uint16).max:
+            continue
+        if ltype in ["Conv2DFused", "Conv2DGlobalPool"]:
+            # no sparse kernel folds a pooling, the fused convolutions keep their dense weights
+            report[i + 1]["fused"] = True
+            continue
+        layer_type[i] = "DenseSparse" if ltype == "Dense" else "Conv2DSparse"
+        sparse_params[i] = {
+            "starts": np.concatenate([[0], np.cumsum(np.sum(kept, axis=1))]).astype(np.int32),
+            "columns": columns.astype(np.uint16),
+            "values": blocks[row_index, columns].flatten(),
+            "block": block,
+            "biases": np.zeros(out_channels) if biases is None else np.asarray(biases, dtype=np.float64).flatten(),
+        }
+        report[i + 1].update(
+            stored=stored / rows.size,
+            mac_reduction=rows.size / max(stored, 1),
+            sparse_bytes=stored * scalar_bytes + len(columns) * 2 + (rows.shape[0] + 1) * 4,
+        )
+    return layer_type, sparse_params, report
+
+
+def reluInput(i, layer_type, activation_functions):
+    # ===================================================================================
+    # function to check if the input of layer i is the output of a relu, i.e. the previous
+    # layer that is not removed (None) or a reshape of its input has the relu activation,
+    # so a good share of the inputs is exactly zero.
+
+    # args:
+    #     i: index of the layer.
+    #     layer_type: list of layer types.
+    #     activation_functions: list of activation functions for each layer.
+
+    # returns:
+    #     True if the inputs of layer i are relu outputs.
+    # ===================================================================================
+    for j in range(i - 1, -1, -1):
+        if layer_type[j] in [None, "Reshape", "ReshapeAlias"]:
+            continue
+        return activation_functions[j] == "relu"
+    return False
+
+
+def selectKernels(layer_type, weights_list, biases_list, conv_layer_params, unroll_threshold=None, winograd_tile=None,
+                  fft_threshold=None, activation_functions=None, activation_sparse=False):
+    # ===================================================================================
+    # function to choose the kernel variant of each layer before the layer propagation
+    # functions and function calls are generated. the variant is encoded in the layer
+    # type (e.g. "Dense" -> "DenseUnrolled") so layer_propagation() only emits the
+    # kernels that are actually called. convolutions with groups > 1 always use the
+    # group-blocked gemm kernels (e.g. "Conv2DGrouped"), none of the other variants know
+    # about groups. transposed convolutions with a stride of 3 or more
+    # use the sub-pixel kernels: one dense stride-1 convolution per output phase, so the
+    # tap bookkeeping is done once per phase instead of once per output pixel. Conv2D and
+    # Conv3D layers that pass useConvGemm() use the im2col + gemm kernels, pointwise Conv2D
+    # layers (isPointwise()) the gemm without the im2col copies. with winograd_tile
+    # the Conv2D layers that pass useWinograd() use Conv2DWinograd, the tile size is recorded
+    # as "winograd_tile" in a copy of their convolution parameters for the weight transform in
+    # codeGen(), the dicts of extractModel() are left as extracted.
+    # stride 1 Conv1D layers with kernels of at least fft_threshold taps use Conv1DFFT, with
+    # the fftSize() recorded as "fft_size" in the copy. with activation_sparse the Dense layers behind a
+    # relu (reluInput()) use DenseActSparse, which skips the weight rows of the zero inputs.
+
+    # args:
+    #     layer_type: list of layer types from extractModel().
+    #     weights_list: list of dense weights for each layer.
+    #     biases_list: list of dense biases for each layer.
+    #     conv_layer_params: list of convolution layer parameters for each layer.
+    #     unroll_threshold: layers with fewer parameters than this get every dimension
+    #                       as a template constant so the compiler fully unrolls them,
+    #                       larger layers keep the runtime-bounded loops.
+    #     winograd_tile: output tile size of the winograd F(m x m, 3x3) kernels (2 or 4),
+    #                    None keeps the direct and gemm kernels.
+    #     fft_threshold: Conv1D kernel length from which the fft kernels are used, None
+    #                    keeps the direct kernels.
+    #     activation_functions: list of activation functions for each layer, needed for
+    #                           activation_sparse.
+    #     activation_sparse: use the activation sparse kernel for the Dense layers behind
+    #                        a relu.
+
+    # returns:
+    #     a new list of layer types with the selected kernel variants and a new list of
+    #     convolution layer parameters with the kernel parameters of the selected variants.
+    # ===================================================================================
+    selected = list(layer_type)
+    selected_params = list(conv_layer_params)
+
+    for i, (w, b, conv_dict, ltype) in enumerate(
+        zip(weights_list, biases_list, conv_layer_params, layer_type)
+    ):
+        count = layerParameterCount(w, b, conv_dict)
+
+        ## GROUPED CONVOLUTIONS ##
+        if ltype in ["Conv1D", "Conv2D", "Conv3D"] and (conv_dict.get("groups") or 1) > 1:
+            selected[i] = ltype + "Grouped"
+            continue
+
+        ## COMPILE TIME SPECIALIZATION OF SMALL LAYERS ##
+        if unroll_threshold is not None and count < unroll_threshold:
+            if ltype == "Dense":
+                selected[i] = "DenseUnrolled"
+            elif ltype == "Conv2D":
+                selected[i] = "Conv2DUnrolled"
+
+        ## SKIP THE ZERO INPUTS OF DENSE LAYERS BEHIND A RELU ##
+        if activation_sparse and selected[i] == "Dense" and reluInput(i, layer_type, activation_functions):
+            selected[i] = "DenseActSparse"
+
+        ## SUB-PIXEL DECOMPOSITION OF STRIDED TRANSPOSED CONVOLUTIONS ##
+        if ltype in ["Conv1DTranspose", "Conv2DTranspose", "Conv3DTranspose"]:
+            strides = np.atleast_1d(conv_dict.get("strides", 1))
+            if np.any(strides >= 3):
+                selected[i] = ltype + "SubPixel"
+
+        ## WINOGRAD FOR STRIDE 1 3X3 CONVOLUTIONS ##
+        if winograd_tile is not None and selected[i] == "Conv2D" and useWinograd(conv_dict, winograd_tile):
+            selected[i] = "Conv2DWinograd"
+            selected_params[i] = dict(conv_dict, winograd_tile=winograd_tile)
+
+        ## FFT FOR LONG CONV1D KERNELS ##
+        if (
+            fft_threshold is not None
+            and ltype == "Conv1D"
+            and conv_dict.get("weights") is not None
+            and conv_dict["kernel_size"][0] >= fft_threshold
+            and conv_dict["strides"][0] == 1
+            and np.all(np.atleast_1d(conv_dict.get("dilation_rate") or 1) == 1)
+        ):
+            selected[i] = "Conv1DFFT"
+            selected_params[i] = dict(conv_dict, fft_size=fftSize(conv_dict))
+
+        ## POINTWISE CONVOLUTIONS ARE GEMMS OVER THE INPUT PIXELS ##
+        if selected[i] == "Conv2D" and isPointwise(conv_dict):
+            selected[i] = "Conv2DPointwise"
+
+        ## IM2COL + GEMM FOR CONVOLUTIONS WITH ENOUGH OUTPUTS TO FILL THE TILES ##
+        if selected[i] in ["Conv2D", "Conv3D"] and useConvGemm(conv_dict):
+            selected[i] = ltype + "Gemm"
+
+    return selected, selected_params
+
+
+def tileRowMap(ltype, conv_dict, activation):
+    # ===================================================================================
+    # function to describe which input rows a layer reads for an output row, for the
+    # depth-first tiling of tileSchedule(). output row o of the layer reads the input
+    # rows o * stride - padding ... o * stride - padding + kernel - 1 (zeros outside the
+    # input), the columns and channels are untouched by the tiling.
+
+    # args:
+    #     ltype: selected layer type.
+    #     conv_dict: convolution or pooling layer parameters, None for the other layers.
+    #     activation: activation function of the layer.
+
+    # returns:
+    #     (kernel, stride, padding) rows, or None if the layer cannot run on row strips.
+    # ===================================================================================
+    if ltype in ["BatchNormalization2D", "Activation"]:
+        return None if activation in ["softmax"] else (1, 1, 0)
+    if conv_dict is None or activation == "softmax":
+        return None
+    if ltype in ["MaxPooling2D", "AvgPooling2D"]:
+        if conv_dict.get("padding", "valid").lower() != "valid":
+            return None
+        return conv_dict["pool_size"][0], conv_dict["strides"][0], 0
+    if ltype not in [
+        "Conv2D", "Conv2DGemm", "Conv2DPointwise", "Conv2DWinograd", "Conv2DGrouped", "Conv2DFused",
+        "DepthwiseConv2D", "SeparableConv2D",
+    ]:
+        return None
+    in_height = conv_dict["in_shape"][0]
+    out_height = conv_dict["out_shape"][0]
+    kernel = conv_dict.get("kernel_size", (3, 3))[0]
+    stride = conv_dict.get("strides", (1, 1))[0]
+    padding = 0
+    if conv_dict.get("padding", "valid").lower() == "same":
+        padding = max((out_height - 1) * stride + kernel - in_height, 0) // 2
+    if ltype == "Conv2DFused":
+        # a pooled row reads pool rows of conv outputs
+        pool_size, pool_stride = conv_dict["pool_size"][0], conv_dict["pool_strides"][0]
+        return (pool_size - 1) * stride + kernel, pool_stride * stride, padding
+    return kernel, stride, padding
+
+
+def tileSchedule(layer_type, activation_functions, conv_layer_params, cache_kib, scalar_bytes):
+    # ===================================================================================
+    # function to plan the depth-first tiled execution of runs of consecutive 2d layers
+    # (convolutions, valid pooling, 2d batch normalization and activations). instead of
+    # every layer sweeping the whole feature map, a run is executed in strips of rows of
+    # its last output: each strip computes the rows every layer of the run needs for it
+    # (halo rows at the strip borders are recomputed by the neighbouring strips) into
+    # two small ping-pong buffers, so the working set is proportional to the strip
+    # instead of the image. the strip height is the largest one whose biggest layer
+    # input + output strip fits in cache_kib, runs that fit whole are not tiled, and
+    # neither are runs whose strips would be so thin that recomputing the halo rows
+    # costs more than max_recompute of the untiled work.
+    # consecutive strips with the same shapes (all but the first and last few) are
+    # grouped so codeGen() emits them as one loop.
+
+    # args:
+    #     layer_type: list of selected layer types.
+    #     activation_functions: list of activation functions for each layer.
+    #     conv_layer_params: list of convolution layer parameters for each layer.
+    #     cache_kib: target cache size in KiB.
+    #     scalar_bytes: size of the generated Scalar type.
+
+    # returns:
+    #     a dict from the index of the first layer of every tiled run to its plan:
+    #     "layers" (indices), "shapes" ((in_shape, out_shape) per layer), "tile_rows",
+    #     "buffer_size" and "groups" of strips, each with "count", "in_row"/"in_step"
+    #     (first input row of the run and its step per strip), "out_row"/"out_step" (first
+    #     output row) and "rows" ((in_rows, out_rows, padding) per layer).
+    # ===================================================================================
+
+    def flush(run, shapes, row_maps):
+        # plan a finished run, if it has at least two layers and does not fit in cache
+        if len(run) < 2:
+            return
+        last_rows = shapes[-1][1][0]
+
+        def strips(tile_rows):
+            result = []
+            for out_begin in range(0, last_rows, tile_rows):
+                begin, end = out_begin, min(out_begin + tile_rows, last_rows)
+                rows = []
+                for (in_shape, _), (kernel, stride, padding) in zip(reversed(shapes), reversed(row_maps)):
+                    in_begin = max(0, begin * stride - padding)
+                    in_end = min(in_shape[0], (end - 1) * stride - padding + kernel)
+                    rows.append((in_begin, in_end, begin, end, padding + in_begin - begin * stride))
+                    begin, end = in_begin, in_end
+                result.append(rows[::-1])
+            return result
+
+        def working_set(plan):
+            return scalar_bytes * max(
+                (a_end - a) * shape_in[1] * shape_in[2] + (c_end - c) * shape_out[1] * shape_out[2]
+                for rows in plan
+                for (a, a_end, c, c_end, _), (shape_in, shape_out) in zip(rows, shapes)
+            )
+
+        tile_rows = 1
+        for candidate in range(1, last_rows + 1):
+            if working_set(strips(candidate)) > cache_kib * 1024:
+                break
+            tile_rows = candidate
+        if tile_rows >= last_rows:
+            return
+        plan = strips(tile_rows)
+
+        # each computed output row costs about its width * channels * kernel height
+        row_costs = [shape_out[1] * shape_out[2] * kernel for (_, shape_out), (kernel, _, _) in zip(shapes, row_maps)]
+        whole = sum(cost * shape_out[0] for cost, (_, shape_out) in zip(row_costs, shapes))
+        tiled = sum(cost * (c_end - c) for rows in plan for cost, (_, _, c, c_end, _) in zip(row_costs, rows))
+        if tiled > max_recompute * whole:
+            return
+
+        # group consecutive strips with equal shapes and constant row steps
+        groups = []
+        for rows in plan:
+            signature = [(a_end - a, c_end - c, pad) for a, a_end, c, c_end, pad in rows]
+            in_row, out_row = rows[0][0], rows[-1][2]
+            if groups and groups[-1]["rows"] == signature:
+                group = groups[-1]
+                in_step = in_row - group["in_row"] if group["count"] == 1 else group["in_step"]
+                out_step = out_row - group["out_row"] if group["count"] == 1 else group["out_step"]
+                if (in_row == group["in_row"] + group["count"] * in_step
+                        and out_row == group["out_row"] + group["count"] * out_step):
+                    group["in_step"], group["out_step"] = in_step, out_step
+                    group["count"] += 1
+                    continue
+            groups.append({"count": 1, "in_row": in_row, "in_step": 0, "out_row": out_row, "out_step": 0, "rows": signature})
+
+        buffer_size = max(
+            (c_end - c) * shape_out[1] * shape_out[2]
+            for rows in plan
+            for (_, _, c, c_end, _), (_, shape_out) in zip(rows[:-1], shapes[:-1])
+        )
+        plans[run[0]] = {
+            "layers": list(run),
+            "shapes": list(shapes),
+            "tile_rows": tile_rows,
+            "buffer_size": buffer_size,
+            "groups": groups,
+        }
+
+    max_recompute = 1.25
+    plans = {}
+    run, shapes, row_maps = [], [], []
+    for i, (ltype, conv_dict, activation) in enumerate(zip(layer_type, conv_layer_params, activation_functions)):
+        if ltype is None:
+            # fused away layers
+            continue
+        row_map = tileRowMap(ltype, conv_dict, activation)
+        if row_map is not None and conv_dict is not None:
+            in_shape = tuple(conv_dict["in_shape"])
+            in_shape = in_shape if len(in_shape) == 3 else (in_shape[0], in_shape[1], 1)
+            out_shape = tuple(conv_dict.get("pool_shape") or conv_dict.get("out_shape") or conv_dict["output_shape"])
+            if run and in_shape != shapes[-1][1]:
+                flush(run, shapes, row_maps)
+                run, shapes, row_maps = [], [], []
+        elif row_map is not None and run:
+            # elementwise layers keep the shape of the previous layer
+            in_shape = out_shape = shapes[-1][1]
+        else:
+            flush(run, shapes, row_maps)
+            run, shapes, row_maps = [], [], []
+            continue
+        run.append(i)
+        shapes.append((in_shape, out_shape))
+        row_maps.append(row_map)
+    flush(run, shapes, row_maps)
+    return plans
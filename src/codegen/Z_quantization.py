@@ -0,0 +1,978 @@
+import os
+import absl.logging
+import warnings
+import numpy as np
+
+absl.logging.set_verbosity("error")
+warnings.filterwarnings("ignore", category=UserWarning, module="keras")
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+import keras
+
+
+def loadCalibration(file_path, input_shape):
+    # ===================================================================================
+    # function to load the calibration inputs of a model from an .npy file, or the "x"
+    # (otherwise the first) array of an .npz file. the inputs are the ones the keras model
+    # takes, i.e. already normalized if the model has normalization parameters.
+
+    # args:
+    #     file_path: path of the .npy / .npz file.
+    #     input_shape: input shape of the model without the batch axis.
+
+    # returns:
+    #     float64 array of shape (samples,) + input_shape.
+
+    # raises:
+    #     ValueError: if the file type is not supported or the sizes do not match.
+    # ===================================================================================
+    if file_path.endswith(".npz"):
+        with np.load(file_path) as data:
+            key = "x" if "x" in data.files else data.files[0]
+            inputs = data[key]
+    elif file_path.endswith(".npy"):
+        inputs = np.load(file_path)
+    else:
+        raise ValueError(f"calibration data '{file_path}' must be an .npy or .npz file")
+    input_shape = tuple(input_shape)
+    input_size = int(np.prod(input_shape))
+    if inputs.size == 0 or inputs.size % input_size != 0:
+        raise ValueError(f"calibration data of {inputs.size} values does not split into inputs of shape {input_shape}")
+    return inputs.astype(np.float64).reshape((-1,) + input_shape)
+
+
+def checkInputs(file_path, input_shape, samples=64):
+    # ===================================================================================
+    # function for the inputs the error checks of the weight and activation rewrites run
+    # on: the calibration inputs if a file is given (loadCalibration()), otherwise a
+    # fixed batch of random normal inputs.
+
+    # args:
+    #     file_path: path of the .npy / .npz calibration file, or None.
+    #     input_shape: input shape of the model without the batch axis.
+    #     samples: number of random inputs without a calibration file.
+
+    # returns:
+    #     float64 array of shape (samples,) + input_shape.
+    # ===================================================================================
+    if file_path is not None:
+        return loadCalibration(file_path, input_shape)
+    return np.random.default_rng(0).standard_normal((samples,) + tuple(input_shape))
+
+
+def quantizableLayer(ltype, weights, conv_dict):
+    # ===================================================================================
+    # function to check if a layer has an int8 kernel: Dense layers and ungrouped,
+    # undilated Conv2D layers (after the batch normalization folding of fuseConvLayers()),
+    # also with a fused pooling. depthwise, separable, 1d / 3d and transposed convolutions
+    # keep their float kernels.
+
+    # args:
+    #     ltype: layer type after the fusion and simplification passes.
+    #     weights: dense weight matrix or None.
+    #     conv_dict: convolution layer parameters or None.
+
+    # returns:
+    #     True if the layer can be generated as "DenseInt8" / "Conv2DInt8" /
+    #     "Conv2DFusedInt8" / "Conv2DGlobalPoolInt8".
+    # ===================================================================================
+    if ltype == "Dense":
+        return weights is not None
+    if ltype in ["Conv2D", "Conv2DFused", "Conv2DGlobalPool"] and conv_dict is not None:
+        dilation = conv_dict.get("dilation_rate") or (1, 1)
+        return (
+            conv_dict.get("weights") is not None
+            and (conv_dict.get("groups") or 1) == 1
+            and all(d == 1 for d in np.atleast_1d(dilation))
+        )
+    return False
+
+
+def quantizeWeights(weights):
+    # ===================================================================================
+    # function to quantize weights symmetrically to int8 with one scale per output channel
+    # (the last axis), w ~= scale[c] * q[..., c] with q in [-127, 127].
+
+    # args:
+    #     weights: float weights, output channels last.
+
+    # returns:
+    #     the int8 weights and the float scales.
+    # ===================================================================================
+    weights = np.asarray(weights, dtype=np.float64)
+    absmax = np.max(np.abs(weights.reshape(-1, weights.shape[-1])), axis=0)
+    scales = np.where(absmax > 0, absmax / 127.0, 1.0)
+    quantized = np.clip(np.round(weights / scales), -127, 127).astype(np.int8)
+    return quantized, scales
+
+
+def quantizeInputs(inputs, scale):
+    # ===================================================================================
+    # function to round inputs to the int8 grid of a layer like QuantizeInt8() does.
+
+    # args:
+    #     inputs: float inputs.
+    #     scale: input scale of the layer.
+
+    # returns:
+    #     the int8 values as floats.
+    # ===================================================================================
+    return np.clip(np.round(inputs * (1.0 / scale)), -127, 127)
+
+
+def castModel(model, dtype):
+    # ===================================================================================
+    # function to copy a keras model with every layer computing in dtype, so
+    # referenceForward() resolves the errors of the double precision generated code.
+
+    # args:
+    #     model: keras model.
+    #     dtype: keras dtype name of the copy, e.g. "float64".
+
+    # returns:
+    #     the copied keras model with the weights of model.
+    # ===================================================================================
+    cast = keras.models.clone_model(
+        model, clone_function=lambda layer: layer.__class__.from_config({**layer.get_config(), "dtype": dtype})
+    )
+    cast.set_weights(model.get_weights())
+    return cast
+
+
+def referenceForward(model, layer_type, extracted_layer_type, weights_list, biases_list, conv_layer_params, inputs,
+                     quant_params=None, input_absmax=None, layer_inputs=None, activations=None):
+    # ===================================================================================
+    # function to run inputs through the rewritten layer lists with keras as the reference
+    # executor. the keras layers are called one by one, except the layers with an int8
+    # kernel (or that could have one) and the Conv2D layers with a fused pooling, which are
+    # computed from their fused / merged float weights, or from their int8 weights and
+    # inputs when quant_params are given, and the "DenseLowRank" layers, computed from the
+    # products of their factors. the layers folded into them (batch normalizations, linear
+    # Dense layers merged by simplifyLayers()) are skipped, the fused poolings run as keras
+    # layers after them, and a global average fused by fuseConvLayers() that
+    # left its 1 / (height * width) in the next Dense weights becomes a sum. every other
+    # layer runs as keras defines it, in the compute dtype of the keras layer (float64 for
+    # a model from castModel()). the activations of the layers in activations replace the
+    # keras ones.
+
+    # args:
+    #     model: keras model the layer lists were extracted from.
+    #     layer_type: list of layer types after the fusion and simplification passes.
+    #     extracted_layer_type: list of layer types from extractModel(), one per layer.
+    #     weights_list: list of dense weights for each layer.
+    #     biases_list: list of dense biases for each layer.
+    #     conv_layer_params: list of convolution layer parameters for each layer.
+    #     inputs: batch of model inputs.
+    #     quant_params: optional list of int8 parameters for each layer (quantizeLayers()).
+    #     input_absmax: optional dict, filled with the largest |input| of every quantizable
+    #                   layer by its index.
+    #     layer_inputs: optional dict, filled with the input batch of every layer that is
+    #                   not removed by its index.
+    #     activations: optional dict of the functions (pre-activations -> activations) that
+    #                  replace the activation of the keras layers by their index.
+
+    # returns:
+    #     the model outputs for the batch.
+    # ===================================================================================
+    layers = [layer for layer in model.layers if not isinstance(layer, keras.layers.InputLayer)]
+    if len(layers) != len(extracted_layer_type):
+        raise ValueError("the reference executor needs one extracted layer per keras layer")
+
+    x = np.asarray(inputs, dtype=np.float64)
+    after_quantizable = False
+    folded_average = False
+    for i, layer in enumerate(layers):
+        ltype = layer_type[i]
+        params = quant_params[i] if quant_params is not None else None
+        if layer_inputs is not None and ltype is not None:
+            layer_inputs[i] = x
+        if ltype is not None:
+            folded_average = (
+                ltype in ["Conv2DGlobalPool", "Conv2DGlobalPoolInt8", "SeparableConv2DGlobalPool"]
+                and conv_layer_params[i].get("pool_type") == "avg"
+                and conv_layer_params[i].get("pool_scale") == 1.0
+            )
+        if (
+            params is not None
+            or ltype == "DenseLowRank"
+            or quantizableLayer(ltype, weights_list[i], conv_layer_params[i])
+            or (ltype in ["Conv2DFused", "Conv2DGlobalPool"] and conv_layer_params[i].get("weights") is not None)
+        ):
+            if input_absmax is not None:
+                input_absmax[i] = max(input_absmax.get(i, 0.0), float(np.max(np.abs(x))))
+            if ltype in ["Dense", "DenseInt8", "DenseLowRank"]:
+                x = x.reshape(x.shape[0], -1)
+                weights, biases = weights_list[i], biases_list[i]
+            else:
+                weights, biases = conv_layer_params[i]["weights"], conv_layer_params[i]["biases"]
+            if params is not None:
+                x = quantizeInputs(x, params["input_scale"]) * params["input_scale"]
+                weights = np.moveaxis(params["weights"], 0, -1)
+                weights = weights.astype(np.float64) * params["scales"]
+                biases = params["biases"]
+            if biases is None:
+                biases = np.zeros(np.shape(weights)[-1])
+            if ltype in ["Dense", "DenseInt8", "DenseLowRank"]:
+                z = x @ weights + biases
+            else:
+                conv_dict = conv_layer_params[i]
+                z = keras.ops.convert_to_numpy(
+                    keras.ops.conv(
+                        x.astype(layer.compute_dtype),
+                        np.asarray(weights, dtype=layer.compute_dtype),
+                        strides=tuple(conv_dict["strides"]),
+                        padding=conv_dict["padding"].lower(),
+                        dilation_rate=tuple(np.atleast_1d(conv_dict.get("dilation_rate") or 1)),
+                    )
+                ).astype(np.float64) + biases
+            if activations is not None and i in activations:
+                x = activations[i](z)
+            else:
+                x = keras.ops.convert_to_numpy(layer.activation(z.astype(layer.compute_dtype))).astype(np.float64)
+            after_quantizable = True
+            continue
+        if ltype is None and extracted_layer_type[i] == "Dense":
+            # merged into the next Dense layer
+            continue
+        if ltype is None and after_quantizable and extracted_layer_type[i] in ["BatchNormalization", "BatchNormalization2D"]:
+            # folded into the weights of the layer before
+            continue
+        if ltype is None and folded_average and extracted_layer_type[i] in [
+            "GlobalAvgPooling1D", "GlobalAvgPooling2D", "GlobalAvgPooling3D"
+        ]:
+            # the next Dense weights hold the 1 / (height * width) of the average
+            x = np.sum(x, axis=tuple(range(1, x.ndim - 1)), keepdims=bool(getattr(layer, "keepdims", False)))
+            continue
+        if ltype is not None:
+            after_quantizable = False
+        if activations is not None and i in activations and (
+            extracted_layer_type[i] == "Activation" or hasattr(layer, "activation")
+        ):
+            if extracted_layer_type[i] == "Activation":
+                x = activations[i](x)
+                continue
+            # run the layer without its activation
+            activation, layer.activation = layer.activation, keras.activations.linear
+            try:
+                x = keras.ops.convert_to_numpy(layer(x.astype(layer.compute_dtype), training=False)).astype(np.float64)
+            finally:
+                layer.activation = activation
+            x = activations[i](x)
+            continue
+        x = keras.ops.convert_to_numpy(layer(x.astype(layer.compute_dtype), training=False)).astype(np.float64)
+    return x
+
+
+def quantizeLayers(model, layer_type, extracted_layer_type, weights_list, biases_list, activation_functions,
+                   conv_layer_params, calibration, scalar_bytes):
+    # ===================================================================================
+    # function for the post-training int8 quantization of the Dense and Conv2D layers
+    # (quantizableLayer()). the calibration inputs are run through the float model
+    # (referenceForward()) to find the largest |input| of every such layer, which sets its
+    # per-tensor input scale (absmax / 127). the weights get one scale per output channel
+    # (quantizeWeights()). the layers are relabelled "DenseInt8" / "Conv2DInt8" (and
+    # "Conv2DFusedInt8" / "Conv2DGlobalPoolInt8" with a fused pooling): they quantize
+    # their input on entry, accumulate int8 x int8 products in int32 and rescale the sums
+    # with input_scale * weight_scale[channel] before adding the float biases, applying
+    # the activation and pooling, so the layers in between stay in floating point. an
+    # int8 layer whose outputs go straight into the next one requantizes them to its
+    # input scale ("output_scale") and hands them on in int8, which rounds them exactly
+    # like the next layer would on entry. the quantized model is run on the calibration
+    # inputs as well to report the accuracy lost against the keras model.
+
+    # args:
+    #     model: keras model the layer lists were extracted from.
+    #     layer_type: list of layer types after the fusion and simplification passes.
+    #     extracted_layer_type: list of layer types from extractModel(), one per layer.
+    #     weights_list: list of dense weights for each layer.
+    #     biases_list: list of dense biases for each layer.
+    #     activation_functions: list of activation functions for each layer.
+    #     conv_layer_params: list of convolution layer parameters for each layer.
+    #     calibration: batch of representative model inputs (loadCalibration()).
+    #     scalar_bytes: size of the generated Scalar type, for the weight footprint.
+
+    # returns:
+    #     the new list of layer types, the list of int8 parameters for each layer
+    #     ("weights" with the output channels first, "scales", "biases", "input_scale",
+    #     "output_scale" or None for float outputs, None for float layers) and a
+    #     report dict: "layers", "requantized" (layers with int8 outputs),
+    #     "float_bytes" / "int8_bytes" of their weights,
+    #     "max_abs_error" and "relative_error" (over the largest |output|) against keras,
+    #     and "top1_agreement" for softmax outputs (None otherwise).
+    # ===================================================================================
+    input_absmax = {}
+    referenceForward(model, layer_type, extracted_layer_type, weights_list, biases_list, conv_layer_params,
+                     calibration, input_absmax=input_absmax)
+    # the factored layers of lowRankLayers() keep their float kernel
+    input_absmax = {
+        i: absmax
+        for i, absmax in input_absmax.items()
+        if quantizableLayer(layer_type[i], weights_list[i], conv_layer_params[i])
+    }
+
+    layer_type = list(layer_type)
+    quant_params = [None] * len(layer_type)
+    float_bytes = int8_bytes = 0
+    for i, absmax in input_absmax.items():
+        if layer_type[i] == "Dense":
+            weights, biases = weights_list[i], biases_list[i]
+            quantized, scales = quantizeWeights(weights)
+            # rows per output for contiguous dot products
+            quantized = np.ascontiguousarray(quantized.T)
+            layer_type[i] = "DenseInt8"
+        else:
+            weights, biases = conv_layer_params[i]["weights"], conv_layer_params[i]["biases"]
+            quantized, scales = quantizeWeights(weights)
+            # [out_channels][kernel_height][kernel_width][in_channels] rows
+            quantized = np.ascontiguousarray(np.moveaxis(quantized, -1, 0))
+            layer_type[i] = layer_type[i] + "Int8"
+        out_channels = np.shape(weights)[-1]
+        quant_params[i] = {
+            "weights": quantized,
+            "scales": scales,
+            "biases": np.zeros(out_channels) if biases is None else np.asarray(biases, dtype=np.float64).flatten(),
+            "input_scale": absmax / 127.0 if absmax > 0 else 1.0,
+            "output_scale": None,
+        }
+        float_bytes += np.size(weights) * scalar_bytes
+        int8_bytes += np.size(weights) + out_channels * scalar_bytes
+
+    # int8 layers straight before another one (the layers removed in between are folded or
+    # fused into them) pass their outputs in int8, unless a softmax runs on them
+    requantized = 0
+    for i in input_absmax:
+        following = [j for j in range(i + 1, len(layer_type)) if layer_type[j] is not None]
+        if following and quant_params[following[0]] is not None and activation_functions[i] != "softmax":
+            quant_params[i]["output_scale"] = quant_params[following[0]]["input_scale"]
+            requantized += 1
+
+    reference = np.asarray(model.predict(calibration.astype(np.float32), verbose=0), dtype=np.float64)
+    reference = reference.reshape(len(calibration), -1)
+    outputs = referenceForward(model, layer_type, extracted_layer_type, weights_list, biases_list, conv_layer_params,
+                               calibration, quant_params=quant_params).reshape(len(calibration), -1)
+    max_abs_error = float(np.max(np.abs(outputs - reference)))
+    largest = float(np.max(np.abs(reference)))
+    last = [act for ltype, act in zip(layer_type, activation_functions) if ltype is not None][-1]
+    report = {
+        "layers": len(input_absmax),
+        "requantized": requantized,
+        "float_bytes": int(float_bytes),
+        "int8_bytes": int(int8_bytes),
+        "max_abs_error": max_abs_error,
+        "relative_error": max_abs_error / largest if largest > 0 else max_abs_error,
+        "top1_agreement": (
+            float(np.mean(np.argmax(outputs, axis=1) == np.argmax(reference, axis=1))) if last == "softmax" else None
+        ),
+    }
+    return layer_type, quant_params, report
+
+
+def halfBits(weights, weight_storage):
+    # ===================================================================================
+    # function to round weights to IEEE binary16 ("fp16") or bfloat16 ("bf16"), to the
+    # nearest even, and return their bit patterns.
+
+    # args:
+    #     weights: float weights.
+    #     weight_storage: "fp16" or "bf16".
+
+    # returns:
+    #     uint16 array of the bit patterns, same shape as the weights.
+
+    # raises:
+    #     ValueError: if a weight is too large for binary16.
+    # ===================================================================================
+    weights = np.asarray(weights, dtype=np.float32)
+    if weight_storage == "fp16":
+        largest = float(np.max(np.abs(weights))) if weights.size else 0.0
+        if largest > 65504.0:
+            raise ValueError(f"weights up to {largest:.3e} overflow fp16 (max 65504), use bf16")
+        return weights.astype(np.float16).view(np.uint16)
+    bits = weights.view(np.uint32).astype(np.uint64)
+    bits = (bits + 0x7FFF + ((bits >> 16) & 1)) >> 16
+    return bits.astype(np.uint16)
+
+
+def halfValues(bits, weight_storage):
+    # ===================================================================================
+    # function to decode the bit patterns of halfBits() like HalfWeight() does.
+
+    # returns:
+    #     the float64 weights.
+    # ===================================================================================
+    bits = np.asarray(bits, dtype=np.uint16)
+    if weight_storage == "fp16":
+        return bits.view(np.float16).astype(np.float64)
+    return (bits.astype(np.uint32) << 16).view(np.float32).astype(np.float64)
+
+
+def halfPrecisionLayers(model, layer_type, extracted_layer_type, weights_list, biases_list, activation_functions,
+                        conv_layer_params, weight_storage, inputs, scalar_bytes):
+    # ===================================================================================
+    # function to store the weights of the Dense and Conv2D layers (quantizableLayer()) as
+    # 16 bit fp16 / bfloat16 bit patterns (halfBits()) that the "DenseHalf" / "Conv2DHalf"
+    # kernels widen to float as they load them, so the layers compute and keep their
+    # biases in Scalar while streaming half the weight bytes. the layers keep the layout
+    # of their float weights ([input][output] and [kernel_height][kernel_width][in][out]).
+    # the model with the decoded weights is run through referenceForward() on the inputs
+    # to report the accuracy lost against the keras model.
+
+    # args:
+    #     model: keras model the layer lists were extracted from.
+    #     layer_type: list of layer types after the fusion and simplification passes.
+    #     extracted_layer_type: list of layer types from extractModel(), one per layer.
+    #     weights_list: list of dense weights for each layer.
+    #     biases_list: list of dense biases for each layer.
+    #     activation_functions: list of activation functions for each layer.
+    #     conv_layer_params: list of convolution layer parameters for each layer.
+    #     weight_storage: "fp16" or "bf16".
+    #     inputs: batch of model inputs for the error check.
+    #     scalar_bytes: size of the generated Scalar type, for the weight footprint.
+
+    # returns:
+    #     the new list of layer types, the list of 16 bit parameters for each layer
+    #     ("weights" bit patterns, "biases", "format", None for the other layers) and a
+    #     report dict like quantizeLayers(): "layers", "float_bytes" / "half_bytes",
+    #     "max_abs_error", "relative_error", "top1_agreement" and "fused" (the layers
+    #     that kept their float weights because a pooling was fused into them).
+    # ===================================================================================
+    layer_type = list(layer_type)
+    half_params = [None] * len(layer_type)
+    decoded_weights = list(weights_list)
+    decoded_params = list(conv_layer_params)
+    float_bytes = half_bytes = 0
+    fused = []
+    for i, ltype in enumerate(layer_type):
+        if not quantizableLayer(ltype, weights_list[i], conv_layer_params[i]):
+            continue
+        if ltype not in ["Dense", "Conv2D"]:
+            # the fused poolings only have an int8 kernel
+            fused.append(i + 1)
+            continue
+        if ltype == "Dense":
+            weights, biases = weights_list[i], biases_list[i]
+            layer_type[i] = "DenseHalf"
+        else:
+            weights, biases = conv_layer_params[i]["weights"], conv_layer_params[i]["biases"]
+            layer_type[i] = "Conv2DHalf"
+        bits = halfBits(weights, weight_storage)
+        out_channels = np.shape(weights)[-1]
+        half_params[i] = {
+            "weights": bits,
+            "biases": np.zeros(out_channels) if biases is None else np.asarray(biases, dtype=np.float64).flatten(),
+            "format": weight_storage,
+        }
+        if ltype == "Dense":
+            decoded_weights[i] = halfValues(bits, weight_storage)
+        else:
+            decoded_params[i] = dict(conv_layer_params[i], weights=halfValues(bits, weight_storage))
+        float_bytes += np.size(weights) * scalar_bytes
+        half_bytes += np.size(weights) * 2
+
+    reference = np.asarray(model.predict(inputs.astype(np.float32), verbose=0), dtype=np.float64)
+    reference = reference.reshape(len(inputs), -1)
+    original_type = [
+        "Dense" if ltype == "DenseHalf" else "Conv2D" if ltype == "Conv2DHalf" else ltype for ltype in layer_type
+    ]
+    outputs = referenceForward(model, original_type, extracted_layer_type, decoded_weights, biases_list,
+                               decoded_params, inputs).reshape(len(inputs), -1)
+    max_abs_error = float(np.max(np.abs(outputs - reference)))
+    largest = float(np.max(np.abs(reference)))
+    last = [act for ltype, act in zip(layer_type, activation_functions) if ltype is not None][-1]
+    report = {
+        "layers": sum(params is not None for params in half_params),
+        "float_bytes": int(float_bytes),
+        "half_bytes": int(half_bytes),
+        "fused": fused,
+        "max_abs_error": max_abs_error,
+        "relative_error": max_abs_error / largest if largest > 0 else max_abs_error,
+        "top1_agreement": (
+            float(np.mean(np.argmax(outputs, axis=1) == np.argmax(reference, axis=1))) if last == "softmax" else None
+        ),
+    }
+    return layer_type, half_params, report
+
+
+def paletteCluster(weights, clusters, iterations=50):
+    # ===================================================================================
+    # function to cluster weights into a codebook of centroids with 1d k-means (lloyd
+    # iterations on the sorted weights, where every cluster is the run of weights between
+    # the midpoints of its neighboring centroids). it is started from evenly spaced
+    # centroids, which keep the rare large weights, and from the quantiles of the weights,
+    # which spend the centroids where the weights are dense, and the clustering with the
+    # smaller squared error is kept.
+
+    # args:
+    #     weights: float weights.
+    #     clusters: number of centroids, 16 or 256.
+    #     iterations: max number of lloyd iterations per start.
+
+    # returns:
+    #     the float64 codebook of length clusters (sorted, unused entries repeat the last
+    #     centroid) and the uint8 codebook indices of the weights, same shape as them.
+    # ===================================================================================
+    weights = np.asarray(weights, dtype=np.float64)
+    values = np.sort(weights.flatten())
+    unique = np.unique(values)
+    if len(unique) <= clusters:
+        codebook = np.concatenate([unique, np.full(clusters - len(unique), unique[-1])])
+        return codebook, np.searchsorted(unique, weights).astype(np.uint8)
+
+    def lloyd(centroids):
+        for _ in range(iterations):
+            assignment = np.searchsorted((centroids[1:] + centroids[:-1]) / 2, values)
+            counts = np.bincount(assignment, minlength=clusters)
+            sums = np.bincount(assignment, weights=values, minlength=clusters)
+            # empty clusters keep their centroid
+            updated = np.where(counts > 0, sums / np.maximum(counts, 1), centroids)
+            updated.sort()
+            if np.allclose(updated, centroids, rtol=0.0, atol=1e-12 * (values[-1] - values[0])):
+                break
+            centroids = updated
+        assignment = np.searchsorted((centroids[1:] + centroids[:-1]) / 2, values)
+        return centroids, float(np.sum((values - centroids[assignment]) ** 2))
+
+    starts = [
+        np.linspace(values[0], values[-1], clusters),
+        np.quantile(values, (np.arange(clusters) + 0.5) / clusters),
+    ]
+    codebook, _ = min((lloyd(start) for start in starts), key=lambda result: result[1])
+    indices = np.searchsorted((codebook[1:] + codebook[:-1]) / 2, weights)
+    return codebook, indices.astype(np.uint8)
+
+
+def palettePack(indices, clusters):
+    # ===================================================================================
+    # function to store codebook indices in the layout PaletteIndex() reads: one byte per
+    # index for 256 centroids, two per byte for 16 (the even indices of the flattened
+    # weights in the low nibbles).
+
+    # returns:
+    #     the flat uint8 array.
+    # ===================================================================================
+    flat = np.asarray(indices, dtype=np.uint8).flatten()
+    if clusters == 256:
+        return flat
+    if len(flat) % 2:
+        flat = np.append(flat, np.uint8(0))
+    return (flat[0::2] | (flat[1::2] << 4)).astype(np.uint8)
+
+
+def palettizeLayers(model, layer_type, extracted_layer_type, weights_list, biases_list, activation_functions,
+                    conv_layer_params, clusters, tolerance, inputs, scalar_bytes):
+    # ===================================================================================
+    # function to palettize the weights of the Dense and Conv2D layers (quantizableLayer()):
+    # every layer's weights are clustered into 16 or 256 centroids (paletteCluster()) and
+    # stored as a Scalar codebook with 4 or 8 bit indices (palettePack()) that the
+    # "DensePalette" / "Conv2DPalette" kernels look up as they load them. the indices keep
+    # the layout of the float weights ([input][output] and [kernel_height][kernel_width]
+    # [in][out]). with clusters "auto" the layers are palettized in order with 16 centroids
+    # if the model outputs stay within tolerance of the keras model on the inputs, else
+    # with 256, else they keep their float weights. layers too small for the codebook to
+    # pay off keep their float weights as well. the model with the decoded weights is run
+    # through referenceForward() to report the accuracy lost.
+
+    # args:
+    #     model: keras model the layer lists were extracted from.
+    #     layer_type: list of layer types after the fusion and simplification passes.
+    #     extracted_layer_type: list of layer types from extractModel(), one per layer.
+    #     weights_list: list of dense weights for each layer.
+    #     biases_list: list of dense biases for each layer.
+    #     activation_functions: list of activation functions for each layer.
+    #     conv_layer_params: list of convolution layer parameters for each layer.
+    #     clusters: 16, 256 or "auto".
+    #     tolerance: max |output error| of "auto", unused otherwise.
+    #     inputs: batch of model inputs for the error check.
+    #     scalar_bytes: size of the generated Scalar type, for the weight footprint.
+
+    # returns:
+    #     the new list of layer types, the list of palette parameters for each layer
+    #     ("indices", "codebook", "clusters", "biases", None for the other layers) and a
+    #     report dict like quantizeLayers(): "layers", "float_bytes" / "palette_bytes",
+    #     "max_abs_error", "relative_error", "top1_agreement", "clusters" (the number of
+    #     centroids of every candidate layer, None where the float weights were kept) and
+    #     "fused" (the layers that kept their float weights because a pooling was fused
+    #     into them).
+    # ===================================================================================
+    layer_type = list(layer_type)
+    palette_params = [None] * len(layer_type)
+    decoded_weights = list(weights_list)
+    decoded_params = list(conv_layer_params)
+    candidates = [16, 256] if clusters == "auto" else [clusters]
+    reference = np.asarray(model.predict(inputs.astype(np.float32), verbose=0), dtype=np.float64)
+    reference = reference.reshape(len(inputs), -1)
+
+    def forward(weights, params):
+        original_type = [
+            "Dense" if ltype == "DensePalette" else "Conv2D" if ltype == "Conv2DPalette" else ltype
+            for ltype in layer_type
+        ]
+        return referenceForward(model, original_type, extracted_layer_type, weights, biases_list, params,
+                                inputs).reshape(len(inputs), -1)
+
+    float_bytes = palette_bytes = 0
+    chosen = {}
+    fused = []
+    for i, ltype in enumerate(layer_type):
+        if not quantizableLayer(ltype, weights_list[i], conv_layer_params[i]):
+            continue
+        if ltype not in ["Dense", "Conv2D"]:
+            # the fused poolings only have an int8 kernel
+            fused.append(i + 1)
+            continue
+        if ltype == "Dense":
+            weights, biases = weights_list[i], biases_list[i]
+        else:
+            weights, biases = conv_layer_params[i]["weights"], conv_layer_params[i]["biases"]
+        chosen[i + 1] = None
+        for k in candidates:
+            index_bytes = np.size(weights) if k == 256 else (np.size(weights) + 1) // 2
+            if index_bytes + k * scalar_bytes >= np.size(weights) * scalar_bytes:
+                # the codebook outweighs the smaller indices
+                continue
+            codebook, indices = paletteCluster(weights, k)
+            trial_weights, trial_params = list(decoded_weights), list(decoded_params)
+            if ltype == "Dense":
+                trial_weights[i] = codebook[indices]
+            else:
+                trial_params[i] = dict(conv_layer_params[i], weights=codebook[indices])
+            if clusters == "auto" and np.max(np.abs(forward(trial_weights, trial_params) - reference)) > tolerance:
+                continue
+            decoded_weights, decoded_params = trial_weights, trial_params
+            layer_type[i] = "DensePalette" if ltype == "Dense" else "Conv2DPalette"
+            packed = palettePack(indices, k)
+            out_channels = np.shape(weights)[-1]
+            palette_params[i] = {
+                "indices": packed,
+                "codebook": codebook,
+                "clusters": k,
+                "biases": np.zeros(out_channels) if biases is None else np.asarray(biases, dtype=np.float64).flatten(),
+            }
+            chosen[i + 1] = k
+            float_bytes += np.size(weights) * scalar_bytes
+            palette_bytes += packed.size + k * scalar_bytes
+            break
+
+    outputs = forward(decoded_weights, decoded_params)
+    max_abs_error = float(np.max(np.abs(outputs - reference)))
+    largest = float(np.max(np.abs(reference)))
+    last = [act for ltype, act in zip(layer_type, activation_functions) if ltype is not None][-1]
+    report = {
+        "layers": sum(params is not None for params in palette_params),
+        "float_bytes": int(float_bytes),
+        "palette_bytes": int(palette_bytes),
+        "fused": fused,
+        "max_abs_error": max_abs_error,
+        "relative_error": max_abs_error / largest if largest > 0 else max_abs_error,
+        "top1_agreement": (
+            float(np.mean(np.argmax(outputs, axis=1) == np.argmax(reference, axis=1))) if last == "softmax" else None
+        ),
+        "clusters": chosen,
+    }
+    return layer_type, palette_params, report
+
+
+def lowRankLayers(model, layer_type, extracted_layer_type, weights_list, biases_list, activation_functions,
+                  conv_layer_params, tolerance, inputs):
+    # ===================================================================================
+    # function to factor the weights of the Dense layers with a truncated svd, W ~= L @ R
+    # with L = U sqrt(S) [input][rank] and R = sqrt(S) V^T [rank][output], which the
+    # "DenseLowRank" kernel computes as two thin products. the layers are factored in
+    # order with the smallest rank (bisected) that keeps the model outputs within tolerance
+    # of the keras model on the inputs, run through referenceForward() with the factored
+    # weights, and only if that rank saves multiply-adds (rank * (input + output) <
+    # input * output), else they keep their weights.
+
+    # args:
+    #     model: keras model the layer lists were extracted from.
+    #     layer_type: list of layer types after the fusion and simplification passes.
+    #     extracted_layer_type: list of layer types from extractModel(), one per layer.
+    #     weights_list: list of dense weights for each layer.
+    #     biases_list: list of dense biases for each layer.
+    #     activation_functions: list of activation functions for each layer.
+    #     conv_layer_params: list of convolution layer parameters for each layer.
+    #     tolerance: max |output - keras output| on the inputs.
+    #     inputs: batch of model inputs for the error check.
+
+    # returns:
+    #     the new list of layer types, the list of weights with the products of the factors
+    #     (for the error checks of the later passes), the list of factors for each layer
+    #     ("left", "right", "rank", "biases", None for the other layers) and a report dict:
+    #     "layers", "ranks"
+    #     (rank, input and output size of every Dense layer by its index, rank None where
+    #     the weights were kept), "dense_macs" / "low_rank_macs" of the factored layers,
+    #     "max_abs_error", "relative_error" and "top1_agreement".
+    # ===================================================================================
+    layer_type = list(layer_type)
+    low_rank_params = [None] * len(layer_type)
+    factored_weights = list(weights_list)
+    reference = np.asarray(model.predict(inputs.astype(np.float32), verbose=0), dtype=np.float64)
+    reference = reference.reshape(len(inputs), -1)
+
+    def forward(weights):
+        original_type = ["Dense" if ltype == "DenseLowRank" else ltype for ltype in layer_type]
+        return referenceForward(model, original_type, extracted_layer_type, weights, biases_list, conv_layer_params,
+                                inputs).reshape(len(inputs), -1)
+
+    ranks = {}
+    dense_macs = low_rank_macs = 0
+    for i, ltype in enumerate(layer_type):
+        if ltype != "Dense" or weights_list[i] is None:
+            continue
+        weights = np.asarray(weights_list[i], dtype=np.float64)
+        input_size, output_size = weights.shape
+        ranks[i + 1] = (None, input_size, output_size)
+        # the largest rank that saves multiply-adds
+        max_rank = (input_size * output_size - 1) // (input_size + output_size)
+        if max_rank < 1:
+            continue
+        u, s, vt = np.linalg.svd(weights, full_matrices=False)
+        root = np.sqrt(s[:max_rank])
+        left, right = u[:, :max_rank] * root, root[:, None] * vt[:max_rank]
+
+        def error(rank):
+            trial = list(factored_weights)
+            trial[i] = left[:, :rank] @ right[:rank]
+            return float(np.max(np.abs(forward(trial) - reference)))
+
+        if error(max_rank) > tolerance:
+            continue
+        low, high = 0, max_rank
+        while high - low > 1:
+            middle = (low + high) // 2
+            if error(middle) <= tolerance:
+                high = middle
+            else:
+                low = middle
+        factored_weights[i] = left[:, :high] @ right[:high]
+        layer_type[i] = "DenseLowRank"
+        low_rank_params[i] = {
+            "left": left[:, :high],
+            "right": right[:high],
+            "rank": high,
+            "biases": (
+                np.zeros(output_size) if biases_list[i] is None else np.asarray(biases_list[i], dtype=np.float64).flatten()
+            ),
+        }
+        ranks[i + 1] = (high, input_size, output_size)
+        dense_macs += input_size * output_size
+        low_rank_macs += high * (input_size + output_size)
+
+    outputs = forward(factored_weights)
+    max_abs_error = float(np.max(np.abs(outputs - reference)))
+    largest = float(np.max(np.abs(reference)))
+    last = [act for ltype, act in zip(layer_type, activation_functions) if ltype is not None][-1]
+    report = {
+        "layers": sum(params is not None for params in low_rank_params),
+        "ranks": ranks,
+        "dense_macs": int(dense_macs),
+        "low_rank_macs": int(low_rank_macs),
+        "max_abs_error": max_abs_error,
+        "relative_error": max_abs_error / largest if largest > 0 else max_abs_error,
+        "top1_agreement": (
+            float(np.mean(np.argmax(outputs, axis=1) == np.argmax(reference, axis=1))) if last == "softmax" else None
+        ),
+    }
+    return layer_type, factored_weights, low_rank_params, report
+
+
+def removeDeadUnits(model, layer_type, extracted_layer_type, weights_list, biases_list, activation_functions,
+                    conv_layer_params, layer_shape, calibration, validation, tolerance):
+    # ===================================================================================
+    # function to remove the dead units of Dense layers and channels of Conv2D layers (also
+    # with a fused pooling, "Conv2DFused" / "Conv2DGlobalPool") that feed a Dense or Conv2D
+    # layer directly (only removed layers, e.g. dropouts, flattens or folded batch
+    # normalizations, in between). a unit is dead if its outgoing weights are all zero or
+    # its output is the same on every calibration input, which is proven when its incoming
+    # weights are all zero and is found by running the calibration inputs through
+    # referenceForward() otherwise (e.g. a relu unit that never activates). the unit is
+    # deleted from the weights and biases of its layer and from the input rows of the next,
+    # with its constant output folded into the biases of the next layer (for channels only
+    # if it is zero or the next layer has no padding to keep it from), so the buffer between
+    # them shrinks. the layers are done one at a time, and if the outputs on the validation
+    # inputs move by more than tolerance, the units found on the calibration
+    # inputs are tried one at a time and only kept removed while the outputs stay within
+    # it (the proven ones stay removed). softmax layers keep their units.
+
+    # args:
+    #     model: keras model the layer lists were extracted from.
+    #     layer_type: list of layer types after the fusion and simplification passes.
+    #     extracted_layer_type: list of layer types from extractModel(), one per layer.
+    #     weights_list: list of dense weights for each layer.
+    #     biases_list: list of dense biases for each layer.
+    #     activation_functions: list of activation functions for each layer.
+    #     conv_layer_params: list of convolution layer parameters for each layer.
+    #     layer_shape: list of layer shapes.
+    #     calibration: batch of model inputs the dead units are found on.
+    #     validation: batch of model inputs the deviation is checked and reported on, not
+    #                 the calibration inputs (the deviation on them is zero by construction).
+    #     tolerance: max change of the outputs on the validation inputs.
+
+    # returns:
+    #     the new weights_list, biases_list, conv_layer_params and layer_shape, and a report
+    #     dict: "removed" (removed and total units of every layer with dead units by its
+    #     index), "proven" (units removed from the weights alone), "reverted" (units found
+    #     on the calibration inputs and kept for the tolerance), "max_abs_error" and
+    #     "relative_error" of the outputs against keras on the validation inputs.
+    # ===================================================================================
+    weights_list, biases_list = list(weights_list), list(biases_list)
+    conv_layer_params, layer_shape = list(conv_layer_params), list(layer_shape)
+    layer_inputs = {}
+    referenceForward(model, layer_type, extracted_layer_type, weights_list, biases_list, conv_layer_params,
+                     calibration, layer_inputs=layer_inputs)
+    reference = np.asarray(model.predict(validation.astype(np.float32), verbose=0), dtype=np.float64)
+    reference = reference.reshape(len(validation), -1)
+
+    def outputs():
+        # outputs on the validation inputs with the units removed so far
+        return referenceForward(model, layer_type, extracted_layer_type, weights_list, biases_list,
+                                conv_layer_params, validation).reshape(len(validation), -1)
+
+    # the tolerance is on the change of the outputs, not on the float32 rounding of keras
+    baseline = outputs()
+
+    def deviation():
+        return float(np.max(np.abs(outputs() - baseline)))
+
+    conv_types = ["Conv2D", "Conv2DFused", "Conv2DGlobalPool"]
+
+    def unitWeights(i):
+        # incoming weights [..., units] and biases of a producer layer
+        if layer_type[i] == "Dense":
+            return weights_list[i], biases_list[i]
+        return conv_layer_params[i]["weights"], conv_layer_params[i]["biases"]
+
+    def outputShape(i):
+        # shape of the stored outputs of a producer layer
+        conv_dict = conv_layer_params[i]
+        return tuple(conv_dict.get("pool_shape", conv_dict["out_shape"]))
+
+    removed, proven, reverted = {}, 0, 0
+    active = [i for i, ltype in enumerate(layer_type) if ltype is not None]
+    for producer, consumer in zip(active, active[1:]):
+        ptype, ctype = layer_type[producer], layer_type[consumer]
+        if ptype not in ["Dense"] + conv_types or ctype not in ["Dense"] + conv_types or consumer not in layer_inputs:
+            continue
+        if activation_functions[producer] == "softmax" or (ptype == "Dense" and ctype in conv_types):
+            continue
+        weights, biases = unitWeights(producer)
+        consumer_weights = weights_list[consumer] if ctype == "Dense" else conv_layer_params[consumer]["weights"]
+        if weights is None or consumer_weights is None:
+            continue
+        if ptype in conv_types and (conv_layer_params[producer].get("groups") or 1) > 1:
+            continue
+        if ctype in conv_types and (conv_layer_params[consumer].get("groups") or 1) > 1:
+            continue
+        between = extracted_layer_type[producer + 1:consumer]
+        if any(ltype not in ["Dropout", "Flatten", "BatchNormalization", "BatchNormalization2D", "Activation",
+                             "MaxPooling2D", "AvgPooling2D", "GlobalMaxPooling2D", "GlobalAvgPooling2D"]
+               for ltype in between):
+            continue
+        weights = np.asarray(weights, dtype=np.float64)
+        consumer_weights = np.asarray(consumer_weights, dtype=np.float64)
+        units = weights.shape[-1]
+        values = layer_inputs[consumer]
+        if ptype in conv_types:
+            out_shape = outputShape(producer)
+            if values[0].size != np.prod(out_shape):
+                continue
+            values = values.reshape(-1, units)
+        elif values.shape[-1] != units:
+            continue
+
+        # outgoing weights [units][rows per unit][outputs] of the consumer
+        if ctype == "Dense":
+            outgoing = consumer_weights.reshape(-1, units, consumer_weights.shape[-1]).transpose(1, 0, 2)
+        else:
+            if consumer_weights.shape[2] != units:
+                continue
+            outgoing = np.moveaxis(consumer_weights, 2, 0).reshape(units, -1, consumer_weights.shape[-1])
+
+        constant = np.max(values, axis=0) == np.min(values, axis=0)
+        silent = ~np.any(outgoing != 0, axis=(1, 2))
+        incoming_zero = ~np.any(weights.reshape(-1, units) != 0, axis=0)
+        if ctype in conv_types and conv_layer_params[consumer].get("padding", "valid").lower() != "valid":
+            # a nonzero constant channel is not constant over the zero padding
+            constant &= values[0] == 0
+        found = silent | constant
+        exact = silent | (incoming_zero & constant)
+        if not np.any(found) or np.all(found):
+            continue
+        saved = (weights_list[producer], biases_list[producer], conv_layer_params[producer],
+                 weights_list[consumer], biases_list[consumer], conv_layer_params[consumer],
+                 layer_shape[producer + 1] if producer + 1 < len(layer_shape) else None)
+
+        def removeUnits(dead):
+            # remove the dead units from the layers as they were before, with their constant
+            # outputs folded into the consumer biases
+            (weights_list[producer], biases_list[producer], conv_layer_params[producer],
+             weights_list[consumer], biases_list[consumer], conv_layer_params[consumer]) = saved[:6]
+            if saved[6] is not None:
+                layer_shape[producer + 1] = saved[6]
+            if not np.any(dead):
+                return
+            keep = ~dead
+            fold = np.einsum("u,uro->o", np.where(constant & ~silent & dead, values[0], 0.0), outgoing)
+            consumer_biases = saved[4] if ctype == "Dense" else saved[5]["biases"]
+            consumer_biases = (np.zeros(outgoing.shape[-1]) if consumer_biases is None
+                               else np.asarray(consumer_biases, dtype=np.float64)) + fold
+            if ctype == "Dense":
+                rows = consumer_weights.reshape(-1, units, consumer_weights.shape[-1])[:, keep]
+                weights_list[consumer] = rows.reshape(-1, consumer_weights.shape[-1])
+                biases_list[consumer] = consumer_biases
+            else:
+                conv_layer_params[consumer] = dict(
+                    saved[5],
+                    weights=consumer_weights[:, :, keep],
+                    biases=consumer_biases,
+                    in_shape=tuple(saved[5]["in_shape"][:2]) + (int(np.sum(keep)),),
+                )
+
+            if ptype == "Dense":
+                weights_list[producer] = weights[:, keep]
+                biases_list[producer] = None if biases is None else np.asarray(biases)[keep]
+                new_shape, old_shape = int(np.sum(keep)), units
+            else:
+                conv_dict = dict(
+                    saved[2],
+                    weights=weights[..., keep],
+                    biases=None if biases is None else np.asarray(biases)[keep],
+                    filters=int(np.sum(keep)),
+                    out_shape=tuple(saved[2]["out_shape"][:2]) + (int(np.sum(keep)),),
+                )
+                if "pool_shape" in conv_dict:
+                    conv_dict["pool_shape"] = out_shape[:-1] + (int(np.sum(keep)),)
+                conv_layer_params[producer] = conv_dict
+                new_shape, old_shape = out_shape[:-1] + (int(np.sum(keep)),), out_shape
+            if saved[6] == old_shape:
+                layer_shape[producer + 1] = new_shape
+            elif saved[6] == (old_shape,):
+                layer_shape[producer + 1] = (new_shape,)
+
+        dead = found
+        removeUnits(dead)
+        if not np.array_equal(found, exact) and deviation() > tolerance:
+            # the proven units, and the ones found on the calibration inputs one at a time
+            # while the outputs stay within tolerance
+            dead = exact
+            for unit in np.flatnonzero(found & ~exact):
+                trial = dead.copy()
+                trial[unit] = True
+                removeUnits(trial)
+                if deviation() <= tolerance:
+                    dead = trial
+            removeUnits(dead)
+            reverted += int(np.sum(found & ~dead))
+        if np.any(dead):
+            removed[producer + 1] = (int(np.sum(dead)), units)
+            proven += int(np.sum(exact))
+
+    max_abs_error = float(np.max(np.abs(outputs() - reference)))
+    largest = float(np.max(np.abs(reference)))
+    report = {
+        "removed": removed,
+        "proven": proven,
+        "reverted": reverted,
+        "max_abs_error": max_abs_error,
+        "relative_error": max_abs_error / largest if largest > 0 else max_abs_error,
+    }
+    return weights_list, biases_list, conv_layer_params, layer_shape, report
@@ -5,9 +5,21 @@ import numpy as np
 from A_load_model import loadModel
 from B_extract_model import extractModel
 from C_layer_propagation import layer_propagation
-from D_code_generation import preambleHeader, codeGen
+from D_code_generation import preambleHeader, moduleInterface, codeGen, fixedPointCodeGen
 from Z_test_script import testSource
 from Z_normalization_parameters import normParam
+from Z_kernel_selection import fuseConvLayers, simplifyLayers, sparseLayers, selectKernels, tileSchedule
+from Z_quantization import (
+    loadCalibration,
+    checkInputs,
+    quantizeLayers,
+    halfPrecisionLayers,
+    palettizeLayers,
+    lowRankLayers,
+    removeDeadUnits,
+)
+from Z_fixed_point import fixedPointLayers
+from Z_activation_approx import activationApprox, approx_max_error
 
 ## ARG PARSING ##
 parser = argparse.ArgumentParser(
@@ -26,18 +38,310 @@ parser.add_argument(
     "--precision",
     type=str,
     required=False,
-    help='precision type to run neural net, either "double" or "float"',
+    help='precision type to run neural net, either "double", "float" or "fixed" (integer-only fixed-point '
+    "code with the Q format of every layer chosen from the ranges seen on --calibration)",
+)
+parser.add_argument(
+    "--layer-precision",
+    type=str,
+    required=False,
+    default=None,
+    help='comma separated "layer:type" overrides of --precision for single layers, type "float", "double" '
+    'or "mixed" (float weights with double accumulation, Dense layers only), e.g. "7:double,9:mixed", the '
+    "layer numbers are the ones in the generated code (see testing/mixed_precision.py to choose them)",
+)
+parser.add_argument(
+    "--layout",
+    type=str,
+    required=False,
+    default="header",
+    help='output layout: "header" (one self-contained header per model), "pch" (thin model headers '
+    'sharing one precompilable kernels header), or "module" (c++20 module interface units for the '
+    'models and the shared kernels, plus the "pch" headers as a fallback)',
+)
+parser.add_argument(
+    "--unroll-threshold",
+    type=int,
+    required=False,
+    default=None,
+    help="Dense and Conv2D layers with fewer parameters than this are generated with every "
+    "dimension as a template constant so the compiler fully unrolls them (off by default)",
+)
+parser.add_argument(
+    "--activation-sparse",
+    action="store_true",
+    help="Dense layers behind a relu compact their nonzero inputs and accumulate only those weight rows "
+    "when at least half of the inputs are zero, checked on every call (off by default)",
+)
+parser.add_argument(
+    "--activation-approx",
+    type=str,
+    required=False,
+    default=None,
+    help='"rational" or "table" to replace the sigmoid, tanh, elu, selu, swish, silu and gelu lambdas with '
+    "vectorizable polynomial / rational approximations or piecewise cubic tables, each activation is kept "
+    "only if the outputs on --calibration (or random normal inputs) stay within --activation-tolerance of "
+    "the exact lambdas (off by default)",
+)
+parser.add_argument(
+    "--activation-tolerance",
+    type=float,
+    required=False,
+    default=1e-5,
+    help="max |output - exact output| of --activation-approx on the check inputs",
+)
+parser.add_argument(
+    "--winograd",
+    type=int,
+    required=False,
+    default=None,
+    help="output tile size (2 or 4) of the winograd F(m x m, 3x3) kernels used for the stride 1 3x3 "
+    "Conv2D layers, 4 saves more multiplies but rounds worse (off by default)",
+)
+parser.add_argument(
+    "--tile-cache",
+    type=int,
+    required=False,
+    default=None,
+    help="target cache size in KiB, runs of 2d convolution, pooling and elementwise layers whose "
+    "feature maps do not fit are executed depth-first in strips of rows that do (off by default)",
+)
+parser.add_argument(
+    "--no-fusion",
+    action="store_true",
+    help="keep Conv2D / SeparableConv2D / DepthwiseConv2D -> BatchNormalization -> Activation -> "
+    "(Global)Pooling chains as separate layers instead of folding and fusing them, e.g. to compare "
+    "the layer outputs with testing/read_each_layer.py",
+)
+parser.add_argument(
+    "--no-simplify",
+    action="store_true",
+    help="keep Dropout / Flatten / Reshape layers, consecutive linear Dense layers and activations "
+    "before max pooling as they are instead of removing, aliasing, merging and reordering them",
+)
+parser.add_argument(
+    "--quantize",
+    type=str,
+    required=False,
+    default=None,
+    help='"int8" to quantize the Dense and Conv2D layers post-training to int8 weights and inputs with '
+    "int32 accumulation, the scales are calibrated on --calibration (off by default)",
+)
+parser.add_argument(
+    "--weight-storage",
+    type=str,
+    required=False,
+    default=None,
+    help='"fp16" or "bf16" to store the Dense and Conv2D weights as 16 bit floats that the kernels widen '
+    "as they load them, halving the weight bytes, the error against keras is checked on --calibration "
+    "(or random normal inputs) when generating (off by default)",
+)
+parser.add_argument(
+    "--palettize",
+    type=str,
+    required=False,
+    default=None,
+    help='"16" or "256" to cluster the weights of every Dense and Conv2D layer into that many centroids, '
+    'stored as a codebook with 4 or 8 bit indices, or "auto" to choose 16, 256 or float weights per layer '
+    "within --palette-tolerance, the error is checked on --calibration (or random normal inputs) (off by default)",
+)
+parser.add_argument(
+    "--palette-tolerance",
+    type=float,
+    required=False,
+    default=None,
+    help="max |output - keras output| of --palettize=auto on the check inputs",
+)
+parser.add_argument(
+    "--low-rank",
+    type=float,
+    required=False,
+    default=None,
+    help="max |output - keras output| to factor the Dense weights into two thin svd factors within, "
+    "with the smallest rank that meets it and saves multiply-adds, checked on --calibration (or random "
+    "normal inputs) (off by default)",
+)
+parser.add_argument(
+    "--sparse",
+    type=float,
+    required=False,
+    default=None,
+    help="fraction of zero weights (e.g. 0.8) from which the Dense and Conv2D layers of pruned models keep "
+    "only their nonzero weight blocks and use the sparse kernels (off by default)",
+)
+parser.add_argument(
+    "--sparse-block",
+    type=int,
+    required=False,
+    default=1,
+    help="consecutive outputs per stored block of --sparse, 1 for csr, 8 or 16 for vectorizable blocks",
+)
+parser.add_argument(
+    "--remove-dead",
+    action="store_true",
+    help="remove the Dense units and Conv2D channels whose outgoing weights are all zero or whose output "
+    "is constant on --calibration (e.g. relu units that never activate), and shrink the next layer's "
+    "weights, the deviation is checked on --validation (a held-out quarter of --calibration by default)",
+)
+parser.add_argument(
+    "--dead-tolerance",
+    type=float,
+    required=False,
+    default=1e-5,
+    help="max change of the outputs by --remove-dead on the validation inputs, the units found on the "
+    "calibration inputs that exceed it are kept",
+)
+parser.add_argument(
+    "--calibration",
+    type=str,
+    required=False,
+    default=None,
+    help="path of an .npy / .npz file of representative model inputs for --quantize and --precision=fixed, "
+    "and the error checks of --weight-storage, --palettize, --low-rank and --activation-approx",
+)
+parser.add_argument(
+    "--validation",
+    type=str,
+    required=False,
+    default=None,
+    help="path of an .npy / .npz file of model inputs the error of --precision=fixed and --remove-dead is "
+    "reported on (the calibration inputs by default, a held-out quarter of them for --remove-dead)",
+)
+parser.add_argument(
+    "--fixed-bits",
+    type=int,
+    required=False,
+    default=16,
+    help="word size of --precision=fixed, 16 (int16_t values and weights) or 32 (int32_t)",
+)
+parser.add_argument(
+    "--fft-threshold",
+    type=int,
+    required=False,
+    default=None,
+    help="stride 1 Conv1D layers with kernels of at least this many taps are generated as "
+    "overlap-save fft convolutions (off by default)",
 )
 args = parser.parse_args()
 
+## OUTPUT LAYOUT ##
+if args.layout not in ["header", "pch", "module"]:
+    print("\nERROR: Layout must be 'header', 'pch' or 'module'.\n")
+    exit(1)
+layout = args.layout
+kernels_name = "codejenn_kernels"
+kernels_module = "codejenn.kernels"
+all_layer_types = set()
+
+## KERNEL SELECTION ##
+if args.unroll_threshold is not None and args.unroll_threshold < 0:
+    print("\nERROR: Unroll threshold must be a non-negative integer.\n")
+    exit(1)
+unroll_threshold = args.unroll_threshold
+if args.winograd is not None and args.winograd not in [2, 4]:
+    print("\nERROR: Winograd tile size must be 2 or 4.\n")
+    exit(1)
+winograd_tile = args.winograd
+if args.fft_threshold is not None and args.fft_threshold < 1:
+    print("\nERROR: FFT threshold must be a positive integer.\n")
+    exit(1)
+fft_threshold = args.fft_threshold
+if args.tile_cache is not None and args.tile_cache < 1:
+    print("\nERROR: Tile cache size must be a positive number of KiB.\n")
+    exit(1)
+tile_cache = args.tile_cache
+if args.quantize is not None and args.quantize != "int8":
+    print("\nERROR: Quantization must be 'int8'.\n")
+    exit(1)
+if args.quantize is not None and args.calibration is None:
+    print("\nERROR: Quantization needs calibration inputs (--calibration).\n")
+    exit(1)
+if args.calibration is not None and not os.path.isfile(args.calibration):
+    print(f"\nERROR: Calibration file '{args.calibration}' does not exist.\n")
+    exit(1)
+quantize = args.quantize
+if args.weight_storage is not None and args.weight_storage not in ["fp16", "bf16"]:
+    print("\nERROR: Weight storage must be 'fp16' or 'bf16'.\n")
+    exit(1)
+if args.weight_storage is not None and quantize is not None:
+    print("\nERROR: Weight storage cannot be combined with --quantize.\n")
+    exit(1)
+weight_storage = args.weight_storage
+if args.palettize is not None and args.palettize not in ["16", "256", "auto"]:
+    print("\nERROR: Palettize must be '16', '256' or 'auto'.\n")
+    exit(1)
+if args.palettize is not None and (quantize is not None or weight_storage is not None):
+    print("\nERROR: Palettize cannot be combined with --quantize or --weight-storage.\n")
+    exit(1)
+if args.palettize == "auto" and (args.palette_tolerance is None or args.palette_tolerance <= 0):
+    print("\nERROR: Palettize 'auto' needs a positive --palette-tolerance.\n")
+    exit(1)
+if args.low_rank is not None and args.low_rank <= 0:
+    print("\nERROR: Low-rank tolerance must be positive.\n")
+    exit(1)
+if args.sparse is not None and not 0 < args.sparse <= 1:
+    print("\nERROR: Sparse threshold must be a fraction of zero weights in (0, 1].\n")
+    exit(1)
+if args.sparse_block < 1:
+    print("\nERROR: Sparse block size must be positive.\n")
+    exit(1)
+if args.remove_dead and args.calibration is None:
+    print("\nERROR: Removing dead units needs calibration inputs (--calibration).\n")
+    exit(1)
+if args.dead_tolerance <= 0:
+    print("\nERROR: Dead unit tolerance must be positive.\n")
+    exit(1)
+if args.activation_approx is not None and args.activation_approx not in ["rational", "table"]:
+    print("\nERROR: Activation approximation must be 'rational' or 'table'.\n")
+    exit(1)
+if args.activation_tolerance <= 0:
+    print("\nERROR: Activation tolerance must be positive.\n")
+    exit(1)
+palettize = int(args.palettize) if args.palettize in ["16", "256"] else args.palettize
+
 ## DATA TYPE PRECISION ##
 if args.precision is not None:
-    if args.precision not in ["float", "double"]:
-        print("\nERROR: Precision type must be 'float' or 'double'.\n")
+    if args.precision not in ["float", "double", "fixed"]:
+        print("\nERROR: Precision type must be 'float', 'double' or 'fixed'.\n")
         exit(1)
     precision_type = args.precision
 else:
     precision_type = "float"
+if precision_type == "fixed":
+    if args.calibration is None:
+        print("\nERROR: Fixed-point precision needs calibration inputs (--calibration).\n")
+        exit(1)
+    if any(
+        option is not None
+        for option in [quantize, weight_storage, palettize, args.low_rank, args.sparse, args.activation_approx]
+    ):
+        print(
+            "\nERROR: Fixed-point precision cannot be combined with --quantize, --weight-storage, --palettize, "
+            "--low-rank, --sparse or --activation-approx.\n"
+        )
+        exit(1)
+    if args.fixed_bits not in [16, 32]:
+        print("\nERROR: Fixed-point word size must be 16 or 32.\n")
+        exit(1)
+layer_precision = None
+if args.layer_precision:
+    try:
+        layer_precision = {
+            int(idx): precision.strip()
+            for idx, precision in (entry.split(":") for entry in args.layer_precision.split(","))
+        }
+    except ValueError:
+        print("\nERROR: Layer precisions must be comma separated 'layer:type' entries.\n")
+        exit(1)
+    if any(precision not in ["float", "double", "mixed"] for precision in layer_precision.values()):
+        print("\nERROR: Layer precision types must be 'float', 'double' or 'mixed'.\n")
+        exit(1)
+    if precision_type == "fixed":
+        print("\nERROR: Layer precisions cannot be combined with fixed-point precision.\n")
+        exit(1)
+if args.validation is not None and not os.path.isfile(args.validation):
+    print(f"\nERROR: Validation file '{args.validation}' does not exist.\n")
+    exit(1)
 
 model_dir = args.input
 save_dir = args.output
@@ -128,6 +432,363 @@ else:
                 except ValueError as e:
                     print("\nError in extracting model:", e)
                     continue
+                extracted_layer_type = list(layer_type)
+                extracted_activations = list(activation_functions)
+                extracted_alphas = list(alphas)
+
+                if not args.no_fusion:
+                    (
+                        layer_type,
+                        weights_list,
+                        activation_functions,
+                        alphas,
+                        batch_norm_params,
+                        conv_layer_params,
+                    ) = fuseConvLayers(
+                        layer_type,
+                        weights_list,
+                        activation_functions,
+                        alphas,
+                        batch_norm_params,
+                        conv_layer_params,
+                    )
+
+                if not args.no_simplify:
+                    (
+                        layer_type,
+                        weights_list,
+                        biases_list,
+                        activation_functions,
+                        alphas,
+                        conv_layer_params,
+                        layer_shape,
+                        removed_layers,
+                        saved_bytes,
+                    ) = simplifyLayers(
+                        layer_type,
+                        weights_list,
+                        biases_list,
+                        activation_functions,
+                        alphas,
+                        conv_layer_params,
+                        layer_shape,
+                        4 if precision_type == "float" else 8,
+                    )
+                    if removed_layers or saved_bytes:
+                        print(
+                            f"Simplified {base_file_name}: {removed_layers} layers and "
+                            f"{saved_bytes} bytes of memory traffic per call eliminated"
+                        )
+
+                if args.remove_dead:
+                    try:
+                        calibration = loadCalibration(args.calibration, model.input_shape[1:])
+                        if args.validation is not None:
+                            validation = loadCalibration(args.validation, model.input_shape[1:])
+                        elif len(calibration) >= 2:
+                            # the deviation on the inputs the dead units are found on is zero
+                            held_out = max(1, len(calibration) // 4)
+                            calibration, validation = calibration[:-held_out], calibration[-held_out:]
+                        else:
+                            raise ValueError("holding out validation inputs needs at least 2 calibration inputs")
+                        weights_list, biases_list, conv_layer_params, layer_shape, report = removeDeadUnits(
+                            model,
+                            layer_type,
+                            extracted_layer_type,
+                            weights_list,
+                            biases_list,
+                            activation_functions,
+                            conv_layer_params,
+                            layer_shape,
+                            calibration,
+                            validation,
+                            args.dead_tolerance,
+                        )
+                    except ValueError as e:
+                        print("\nError in removing dead units:", e)
+                        continue
+                    print(
+                        f"Removed dead units of {base_file_name}: "
+                        + (
+                            ", ".join(
+                                f"layer {idx}: {dead} of {units}" for idx, (dead, units) in report["removed"].items()
+                            )
+                            or "none"
+                        )
+                        + f" ({report['proven']} from the weights alone, {report['reverted']} kept for the "
+                        f"tolerance), max |error| {report['max_abs_error']:.3e} "
+                        f"({report['relative_error']:.2%} of the largest output) on {len(validation)} "
+                        f"{'validation' if args.validation is not None else 'held-out calibration'} inputs"
+                    )
+
+                fixed_params = None
+                if precision_type == "fixed":
+                    try:
+                        calibration = loadCalibration(args.calibration, model.input_shape[1:])
+                        validation = (
+                            loadCalibration(args.validation, model.input_shape[1:])
+                            if args.validation is not None
+                            else calibration
+                        )
+                        fixed_params, report = fixedPointLayers(
+                            layer_type,
+                            weights_list,
+                            biases_list,
+                            activation_functions,
+                            alphas,
+                            batch_norm_params,
+                            input_flat_size,
+                            input_norms,
+                            input_mins,
+                            output_norms,
+                            output_mins,
+                            calibration,
+                            validation,
+                            args.fixed_bits,
+                        )
+                    except ValueError as e:
+                        print("\nError in converting model to fixed point:", e)
+                        continue
+                    print(
+                        f"Fixed-point {base_file_name}: {report['layers']} layers in {fixed_params['word']}, "
+                        f"input / output with {fixed_params['input_frac']} / {fixed_params['output_frac']} "
+                        f"fractional bits, max |error| {report['max_abs_error']:.3e} "
+                        f"({report['relative_error']:.2%} of the largest output) against double precision, "
+                        f"{report['saturated']} saturated values on {len(validation)} validation inputs"
+                    )
+
+                low_rank_params = None
+                if args.low_rank is not None:
+                    try:
+                        check_inputs = checkInputs(args.calibration, model.input_shape[1:])
+                        layer_type, weights_list, low_rank_params, report = lowRankLayers(
+                            model,
+                            layer_type,
+                            extracted_layer_type,
+                            weights_list,
+                            biases_list,
+                            activation_functions,
+                            conv_layer_params,
+                            args.low_rank,
+                            check_inputs,
+                        )
+                    except ValueError as e:
+                        print("\nError in factoring model:", e)
+                        continue
+                    print(
+                        f"Low-rank {base_file_name}: {report['layers']} layers ("
+                        + ", ".join(
+                            f"layer {idx}: {f'rank {rank}' if rank is not None else 'dense'} of {min(n_in, n_out)}"
+                            for idx, (rank, n_in, n_out) in report["ranks"].items()
+                        )
+                        + f"), multiply-adds {report['dense_macs']} -> {report['low_rank_macs']}, max |error| "
+                        f"{report['max_abs_error']:.3e} ({report['relative_error']:.2%} of the largest output) "
+                        f"on {len(check_inputs)} {'calibration' if args.calibration is not None else 'random'} inputs"
+                        + (
+                            f", top-1 agreement {report['top1_agreement']:.2%}"
+                            if report["top1_agreement"] is not None
+                            else ""
+                        )
+                    )
+
+                sparse_params = None
+                if args.sparse is not None:
+                    layer_type, sparse_params, report = sparseLayers(
+                        layer_type,
+                        weights_list,
+                        biases_list,
+                        conv_layer_params,
+                        args.sparse,
+                        args.sparse_block,
+                        4 if precision_type == "float" else 8,
+                    )
+                    print(
+                        f"Sparse {base_file_name}: "
+                        + ", ".join(
+                            f"layer {idx}: density {layer['density']:.1%}"
+                            + (
+                                f", {layer['stored']:.1%} stored in blocks of {args.sparse_block}, "
+                                f"MAC reduction {layer['mac_reduction']:.1f}x, "
+                                f"{layer['dense_bytes']} -> {layer['sparse_bytes']} bytes"
+                                if layer["stored"] is not None
+                                else " (dense)"
+                            )
+                            for idx, layer in report.items()
+                        )
+                    )
+                    for idx, layer in report.items():
+                        if layer["fused"]:
+                            print(
+                                f"WARNING: layer {idx} keeps its dense weights, there is no sparse kernel for a "
+                                "convolution with a fused pooling (--no-fusion stores it sparse)"
+                            )
+
+                quant_params = None
+                if quantize is not None:
+                    try:
+                        calibration = loadCalibration(args.calibration, model.input_shape[1:])
+                        layer_type, quant_params, report = quantizeLayers(
+                            model,
+                            layer_type,
+                            extracted_layer_type,
+                            weights_list,
+                            biases_list,
+                            activation_functions,
+                            conv_layer_params,
+                            calibration,
+                            4 if precision_type == "float" else 8,
+                        )
+                    except ValueError as e:
+                        print("\nError in quantizing model:", e)
+                        continue
+                    print(
+                        f"Quantized {base_file_name} to {quantize}: {report['layers']} layers "
+                        f"({report['requantized']} with int8 outputs for the next one), weights "
+                        f"{report['float_bytes']} -> {report['int8_bytes']} bytes, max |error| "
+                        f"{report['max_abs_error']:.3e} ({report['relative_error']:.2%} of the largest output) "
+                        f"on {len(calibration)} calibration inputs"
+                        + (
+                            f", top-1 agreement {report['top1_agreement']:.2%}"
+                            if report["top1_agreement"] is not None
+                            else ""
+                        )
+                    )
+
+                half_params = None
+                if weight_storage is not None:
+                    try:
+                        check_inputs = checkInputs(args.calibration, model.input_shape[1:])
+                        layer_type, half_params, report = halfPrecisionLayers(
+                            model,
+                            layer_type,
+                            extracted_layer_type,
+                            weights_list,
+                            biases_list,
+                            activation_functions,
+                            conv_layer_params,
+                            weight_storage,
+                            check_inputs,
+                            4 if precision_type == "float" else 8,
+                        )
+                    except ValueError as e:
+                        print("\nError in storing weights in 16 bits:", e)
+                        continue
+                    print(
+                        f"Stored {base_file_name} weights in {weight_storage}: {report['layers']} layers, weights "
+                        f"{report['float_bytes']} -> {report['half_bytes']} bytes, max |error| "
+                        f"{report['max_abs_error']:.3e} ({report['relative_error']:.2%} of the largest output) "
+                        f"on {len(check_inputs)} {'calibration' if args.calibration is not None else 'random'} inputs"
+                        + (
+                            f", top-1 agreement {report['top1_agreement']:.2%}"
+                            if report["top1_agreement"] is not None
+                            else ""
+                        )
+                    )
+                    for idx in report["fused"]:
+                        print(
+                            f"WARNING: layer {idx} keeps its float weights, there is no {weight_storage} kernel for a "
+                            "convolution with a fused pooling (--no-fusion stores it in 16 bits)"
+                        )
+
+                palette_params = None
+                if palettize is not None:
+                    try:
+                        check_inputs = checkInputs(args.calibration, model.input_shape[1:])
+                        layer_type, palette_params, report = palettizeLayers(
+                            model,
+                            layer_type,
+                            extracted_layer_type,
+                            weights_list,
+                            biases_list,
+                            activation_functions,
+                            conv_layer_params,
+                            palettize,
+                            args.palette_tolerance,
+                            check_inputs,
+                            4 if precision_type == "float" else 8,
+                        )
+                    except ValueError as e:
+                        print("\nError in palettizing model:", e)
+                        continue
+                    print(
+                        f"Palettized {base_file_name}: {report['layers']} layers ("
+                        + ", ".join(
+                            f"layer {idx}: {k if k is not None else 'float'}" for idx, k in report["clusters"].items()
+                        )
+                        + f"), weights {report['float_bytes']} -> {report['palette_bytes']} bytes, max |error| "
+                        f"{report['max_abs_error']:.3e} ({report['relative_error']:.2%} of the largest output) "
+                        f"on {len(check_inputs)} {'calibration' if args.calibration is not None else 'random'} inputs"
+                        + (
+                            f", top-1 agreement {report['top1_agreement']:.2%}"
+                            if report["top1_agreement"] is not None
+                            else ""
+                        )
+                    )
+                    for idx in report["fused"]:
+                        print(
+                            f"WARNING: layer {idx} keeps its float weights, there is no palette kernel for a "
+                            "convolution with a fused pooling (--no-fusion palettizes it)"
+                        )
+
+                activation_approx = None
+                if args.activation_approx is not None:
+                    try:
+                        check_inputs = checkInputs(args.calibration, model.input_shape[1:])
+                        activation_approx, report = activationApprox(
+                            model,
+                            layer_type,
+                            extracted_layer_type,
+                            weights_list,
+                            biases_list,
+                            conv_layer_params,
+                            extracted_activations,
+                            extracted_alphas,
+                            args.activation_approx,
+                            args.activation_tolerance,
+                            check_inputs,
+                            4 if precision_type == "float" else 8,
+                        )
+                    except ValueError as e:
+                        print("\nError in approximating activations:", e)
+                        continue
+                    documented = approx_max_error[(args.activation_approx, precision_type)]
+                    print(
+                        f"Approximated activations of {base_file_name} ({args.activation_approx}): "
+                        + (
+                            ", ".join(f"{name} (max error {documented[name]:.1e})" for name in report["used"])
+                            if report["used"]
+                            else "none"
+                        )
+                        + "".join(
+                            f", {name} refused (output error {error:.3e})"
+                            for name, error in report["errors"].items()
+                            if name not in report["used"]
+                        )
+                        + f", max |error| {report['max_abs_error']:.3e} ({report['relative_error']:.2%} of the "
+                        f"largest output) on {len(check_inputs)} "
+                        f"{'calibration' if args.calibration is not None else 'random'} inputs"
+                    )
+
+                layer_type, conv_layer_params = selectKernels(
+                    layer_type,
+                    weights_list,
+                    biases_list,
+                    conv_layer_params,
+                    unroll_threshold=unroll_threshold,
+                    winograd_tile=winograd_tile,
+                    fft_threshold=fft_threshold,
+                    activation_functions=activation_functions,
+                    activation_sparse=args.activation_sparse,
+                )
+                tile_plans = None
+                if tile_cache is not None:
+                    tile_plans = tileSchedule(
+                        layer_type,
+                        activation_functions,
+                        conv_layer_params,
+                        tile_cache,
+                        4 if precision_type == "float" else 8,
+                    )
 
                 ############################
                 ## 4. INITIALIZE C++ CODE ##
@@ -140,9 +801,18 @@ else:
                 ## 5. PROCESS LAYER PROPAGATION FUNCTIONS ##
                 ############################################
                 try:
-                    cpp_code, cpp_lambda = layer_propagation(
-                        cpp_code, activation_functions, layer_type
-                    )
+                    if fixed_params is not None:
+                        # integer kernels and activations only
+                        layer_type = [op["kernel"] for op in fixed_params["ops"]]
+                        cpp_code, cpp_lambda = layer_propagation(cpp_code, [], layer_type)
+                    else:
+                        cpp_code, cpp_lambda = layer_propagation(
+                            cpp_code, activation_functions, layer_type, activation_approx
+                        )
+                    if layout != "header":
+                        # kernels are written once to the shared kernels files below
+                        cpp_code = ""
+                        all_layer_types.update(layer_type)
                 except ValueError as e:
                     print("\nError in generating layer propagation functions:", e)
                     continue
@@ -151,36 +821,67 @@ else:
                 ## 6. GENERATE FINAL C++ CODE ##
                 ################################
                 try:
-                    cpp_code = codeGen(
-                        cpp_code,
-                        cpp_lambda,
-                        precision_type,
-                        weights_list,
-                        biases_list,
-                        activation_functions,
-                        alphas,
-                        dropout_rates,
-                        batch_norm_params,
-                        conv_layer_params,
-                        input_flat_size,
-                        output_flat_size,
-                        save_path,
-                        input_norms,
-                        input_mins,
-                        output_norms,
-                        output_mins,
-                        layer_shape,
-                        layer_type,
-                    )
+                    if fixed_params is not None:
+                        cpp_code = fixedPointCodeGen(cpp_code, fixed_params, save_path)
+                    else:
+                        cpp_code = codeGen(
+                            cpp_code,
+                            cpp_lambda,
+                            precision_type,
+                            weights_list,
+                            biases_list,
+                            activation_functions,
+                            alphas,
+                            dropout_rates,
+                            batch_norm_params,
+                            conv_layer_params,
+                            input_flat_size,
+                            output_flat_size,
+                            save_path,
+                            input_norms,
+                            input_mins,
+                            output_norms,
+                            output_mins,
+                            layer_shape,
+                            layer_type,
+                            tile_plans=tile_plans,
+                            quant_params=quant_params,
+                            layer_precision=layer_precision,
+                            half_params=half_params,
+                            palette_params=palette_params,
+                            low_rank_params=low_rank_params,
+                            sparse_params=sparse_params,
+                        )
                 except ValueError as e:
                     print("\nError in generating C++ code:", e)
                     continue
 
                 print()
-                with open(f"{save_path}.hpp", "w") as f:
-                    f.write(cpp_code)
+                if layout == "header":
+                    with open(f"{save_path}.hpp", "w") as f:
+                        f.write(cpp_code)
+                else:
+                    with open(f"{save_path}.hpp", "w") as f:
+                        f.write(preambleHeader(f"{kernels_name}.hpp") + cpp_code)
+                    if layout == "module":
+                        module_name = os.path.basename(save_path).replace("-", "_").replace(" ", "_")
+                        with open(f"{save_path}.cppm", "w") as f:
+                            f.write(moduleInterface(module_name, cpp_code, [kernels_module]))
                 print("Saved model in ", save_path)
 
             except ValueError as e:
                 print(f"\nERROR: '{file_name}' is not readable (skipping): {e}  - -\n")
-                continue
\ No newline at end of file
+                continue
+
+    ##################################
+    ## 7. WRITE SHARED KERNEL FILES ##
+    ##################################
+    if layout != "header" and all_layer_types:
+        kernels_code, _ = layer_propagation("", [], sorted(all_layer_types - {None}))
+        kernels_path = os.path.join(save_dir, kernels_name)
+        with open(f"{kernels_path}.hpp", "w") as f:
+            f.write(preambleHeader() + kernels_code)
+        if layout == "module":
+            with open(f"{kernels_path}.cppm", "w") as f:
+                f.write(moduleInterface(kernels_module, kernels_code))
+        print("Saved shared kernels in ", kernels_path)
\ No newline at end of file
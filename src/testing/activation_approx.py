@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+##########################################################################
+## MEASURE THE MAX ERROR AND THE THROUGHPUT OF THE APPROXIMATED         ##
+## ACTIVATION LAMBDAS (--activation-approx) IN FLOAT AND DOUBLE         ##
+##########################################################################
+# every approximated lambda is evaluated on a fine grid of x in [-range, range] and compared
+# with the exact function in long double, the errors are the ones listed in approx_max_error
+# (codegen/Z_activation_approx.py). the time per element of the exact and approximated lambdas
+# is measured on an array of normal inputs. example:
+# python testing/activation_approx.py --range=30 --points=2000001
+
+parser = argparse.ArgumentParser(description="max error and throughput of the approximated activations.")
+parser.add_argument("--range", type=float, default=30.0, help="inputs in [-range, range]")
+parser.add_argument("--points", type=int, default=2000001, help="number of grid points")
+parser.add_argument("--calls", type=int, default=200, help="number of timed passes over 4096 inputs")
+parser.add_argument("--compiler", type=str, default="g++", help="c++20 compiler")
+parser.add_argument("--flags", type=str, default="-std=c++20 -O3 -march=native", help="compiler flags")
+args = parser.parse_args()
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "codegen"))
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+from C_layer_propagation import layer_propagation
+from D_code_generation import standardIncludes
+from Z_activation_approx import approx_activations
+
+lambdas = ["tanhCustom" if name == "tanh" else name for name in approx_activations]
+methods = ["exact", "rational", "table"]
+
+# one function per method with its lambdas, dispatched by the activation name
+src = standardIncludes() + "#include <chrono>\n#include <cstring>\n"
+for method in methods:
+    approx = None if method == "exact" else {name: method for name in lambdas}
+    _, cpp_lambda = layer_propagation("", approx_activations, [], approx)
+    src += "template<typename Scalar>\n"
+    src += f"void {method}(const char* name, Scalar* outputs, const Scalar* inputs, int size) {{\n"
+    src += cpp_lambda
+    for name, function in zip(approx_activations, lambdas):
+        src += f'    if (!std::strcmp(name, "{name}")) for (int i = 0; i < size; ++i) {function}(outputs[i], inputs[i], Scalar(1));\n'
+    src += "}\n"
+
+src += r"""
+long double reference(const char* name, long double x) {
+    const long double alpha = 1;
+    if (!std::strcmp(name, "sigmoid")) return 1 / (1 + std::exp(-x));
+    if (!std::strcmp(name, "tanh")) return std::tanh(x);
+    if (!std::strcmp(name, "elu")) return x > 0 ? x : alpha * std::expm1(x);
+    if (!std::strcmp(name, "selu")) return 1.0507009873554804934193349852946L * (x > 0 ? x : 1.6732632423543772848170429916717L * std::expm1(x));
+    if (!std::strcmp(name, "swish")) return x / (1 + std::exp(-alpha * x));
+    if (!std::strcmp(name, "silu")) return x / (1 + std::exp(-x));
+    return 0.5L * x * (1 + std::tanh(0.7978845608028654L * (x + 0.044715L * x * x * x)));
+}
+
+template<typename Scalar>
+void measure(const char* precision, const char* name, double range, int points, int calls) {
+    std::vector<Scalar> x(points), y(points);
+    for (int i = 0; i < points; ++i) x[i] = Scalar(-range + 2 * range * i / (points - 1));
+    double error[3];
+    int m = 0;
+    for (auto method : {exact<Scalar>, rational<Scalar>, table<Scalar>}) {
+        method(name, y.data(), x.data(), points);
+        error[m] = 0;
+        for (int i = 0; i < points; ++i) error[m] = std::max(error[m], double(std::abs(y[i] - reference(name, x[i]))));
+        ++m;
+    }
+    std::mt19937 generator(0);
+    std::normal_distribution<double> normal(0.0, 3.0);
+    std::vector<Scalar> inputs(4096), outputs(4096);
+    for (auto& v : inputs) v = Scalar(normal(generator));
+    double time[3];
+    m = 0;
+    for (auto method : {exact<Scalar>, rational<Scalar>, table<Scalar>}) {
+        double best = 1e300;
+        for (int r = 0; r < 5; ++r) {
+            auto t0 = std::chrono::steady_clock::now();
+            for (int c = 0; c < calls; ++c) {
+                inputs[c % 4096] += Scalar(1e-7);
+                method(name, outputs.data(), inputs.data(), 4096);
+            }
+            auto t1 = std::chrono::steady_clock::now();
+            best = std::min(best, std::chrono::duration<double, std::nano>(t1 - t0).count() / (calls * 4096.0));
+        }
+        time[m++] = best;
+    }
+    std::printf("%-8s%-10s%12.2e%12.2e%12.2e%10.2f%10.2f%10.2f\n", precision, name, error[0], error[1], error[2],
+                time[0], time[1], time[2]);
+}
+
+int main(int argc, char** argv) {
+    const double range = std::atof(argv[1]);
+    const int points = std::atoi(argv[2]);
+    const int calls = std::atoi(argv[3]);
+    std::printf("%-8s%-10s%12s%12s%12s%10s%10s%10s\n", "", "", "max |error|", "", "", "ns/value", "", "");
+    std::printf("%-8s%-10s%12s%12s%12s%10s%10s%10s\n", "", "", "exact", "rational", "table", "exact", "rational", "table");
+    for (const char* name : {"sigmoid", "tanh", "elu", "selu", "swish", "silu", "gelu"}) measure<float>("float", name, range, points, calls);
+    for (const char* name : {"sigmoid", "tanh", "elu", "selu", "swish", "silu", "gelu"}) measure<double>("double", name, range, points, calls);
+}
+"""
+
+with tempfile.TemporaryDirectory() as tmp:
+    with open(os.path.join(tmp, "activation_approx.cpp"), "w") as f:
+        f.write(src)
+    build = subprocess.run(
+        [args.compiler, *args.flags.split(), "activation_approx.cpp", "-o", "activation_approx"],
+        cwd=tmp,
+        capture_output=True,
+        text=True,
+    )
+    if build.returncode:
+        print(build.stderr[:4000])
+        sys.exit(1)
+    run = subprocess.run(
+        [os.path.join(tmp, "activation_approx"), str(args.range), str(args.points), str(args.calls)],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+print(f"\nactivations on x in [-{args.range:g}, {args.range:g}] ({args.compiler} {args.flags})")
+print(run.stdout)
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+##########################################################################
+## MEASURE THE TOTAL BUILD TIME OF A MULTI TRANSLATION UNIT TEST PROJECT ##
+## FOR EACH OUTPUT LAYOUT (header, pch, module) OF THE CODE GENERATOR   ##
+##########################################################################
+# every layout is also linked into a program that runs the model on a fixed input, and its
+# outputs are compared with the header build, since a layout that builds faster but computes
+# something else (or crashes) is no gain. example:
+# python testing/compile_time.py --input="./dump_model" --units=8 --compiler="g++"
+
+parser = argparse.ArgumentParser(description="compare build times of the generated output layouts.")
+parser.add_argument("--input", type=str, required=True, help="path of folder with trained model files")
+parser.add_argument("--units", type=int, default=8, help="number of translation units using each model")
+parser.add_argument("--compiler", type=str, default="g++", help="c++20 compiler with module support")
+parser.add_argument("--flags", type=str, default="-std=c++20 -O2", help="compiler flags")
+args = parser.parse_args()
+
+main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "codegen", "main.py")
+flags = args.flags.split()
+module_flags = ["-fmodules-ts"] if "g++" in args.compiler else ["-fmodules"]
+
+
+def timed(cmd, cwd):
+    # run one compiler invocation and return its wall time
+    start = time.perf_counter()
+    subprocess.run(cmd, cwd=cwd, check=True, capture_output=True)
+    return time.perf_counter() - start
+
+
+def writeUnits(out_dir, model, use_import):
+    # write the translation units of the test project, each one calls the model
+    units = []
+    for u in range(args.units):
+        # the model header must come first so a precompiled header can be used
+        src = f"#include <array>\nimport {model};\n" if use_import else f'#include "{model}.hpp"\n'
+        src += f"double unit_{u}() {{\n"
+        src += f"    auto out = {model}<double>({{}});\n"
+        src += "    return *reinterpret_cast<const double*>(&out);\n}\n"
+        name = f"{model}_unit_{u}.cpp"
+        with open(os.path.join(out_dir, name), "w") as f:
+            f.write(src)
+        units.append(name)
+    return units
+
+
+def buildTime(out_dir, model, layout):
+    # total time to build every translation unit plus any shared artifacts
+    total = 0.0
+    if layout == "header":
+        units = writeUnits(out_dir, model, False)
+        for unit in units:
+            total += timed([args.compiler, *flags, "-c", unit], out_dir)
+    elif layout == "pch":
+        total += timed([args.compiler, *flags, "-x", "c++-header", f"{model}.hpp", "-o", f"{model}.hpp.gch"], out_dir)
+        units = writeUnits(out_dir, model, False)
+        for unit in units:
+            total += timed([args.compiler, *flags, "-c", unit], out_dir)
+    else:
+        total += timed([args.compiler, *flags, *module_flags, "-c", "-x", "c++", f"{model}.cppm"], out_dir)
+        units = writeUnits(out_dir, model, True)
+        for unit in units:
+            total += timed([args.compiler, *flags, *module_flags, "-c", unit], out_dir)
+    return total
+
+
+def runOutputs(out_dir, model, layout):
+    # build and run a program that calls the model once on a fixed input, None if it fails
+    src = f"#include <array>\n#include <cstdio>\nimport {model};\n" if layout == "module" else (
+        f'#include "{model}.hpp"\n#include <cstdio>\n'
+    )
+    src += "template <typename F> struct InputOf;\n"
+    src += "template <typename R, typename A> struct InputOf<R (*)(const A&)> { using type = A; };\n"
+    src += "int main() {\n"
+    src += f"    typename InputOf<decltype(&{model}<double>)>::type input{{}};\n"
+    src += "    double* p = reinterpret_cast<double*>(&input);\n"
+    src += "    for (size_t i = 0; i < sizeof(input) / sizeof(double); ++i) p[i] = 0.01 * double(i % 101) - 0.5;\n"
+    src += f"    auto out = {model}<double>(input);\n"
+    src += "    const double* o = reinterpret_cast<const double*>(&out);\n"
+    src += '    for (size_t i = 0; i < sizeof(out) / sizeof(double); ++i) std::printf("%.17g\\n", o[i]);\n'
+    src += "}\n"
+    with open(os.path.join(out_dir, f"{model}_run.cpp"), "w") as f:
+        f.write(src)
+    if layout == "module":
+        cmd = [args.compiler, *flags, *module_flags, f"{model}_run.cpp", f"{model}.o", "codejenn_kernels.o"]
+    else:
+        cmd = [args.compiler, *flags, f"{model}_run.cpp"]
+    if subprocess.run([*cmd, "-o", f"{model}_run"], cwd=out_dir, capture_output=True).returncode:
+        return None
+    run = subprocess.run([os.path.join(out_dir, f"{model}_run")], cwd=out_dir, capture_output=True, text=True)
+    if run.returncode:
+        return None
+    return [float(v) for v in run.stdout.split()]
+
+
+def runCheck(outputs, reference):
+    # agreement of a layout's outputs with the header build
+    if outputs is None:
+        return "failed"
+    if reference is None or len(outputs) != len(reference):
+        return "differs"
+    diff = max((abs(a - b) for a, b in zip(outputs, reference)), default=0.0)
+    return "ok" if diff <= 1e-12 * max(1.0, max(abs(b) for b in reference)) else f"diff {diff:.1e}"
+
+
+with tempfile.TemporaryDirectory() as tmp:
+    results = {}
+    outputs = {}
+    for layout in ["header", "pch", "module"]:
+        out_dir = os.path.join(tmp, layout)
+        os.makedirs(out_dir)
+        subprocess.run(
+            [sys.executable, main_py, f"--input={args.input}", f"--output={out_dir}", f"--layout={layout}"],
+            check=True,
+            capture_output=True,
+        )
+        if layout == "module":
+            # the kernels module is built once and shared by every model
+            kernels_time = timed(
+                [args.compiler, *flags, *module_flags, "-c", "-x", "c++", "codejenn_kernels.cppm"], out_dir
+            )
+        for file_name in sorted(os.listdir(out_dir)):
+            model, ext = os.path.splitext(file_name)
+            if ext != ".hpp" or model == "codejenn_kernels":
+                continue
+            results.setdefault(model, {})[layout] = buildTime(out_dir, model, layout)
+            outputs.setdefault(model, {})[layout] = runOutputs(out_dir, model, layout)
+
+    print(f"\ntotal build time [s] of {args.units} translation units per model ({args.compiler} {args.flags})")
+    print(
+        f"{'model':<20}{'header':>10}{'pch':>10}{'module':>10}{'pch gain':>10}{'mod gain':>10}"
+        f"{'pch run':>12}{'module run':>12}"
+    )
+    for model, t in results.items():
+        reference = outputs[model]["header"]
+        print(
+            f"{model:<20}{t['header']:>10.2f}{t['pch']:>10.2f}{t['module']:>10.2f}"
+            f"{1 - t['pch'] / t['header']:>10.0%}{1 - t['module'] / t['header']:>10.0%}"
+            f"{runCheck(outputs[model]['pch'], reference):>12}{runCheck(outputs[model]['module'], reference):>12}"
+        )
+    print(f"shared kernels module built once in {kernels_time:.2f} s (not included above)\n")
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+import numpy as np
+import keras
+
+##########################################################################
+## FIND THE CONV1D KERNEL LENGTH FROM WHICH THE FFT KERNELS ARE FASTER  ##
+## THAN THE DIRECT ONES, I.E. THE VALUE TO PASS AS --fft-threshold      ##
+##########################################################################
+# builds one single layer Conv1D model per kernel length and times it with
+# testing/latency.py, example:
+# python testing/fft_crossover.py --length=1024 --in-channels=1 --filters=8
+
+parser = argparse.ArgumentParser(description="crossover kernel length of the direct and fft Conv1D kernels.")
+parser.add_argument("--length", type=int, default=1024, help="input sequence length")
+parser.add_argument("--in-channels", type=int, default=1, help="input channels")
+parser.add_argument("--filters", type=int, default=8, help="output channels")
+parser.add_argument("--kernels", type=str, default="8,16,24,32,48,64,96,128,192,256", help="kernel lengths to time")
+parser.add_argument("--precision", type=str, default="float", help="precision of the generated code")
+parser.add_argument("--calls", type=int, default=200, help="number of timed predict calls")
+parser.add_argument("--repeats", type=int, default=10, help="best of this many timed runs is reported")
+args = parser.parse_args()
+
+latency_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "latency.py")
+kernels = [int(k) for k in args.kernels.split(",")]
+
+with tempfile.TemporaryDirectory() as tmp:
+    rng = np.random.default_rng(0)
+    for k in kernels:
+        model = keras.Sequential([
+            keras.Input((args.length, args.in_channels)),
+            keras.layers.Conv1D(args.filters, k, padding="same"),
+        ])
+        for w in model.weights:
+            w.assign(rng.normal(size=w.shape) / np.sqrt(k * args.in_channels))
+        model.save(os.path.join(tmp, f"k{k}.keras"))
+
+    run = subprocess.run(
+        [sys.executable, latency_py, f"--input={tmp}", "--variant=direct=", "--variant=fft=--fft-threshold=1",
+         f"--precision={args.precision}", f"--calls={args.calls}", f"--repeats={args.repeats}"],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+
+times = {}
+for line in run.stdout.splitlines():
+    fields = line.split()
+    if len(fields) == 5 and fields[0].startswith("k") and fields[0][1:].isdigit():
+        times.setdefault(int(fields[0][1:]), {})[fields[1]] = (float(fields[2]), float(fields[4]))
+
+print(f"\nConv1D length {args.length}, {args.in_channels} -> {args.filters} channels, {args.precision} [us/call]")
+print(f"{'kernel':>8}{'direct':>12}{'fft':>12}{'speedup':>10}{'max |diff|':>14}")
+crossover = None
+for k in kernels:
+    direct, _ = times[k]["direct"]
+    fft, diff = times[k]["fft"]
+    print(f"{k:>8}{direct:>12.3f}{fft:>12.3f}{direct / fft:>10.2f}{diff:>14.3e}")
+    if fft < direct and crossover is None:
+        crossover = k
+    elif fft >= direct:
+        crossover = None
+print()
+if crossover is None:
+    print("the fft kernels are not faster for any of the larger kernels, keep --fft-threshold off\n")
+else:
+    print(f"the fft kernels are faster from {crossover} taps on: --fft-threshold={crossover}\n")
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+import numpy as np
+
+##########################################################################
+## MEASURE THE INFERENCE LATENCY OF THE GENERATED MODELS FOR DIFFERENT  ##
+## CODE GENERATION OPTIONS AND CHECK THEY STILL AGREE WITH EACH OTHER   ##
+##########################################################################
+# every --variant is "name=main.py options", the first variant is the reference.
+# example:
+# python testing/latency.py --input="../tutorials/dense_test_1" \
+#     --variant="loops=" --variant="unrolled=--unroll-threshold=4096"
+# with --tolerance the script fails if any variant differs from the reference by more than
+# tolerance * max |reference output|, e.g. to check the rounding of --winograd.
+# with --inputs the timed calls cycle through the samples of a .npy file instead of one fixed
+# input, for kernels whose cost depends on the values (e.g. --activation-sparse), the outputs of
+# the first sample are compared.
+
+parser = argparse.ArgumentParser(description="compare inference latency of code generation options.")
+parser.add_argument("--input", type=str, required=True, help="path of folder with trained model files")
+parser.add_argument("--variant", type=str, action="append", required=True, help='"name=main.py options"')
+parser.add_argument("--precision", type=str, default="double", help="precision of the generated code")
+parser.add_argument("--calls", type=int, default=20000, help="number of timed predict calls")
+parser.add_argument("--repeats", type=int, default=15, help="best of this many timed runs is reported")
+parser.add_argument("--compiler", type=str, default="g++", help="c++20 compiler")
+parser.add_argument("--flags", type=str, default="-std=c++20 -O3 -march=native", help="compiler flags")
+parser.add_argument("--inputs", type=str, default=None, help=".npy file of input samples to cycle through")
+parser.add_argument("--tolerance", type=float, default=None, help="max |diff| allowed relative to the max |output|")
+args = parser.parse_args()
+
+main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "codegen", "main.py")
+flags = args.flags.split()
+
+
+def inputType(header, model):
+    # recover the input type from the generated predict function signature
+    with open(header) as f:
+        match = re.search(rf"auto {re.escape(model)}\(const (.*)& initial_input\)", f.read())
+    return match.group(1)
+
+
+def writeDriver(out_dir, model, header):
+    # fill the input deterministically (or from the samples in inputs.bin), time the calls and
+    # print the outputs
+    src = f'#include "{os.path.basename(header)}"\n'
+    src += "#include <chrono>\n#include <iomanip>\n#include <fstream>\n#include <vector>\n"
+    src += "using Scalar = " + args.precision + ";\n"
+    src += "int main() {\n"
+    src += f"    {inputType(header, model)} input{{}};\n"
+    src += "    Scalar* p = reinterpret_cast<Scalar*>(&input);\n"
+    src += "    const size_t size = sizeof(input) / sizeof(Scalar);\n"
+    if args.inputs is None:
+        src += "    for (size_t i = 0; i < size; ++i) p[i] = Scalar(((i * 37) % 101) / 101.0);\n"
+    else:
+        src += '    std::ifstream file("inputs.bin", std::ios::binary);\n'
+        src += "    std::vector<Scalar> samples;\n"
+        src += "    double value;\n"
+        src += "    while (file.read(reinterpret_cast<char*>(&value), sizeof(double))) samples.push_back(Scalar(value));\n"
+        src += "    const size_t count = samples.size() / size;\n"
+        src += "    std::copy(samples.begin(), samples.begin() + size, p);\n"
+    src += f"    auto output = {model}<Scalar>(input);\n"
+    src += "    const Scalar* o = reinterpret_cast<const Scalar*>(&output);\n"
+    src += "    std::cout << std::setprecision(17);\n"
+    src += "    for (size_t i = 0; i < sizeof(output) / sizeof(Scalar); ++i) std::cout << o[i] << \"\\n\";\n"
+    src += "    double best = 1e300; Scalar acc = 0;\n"
+    src += f"    for (int r = 0; r < {args.repeats}; ++r) {{\n"
+    src += "        auto t0 = std::chrono::steady_clock::now();\n"
+    src += f"        for (int c = 0; c < {args.calls}; ++c) {{\n"
+    if args.inputs is None:
+        src += "            p[0] += Scalar(1e-9);\n"
+    else:
+        src += "            const Scalar* sample = samples.data() + (c % count) * size;\n"
+        src += "            std::copy(sample, sample + size, p);\n"
+    src += f"            auto out = {model}<Scalar>(input);\n"
+    src += "            acc += reinterpret_cast<const Scalar*>(&out)[0];\n"
+    src += "        }\n"
+    src += "        auto t1 = std::chrono::steady_clock::now();\n"
+    src += f"        best = std::min(best, std::chrono::duration<double, std::micro>(t1 - t0).count() / {args.calls});\n"
+    src += "    }\n"
+    src += "    std::cerr << best << \" \" << acc << \"\\n\";\n"
+    src += "}\n"
+    with open(os.path.join(out_dir, f"{model}_latency.cpp"), "w") as f:
+        f.write(src)
+    return f"{model}_latency.cpp"
+
+
+def runVariant(out_dir, options):
+    # generate, build and time every model with one set of options
+    subprocess.run(
+        [sys.executable, main_py, f"--input={args.input}", f"--output={out_dir}",
+         f"--precision={args.precision}", *options.split()],
+        check=True,
+        capture_output=True,
+    )
+    results = {}
+    if inputs is not None:
+        inputs.tofile(os.path.join(out_dir, "inputs.bin"))
+    for file_name in sorted(os.listdir(out_dir)):
+        model, ext = os.path.splitext(file_name)
+        if ext != ".hpp" or model == "codejenn_kernels":
+            continue
+        driver = writeDriver(out_dir, model, os.path.join(out_dir, file_name))
+        build = subprocess.run([args.compiler, *flags, driver, "-o", model], cwd=out_dir, capture_output=True, text=True)
+        if build.returncode:
+            print(f"WARNING: '{model}' failed to build with '{options}':\n{build.stderr[:2000]}")
+            continue
+        run = subprocess.run([os.path.join(out_dir, model)], cwd=out_dir, capture_output=True, text=True, check=True)
+        outputs = [float(v) for v in run.stdout.split()]
+        results[model] = (float(run.stderr.split()[0]), outputs)
+    return results
+
+
+variants = [v.split("=", 1) if "=" in v else [v, ""] for v in args.variant]
+inputs = None if args.inputs is None else np.asarray(np.load(args.inputs), dtype=np.float64)
+with tempfile.TemporaryDirectory() as tmp:
+    results = {}
+    for name, options in variants:
+        out_dir = os.path.join(tmp, name)
+        os.makedirs(out_dir)
+        results[name] = runVariant(out_dir, options)
+
+reference = variants[0][0]
+print(f"\nlatency [us/call] ({args.compiler} {args.flags}, {args.precision}, best of {args.repeats})")
+print(f"{'model':<20}{'variant':<20}{'latency':>12}{'speedup':>10}{'max |diff|':>14}")
+failed = []
+for model in sorted(results[reference]):
+    ref_time, ref_out = results[reference][model]
+    scale = max((abs(v) for v in ref_out), default=0.0)
+    for name, _ in variants:
+        if model not in results[name]:
+            continue
+        t, out = results[name][model]
+        diff = max((abs(a - b) for a, b in zip(out, ref_out)), default=0.0)
+        print(f"{model:<20}{name:<20}{t:>12.4f}{ref_time / t:>10.2f}{diff:>14.3e}")
+        if args.tolerance is not None and diff > args.tolerance * scale:
+            failed.append(f"{model} ({name})")
+print()
+if failed:
+    print(f"ERROR: outputs differ by more than {args.tolerance} * max |output|: {', '.join(failed)}\n")
+    sys.exit(1)
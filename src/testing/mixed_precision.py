@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import numpy as np
+
+##########################################################################
+## CHOOSE FLOAT, DOUBLE OR FLOAT WEIGHTS WITH DOUBLE ACCUMULATION PER   ##
+## LAYER SO THE OUTPUTS STAY WITHIN A TOLERANCE OF THE DOUBLE MODEL     ##
+##########################################################################
+# every model in --input is generated and built in double (the reference) and in float. if
+# float misses the tolerance, the layers are promoted to double one at a time, the ones that
+# reduce the error the most on their own first, until the outputs are within tolerance. then
+# every promoted layer is tried back in float and, for Dense layers, as "mixed" (float weights,
+# double sums), and kept so if the outputs stay within tolerance. the chosen --layer-precision
+# is printed with the max |error| and the speedup against double, and the header is saved.
+# example:
+# python testing/mixed_precision.py --input="./dump_model" --output="./bin" \
+#     --validation="inputs.npy" --tolerance=1e-6
+# the validation inputs are the ones the generated function takes (before the normalization of
+# the .dat file), one row per input. every model in --input must take them.
+
+parser = argparse.ArgumentParser(description="search per-layer precisions within an error tolerance.")
+parser.add_argument("--input", type=str, required=True, help="path of folder with trained model files")
+parser.add_argument("--output", type=str, required=True, help="path of folder to save the chosen headers")
+parser.add_argument("--validation", type=str, required=True, help=".npy file of model inputs, one per row")
+parser.add_argument("--tolerance", type=float, required=True, help="max |output - double output| allowed")
+parser.add_argument("--options", type=str, default="", help="other main.py options")
+parser.add_argument("--calls", type=int, default=20000, help="number of timed predict calls")
+parser.add_argument("--repeats", type=int, default=15, help="best of this many timed runs is reported")
+parser.add_argument("--compiler", type=str, default="g++", help="c++20 compiler")
+parser.add_argument("--flags", type=str, default="-std=c++20 -O3 -march=native", help="compiler flags")
+args = parser.parse_args()
+
+main_py = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "codegen", "main.py")
+flags = args.flags.split()
+inputs = np.load(args.validation).astype(np.float64)
+inputs = inputs.reshape(len(inputs), -1)
+
+
+def inputType(header, model):
+    # recover the input type from the generated predict function signature
+    with open(header) as f:
+        match = re.search(rf"auto {re.escape(model)}\(const (.*)& initial_input\)", f.read())
+    return match.group(1)
+
+
+def writeDriver(out_dir, model, header, scalar):
+    # run the validation inputs (doubles in inputs.bin), print the outputs and time the calls
+    src = f'#include "{os.path.basename(header)}"\n'
+    src += "#include <chrono>\n#include <iomanip>\n#include <fstream>\n"
+    src += f"using Scalar = {scalar};\n"
+    src += "int main() {\n"
+    src += f"    {inputType(header, model)} input{{}};\n"
+    src += "    Scalar* p = reinterpret_cast<Scalar*>(&input);\n"
+    src += "    const size_t size = sizeof(input) / sizeof(Scalar);\n"
+    src += '    std::ifstream file("inputs.bin", std::ios::binary);\n'
+    src += "    std::cout << std::setprecision(17);\n"
+    src += "    double value;\n"
+    src += "    while (true) {\n"
+    src += "        for (size_t i = 0; i < size; ++i) {\n"
+    src += "            if (!file.read(reinterpret_cast<char*>(&value), sizeof(double))) goto timing;\n"
+    src += "            p[i] = Scalar(value);\n"
+    src += "        }\n"
+    src += f"        auto output = {model}<Scalar>(input);\n"
+    src += "        const Scalar* o = reinterpret_cast<const Scalar*>(&output);\n"
+    src += "        for (size_t i = 0; i < sizeof(output) / sizeof(Scalar); ++i) std::cout << o[i] << \" \";\n"
+    src += "        std::cout << \"\\n\";\n"
+    src += "    }\n"
+    src += "timing:\n"
+    src += "    double best = 1e300; Scalar acc = 0;\n"
+    src += f"    for (int r = 0; r < {args.repeats}; ++r) {{\n"
+    src += "        auto t0 = std::chrono::steady_clock::now();\n"
+    src += f"        for (int c = 0; c < {args.calls}; ++c) {{\n"
+    src += "            p[0] += Scalar(1e-9);\n"
+    src += f"            auto out = {model}<Scalar>(input);\n"
+    src += "            acc += reinterpret_cast<const Scalar*>(&out)[0];\n"
+    src += "        }\n"
+    src += "        auto t1 = std::chrono::steady_clock::now();\n"
+    src += f"        best = std::min(best, std::chrono::duration<double, std::micro>(t1 - t0).count() / {args.calls});\n"
+    src += "    }\n"
+    src += "    std::cerr << best << \" \" << acc << \"\\n\";\n"
+    src += "}\n"
+    with open(os.path.join(out_dir, f"{model}_precision.cpp"), "w") as f:
+        f.write(src)
+    return f"{model}_precision.cpp"
+
+
+def runConfig(tmp, model_dir, model, precision, layer_precision):
+    # generate, build and run one model with the given precisions, None (and the reason on
+    # stderr) if it does not generate or build
+    out_dir = tempfile.mkdtemp(dir=tmp)
+    spec = ",".join(f"{idx}:{p}" for idx, p in sorted(layer_precision.items()))
+    options = [f"--precision={precision}", *args.options.split()]
+    if spec:
+        options.append(f"--layer-precision={spec}")
+    generate = subprocess.run(
+        [sys.executable, main_py, f"--input={model_dir}", f"--output={out_dir}", *options],
+        capture_output=True,
+        text=True,
+    )
+    header = os.path.join(out_dir, f"{model}.hpp")
+    if generate.returncode or not os.path.exists(header):
+        reason = generate.stdout.strip()[-2000:] or generate.stderr[-2000:]
+        print(f"{model} ({precision} {spec}): generation failed\n{reason}", file=sys.stderr)
+        return None
+    inputs.tofile(os.path.join(out_dir, "inputs.bin"))
+    driver = writeDriver(out_dir, model, header, precision)
+    build = subprocess.run([args.compiler, *flags, driver, "-o", model], cwd=out_dir, capture_output=True, text=True)
+    if build.returncode:
+        print(f"{model} ({precision} {spec}): build failed\n{build.stderr[:2000]}", file=sys.stderr)
+        return None
+    run = subprocess.run([os.path.join(out_dir, model)], cwd=out_dir, capture_output=True, text=True, check=True)
+    outputs = np.array([[float(v) for v in line.split()] for line in run.stdout.strip().split("\n")])
+    return {"header": header, "latency": float(run.stderr.split()[0]), "outputs": outputs, "spec": spec}
+
+
+def searchModel(tmp, model_dir, model):
+    # greedy promotion to double, then demotion back to float / mixed where the tolerance allows
+    # None if the double or the float model does not build
+    reference = runConfig(tmp, model_dir, model, "double", {})
+    result = single = runConfig(tmp, model_dir, model, "float", {})
+    if reference is None or single is None:
+        return None
+
+    def error(run):
+        return float(np.max(np.abs(run["outputs"] - reference["outputs"])))
+
+    def evaluate(layer_precision):
+        run = runConfig(tmp, model_dir, model, "float", layer_precision)
+        return (run, error(run)) if run is not None else (None, np.inf)
+
+    with open(result["header"]) as f:
+        header = f.read()
+    layers = sorted({int(idx) for idx in re.findall(r"std::array<Scalar, [^>]*> layer_(\d+)_output;", header)})
+    # "mixed" is only generated for the Dense kernel (float weights, double sums)
+    dense = {int(idx) for idx in re.findall(r"// Dense, layer (\d+)\n", header)}
+    chosen = {}
+    best_error = error(result)
+    if best_error > args.tolerance:
+        gains = {}
+        for idx in layers:
+            _, gains[idx] = evaluate({idx: "double"})
+        for idx in sorted(layers, key=lambda idx: gains[idx]):
+            chosen[idx] = "double"
+            run, err = evaluate(chosen)
+            if run is None:
+                del chosen[idx]
+                continue
+            result, best_error = run, err
+            if best_error <= args.tolerance:
+                break
+        if best_error > args.tolerance:
+            # not reachable with float inputs and outputs, keep the double model
+            return reference, single, reference, 0.0, "double"
+        for idx in list(chosen):
+            for precision in ["float", "mixed"] if idx in dense else ["float"]:
+                trial = dict(chosen)
+                if precision == "float":
+                    del trial[idx]
+                else:
+                    trial[idx] = precision
+                run, err = evaluate(trial)
+                if err <= args.tolerance:
+                    chosen, result, best_error = trial, run, err
+                    break
+    return reference, single, result, best_error, result["spec"] or "float"
+
+
+os.makedirs(args.output, exist_ok=True)
+print(f"\nper-layer precision ({args.compiler} {args.flags}, tolerance {args.tolerance:.1e}, {len(inputs)} inputs)")
+print(f"{'model':<20}{'double [us]':>12}{'float [us]':>12}{'chosen [us]':>12}{'speedup':>10}{'max |error|':>14}  layer precision")
+with tempfile.TemporaryDirectory() as tmp:
+    for file_name in sorted(os.listdir(args.input)):
+        model, ext = os.path.splitext(file_name)
+        if ext not in [".keras", ".h5"]:
+            continue
+        # one model per generation run
+        model_dir = tempfile.mkdtemp(dir=tmp)
+        for other in os.listdir(args.input):
+            if os.path.splitext(other)[0] == model:
+                os.symlink(os.path.abspath(os.path.join(args.input, other)), os.path.join(model_dir, other))
+        search = searchModel(tmp, model_dir, model)
+        if search is None:
+            print(f"{model:<20}  the double or float model did not build, skipped")
+            continue
+        reference, single, result, err, spec = search
+        with open(result["header"]) as src, open(os.path.join(args.output, f"{model}.hpp"), "w") as dst:
+            dst.write(src.read())
+        print(
+            f"{model:<20}{reference['latency']:>12.4f}{single['latency']:>12.4f}{result['latency']:>12.4f}"
+            f"{reference['latency'] / result['latency']:>10.2f}{err:>14.3e}  {spec}"
+        )
+print()
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+
+import argparse
+import os
+import sys
+import numpy as np
+
+##########################################################################
+## CHECK THE REFERENCE EXECUTOR OF THE ERROR CHECKS AGAINST KERAS ON    ##
+## MODELS REWRITTEN BY THE FUSION AND SIMPLIFICATION PASSES             ##
+##########################################################################
+# the tolerance checks of --quantize, --weight-storage, --palettize, --low-rank, --remove-dead
+# and --activation-approx measure their error with referenceForward() (codegen/Z_quantization.py)
+# on the layer lists after fuseConvLayers() and simplifyLayers(). without any of these options
+# it has to reproduce keras, or every error they report is off. a few small models that the
+# passes rewrite (a global average whose 1 / (height * width) moves into the next Dense
+# weights, a folded batch normalization, merged linear Dense layers) are run through it and
+# compared with keras. exits with 1 if one of them is off by more than --tolerance. example:
+# python testing/reference_forward.py
+
+parser = argparse.ArgumentParser(description="compare the reference executor with keras on rewritten models.")
+parser.add_argument("--tolerance", type=float, default=1e-5, help="max |reference - keras| relative to max |keras|")
+args = parser.parse_args()
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "codegen"))
+os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
+import keras
+from B_extract_model import extractModel
+from Z_kernel_selection import fuseConvLayers, simplifyLayers
+from Z_quantization import referenceForward
+
+keras.utils.set_random_seed(0)
+models = {
+    "conv_global_average_dense": keras.Sequential([
+        keras.Input((8, 8, 3)),
+        keras.layers.Conv2D(8, 3, activation="relu"),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(16, activation="relu"),
+        keras.layers.Dense(4),
+    ]),
+    "conv_batchnorm_global_average_dense": keras.Sequential([
+        keras.Input((8, 8, 3)),
+        keras.layers.Conv2D(8, 3),
+        keras.layers.BatchNormalization(),
+        keras.layers.Activation("relu"),
+        keras.layers.GlobalAveragePooling2D(),
+        keras.layers.Dense(4),
+    ]),
+    "conv_global_max_dense": keras.Sequential([
+        keras.Input((8, 8, 3)),
+        keras.layers.Conv2D(8, 3, activation="relu"),
+        keras.layers.GlobalMaxPooling2D(),
+        keras.layers.Dense(4),
+    ]),
+    "merged_linear_dense": keras.Sequential([
+        keras.Input((12,)),
+        keras.layers.Dense(16),
+        keras.layers.Dense(16, activation="tanh"),
+        keras.layers.Dense(4),
+    ]),
+}
+
+failed = False
+for name, model in models.items():
+    # random batch normalization statistics, so the folding is not an identity
+    for layer in model.layers:
+        if isinstance(layer, keras.layers.BatchNormalization):
+            size = layer.gamma.shape[0]
+            rng = np.random.default_rng(1)
+            layer.set_weights([rng.uniform(0.5, 1.5, size), rng.normal(0, 0.1, size), rng.normal(0, 0.1, size),
+                               rng.uniform(0.5, 1.5, size)])
+    (
+        weights_list,
+        biases_list,
+        activation_functions,
+        alphas,
+        dropout_rates,
+        batch_norm_params,
+        conv_layer_params,
+        input_flat_size,
+        output_flat_size,
+        layer_shape,
+        layer_type,
+    ) = extractModel(model, ".keras")
+    extracted_layer_type = list(layer_type)
+    layer_type, weights_list, activation_functions, alphas, batch_norm_params, conv_layer_params = fuseConvLayers(
+        layer_type, weights_list, activation_functions, alphas, batch_norm_params, conv_layer_params
+    )
+    layer_type, weights_list, biases_list, activation_functions, alphas, conv_layer_params, layer_shape, _, _ = (
+        simplifyLayers(layer_type, weights_list, biases_list, activation_functions, alphas, conv_layer_params,
+                       layer_shape, 8)
+    )
+    inputs = np.random.default_rng(0).standard_normal((32,) + tuple(model.input_shape[1:]))
+    expected = np.asarray(model.predict(inputs, verbose=0), dtype=np.float64)
+    result = referenceForward(model, layer_type, extracted_layer_type, weights_list, biases_list,
+                              conv_layer_params, inputs)
+    error = float(np.max(np.abs(result - expected)) / (np.max(np.abs(expected)) or 1.0))
+    ok = error <= args.tolerance
+    failed |= not ok
+    print(f"{name:40s}{error:12.3e}  {'ok' if ok else 'FAILED'}  ({', '.join(str(t) for t in layer_type)})")
+
+sys.exit(1 if failed else 0)